@@ -1,19 +1,33 @@
-from fastapi import APIRouter, HTTPException, Query, Depends, UploadFile, File
-from fastapi.responses import Response, JSONResponse, HTMLResponse
+from fastapi import APIRouter, HTTPException, Query, Depends, UploadFile, File, Header, Request
+from fastapi.responses import Response, JSONResponse, HTMLResponse, StreamingResponse, FileResponse
+from starlette.concurrency import run_in_threadpool
 from app.services.pdf_service import PDFService
+from app.services import markdown_renderer
+from app.services.markdown_renderer import convert_markdown_to_html
+from app.services.render_queue import QueueFullError
+from app.services.jobs import DONE, JobManager, JobStore, job_status, valid_webhook_url
 from app.models.pdf_options import (
     PDFRequest, 
+    PDFBatchRequest,
     PDFCompressionRequest, 
     CompressionLevel,
     PDFOptions,
     Margin,
-    PageFormat
+    PageFormat,
+    RenderReport,
+    CompressionReport
 )
+from app.core import content_encoding, metrics
+from app.core.config import settings
 from app.core.security import get_api_key
-import tempfile
 import os
-import markdown
-from typing import Optional
+import json
+import time
+import base64
+import asyncio
+import zipfile
+from itertools import chain
+from typing import AsyncIterator, BinaryIO, Iterator, List, Optional, Tuple, Union
 from pydantic import BaseModel, Field
 
 class MarkdownRequest(BaseModel):
@@ -93,320 +107,329 @@ class MarkdownRequest(BaseModel):
         examples=["800px", "21cm", "8.5in"]
     )
 
-def convert_markdown_to_html(
-    markdown_content: str, 
-    title: Optional[str] = None,
-    header: Optional[str] = None,
-    footer: Optional[str] = None,
-    add_toc: bool = False,
-    theme: str = "light",
-    font_family: Optional[str] = None,
-    font_size: Optional[str] = None,
-    heading_font_family: Optional[str] = None,
-    line_height: Optional[str] = None,
-    margin_top: Optional[str] = None,
-    margin_right: Optional[str] = None,
-    margin_bottom: Optional[str] = None,
-    margin_left: Optional[str] = None,
-    content_width: Optional[str] = None
-) -> str:
-    """Helper function to convert markdown to styled HTML"""
-    # Convert Markdown to HTML with extended features
-    extensions = [
-        'extra',             # Tables, footnotes, attribute lists, etc.
-        'codehilite',        # Code highlighting
-        'fenced_code',       # Fenced code blocks
-        'nl2br',             # Newlines to <br>
-        'sane_lists',        # Better list handling
-        'smarty',            # Smart quotes, dashes, etc.
-        'tables',            # Tables
-    ]
-    
-    if add_toc:
-        extensions.append('toc')
-        markdown_content = '[TOC]\n\n' + markdown_content
-
-    html_content = markdown.markdown(
-        markdown_content,
-        extensions=extensions,
-        output_format='html5'
+class MarkdownPDFRequest(MarkdownRequest):
+    """Request model for rendering markdown straight to PDF"""
+    options: Optional[PDFOptions] = Field(
+        default_factory=PDFOptions,
+        description="PDF options, as for /generate-pdf"
     )
 
-    # Process TRUE and FALSE to add color classes
-    html_content = html_content.replace('>TRUE<', ' class="true">TRUE<')
-    html_content = html_content.replace('>FALSE<', ' class="false">FALSE<')
-
-    # Get theme colors
-    colors = {
-        "light": {
-            "bg": "#ffffff",
-            "text": "#333333",
-            "border": "#e2e8f0",
-            "heading": "#2d3748",
-            "link": "#3182ce",
-            "hover": "#2c5282",
-            "code_bg": "#f7fafc",
-            "blockquote": "#718096",
-            "section_bg": "#f8fafc"
-        },
-        "dark": {
-            "bg": "#1a202c",
-            "text": "#e2e8f0",
-            "border": "#4a5568",
-            "heading": "#f7fafc",
-            "link": "#63b3ed",
-            "hover": "#90cdf4",
-            "code_bg": "#2d3748",
-            "blockquote": "#a0aec0",
-            "section_bg": "#2d3748"
-        }
-    }[theme]
-
-    # Default settings
-    default_font_family = "-apple-system, BlinkMacSystemFont, 'Segoe UI', Roboto, 'Helvetica Neue', Arial, sans-serif"
-    default_heading_font = default_font_family
-    default_font_size = "12pt"
-    default_line_height = "1.6"
-    default_margin = "20px"
-    default_content_width = "800px"
-
-    # Create a complete HTML document with styling
-    return f"""
-    <!DOCTYPE html>
-    <html>
-    <head>
-        <meta charset="UTF-8">
-        <title>{title or 'Markdown Document'}</title>
-        <style>
-            :root {{
-                color-scheme: {theme};
-            }}
-            body {{
-                font-family: {font_family or default_font_family};
-                line-height: {line_height or default_line_height};
-                font-size: {font_size or default_font_size};
-                color: {colors["text"]};
-                background-color: {colors["bg"]};
-                /* Remove fixed margins to allow PDF options to control them */
-                margin: {margin_top or default_margin} {margin_right or default_margin} {margin_bottom or default_margin} {margin_left or default_margin};
-                padding: 0;
-            }}
-            .container {{
-                width: 100%;
-                /* Remove fixed margins */
-                padding: 0;
-            }}
-            .header {{
-                position: sticky;
-                top: 0;
-                background-color: {colors["bg"]};
-                border-bottom: 1px solid {colors["border"]};
-                padding: 1rem 0;
-                margin-bottom: 2rem;
-                z-index: 100;
-                width: 100%;
-            }}
-            .footer {{
-                margin-top: 2rem;
-                padding: 1rem 0;
-                border-top: 1px solid {colors["border"]};
-                text-align: center;
-                font-size: 0.875rem;
-                color: {colors["blockquote"]};
-                width: 100%;
-            }}
-            .markdown-content {{
-                /* Allow content width to be controlled while keeping it centered */
-                width: {content_width or default_content_width};
-                margin: 0 auto;
-                background-color: {colors["bg"]};
-                padding: 0;
-            }}
-            h1, h2, h3, h4, h5, h6 {{
-                font-family: {heading_font_family or font_family or default_heading_font};
-                font-weight: 600;
-                line-height: 1.25;
-                margin-top: 1.5em;
-                margin-bottom: 0.5em;
-                color: {colors["heading"]};
-            }}
-            h1 {{ font-size: 2em; margin-top: 0; }}
-            h2 {{ font-size: 1.5em; }}
-            h3 {{ font-size: 1.25em; }}
-            h4 {{ font-size: 1em; }}
-            h5 {{ font-size: 0.875em; }}
-            h6 {{ font-size: 0.85em; }}
-            p {{
-                margin: 1em 0;
-            }}
-            ul, ol {{
-                margin: 1em 0;
-                padding-left: 2em;
-            }}
-            li + li {{
-                margin-top: 0.25em;
-            }}
-            li > p {{
-                margin: 0.5em 0;
-            }}
-            blockquote {{
-                margin: 1em 0;
-                padding: 0.5em 1em;
-                color: {colors["blockquote"]};
-                border-left: 4px solid {colors["border"]};
-                background-color: {colors["section_bg"]};
-            }}
-            code {{
-                font-family: 'SFMono-Regular', Consolas, 'Liberation Mono', Menlo, Courier, monospace;
-                padding: 0.2em 0.4em;
-                margin: 0;
-                font-size: 85%;
-                background-color: {colors["code_bg"]};
-                border-radius: 3px;
-            }}
-            pre {{
-                font-family: 'SFMono-Regular', Consolas, 'Liberation Mono', Menlo, Courier, monospace;
-                padding: 1em;
-                overflow: auto;
-                font-size: 85%;
-                line-height: 1.45;
-                background-color: {colors["code_bg"]};
-                border-radius: 6px;
-                margin: 1em 0;
-            }}
-            pre code {{
-                padding: 0;
-                margin: 0;
-                font-size: 100%;
-                background-color: transparent;
-            }}
-            table {{
-                width: 100%;
-                border-collapse: collapse;
-                margin: 1em 0;
-                overflow-x: auto;
-                display: block;
-            }}
-            table th, table td {{
-                padding: 0.5em 1em;
-                border: 1px solid {colors["border"]};
-            }}
-            table tr:nth-child(2n) {{
-                background-color: {colors["section_bg"]};
-            }}
-            img {{
-                max-width: 100%;
-                height: auto;
-                border-radius: 6px;
-            }}
-            hr {{
-                height: 1px;
-                border: none;
-                background-color: {colors["border"]};
-                margin: 2em 0;
-            }}
-            strong {{
-                color: {colors["heading"]};
-                font-weight: 600;
-            }}
-            .true {{
-                color: #48bb78;
-                font-weight: bold;
-            }}
-            .false {{
-                color: #f56565;
-                font-weight: bold;
-            }}
-            .experience-section {{
-                background-color: {colors["section_bg"]};
-                border: 1px solid {colors["border"]};
-                border-radius: 8px;
-                padding: 1.5em;
-                margin: 1.5em 0;
-            }}
-            .experience-header {{
-                display: flex;
-                justify-content: space-between;
-                align-items: flex-start;
-                margin-bottom: 1em;
-            }}
-            .experience-title {{
-                margin: 0;
-                color: {colors["heading"]};
-            }}
-            .experience-meta {{
-                color: {colors["blockquote"]};
-                font-size: 0.875em;
-            }}
-            .experience-content {{
-                margin-top: 1em;
-            }}
-            .toc {{
-                background-color: {colors["section_bg"]};
-                padding: 1.5em;
-                border-radius: 8px;
-                margin: 1.5em 0;
-            }}
-            .toc ul {{
-                list-style-type: none;
-                padding-left: 1em;
-            }}
-            .toc a {{
-                color: {colors["link"]};
-                text-decoration: none;
-            }}
-            .toc a:hover {{
-                color: {colors["hover"]};
-                text-decoration: underline;
-            }}
-            @media print {{
-                body {{
-                    /* Reset all margins for PDF generation */
-                    margin: 0 !important;
-                    padding: 0 !important;
-                    background-color: transparent !important;
-                }}
-                .container {{
-                    margin: 0 !important;
-                    padding: 0 !important;
-                    width: 100% !important;
-                }}
-                .markdown-content {{
-                    /* Reset content constraints for PDF */
-                    width: 100% !important;
-                    max-width: none !important;
-                    margin: 0 !important;
-                    padding: 0 !important;
-                    background-color: transparent !important;
-                }}
-                .header, .footer {{
-                    display: none !important;
-                }}
-                h1:first-of-type {{
-                    margin-top: 0 !important;
-                    padding-top: 0 !important;
-                }}
-                /* Hide default headers and footers */
-                title, head {{
-                    display: none !important;
-                }}
-            }}
-        </style>
-    </head>
-    <body>
-        {f'<div class="header">{header}</div>' if header else ''}
-        <div class="container">
-            <div class="markdown-content">
-                {html_content}
-            </div>
-        </div>
-        {f'<div class="footer">{footer}</div>' if footer else ''}
-    </body>
-    </html>
+def markdown_request_html(request: MarkdownRequest, timings: Optional[dict] = None) -> str:
+    """Styled HTML document for a markdown request"""
+    return convert_markdown_to_html(
+        request.content,
+        title=request.title,
+        header=request.header,
+        footer=request.footer,
+        add_toc=request.add_table_of_contents,
+        theme=request.theme,
+        font_family=request.font_family,
+        font_size=request.font_size,
+        heading_font_family=request.heading_font_family,
+        line_height=request.line_height,
+        margin_top=request.margin_top,
+        margin_right=request.margin_right,
+        margin_bottom=request.margin_bottom,
+        margin_left=request.margin_left,
+        content_width=request.content_width,
+        timings=timings
+    )
+
+def iter_file(file: BinaryIO, chunk_size: int) -> Iterator[bytes]:
+    """Yield a file in chunks, closing it once fully sent"""
+    try:
+        while True:
+            chunk = file.read(chunk_size)
+            if not chunk:
+                break
+            yield chunk
+    finally:
+        file.close()
+
+def iter_base64(file: BinaryIO, chunk_size: int) -> Iterator[bytes]:
+    """Yield a file base64 encoded in chunks, closing it once fully sent"""
+    # Whole 3-byte groups per chunk, so the encoded chunks join up without padding
+    return (base64.b64encode(chunk) for chunk in iter_file(file, chunk_size - chunk_size % 3))
+
+BASE64_PREFIX = b'{"success":true,"data":"'
+BASE64_SUFFIX = b'"}'
+
+async def base64_response(
+    pdf: Union[str, bytes, BinaryIO],
+    headers: dict,
+    accept_encoding: Optional[str] = None
+) -> Response:
+    """
+    {"success": true, "data": "<base64 PDF>"} for a PDF given as the engine's
+    base64 string, as bytes or as a spooled file.
+
+    Base64 needs no JSON escaping, so the body is assembled around the encoded
+    PDF instead of going through json.dumps. Spooled files and bodies above
+    BASE64_STREAM_THRESHOLD are streamed, and gzip or brotli is applied when
+    the client accepts it.
     """
+    coding = content_encoding.negotiate(accept_encoding)
+    headers = {**headers, "Vary": "Accept-Encoding"}
+    chunk_size = settings.PDF_STREAM_CHUNK_SIZE
+
+    if isinstance(pdf, str):
+        data = pdf.encode('ascii')
+    elif isinstance(pdf, bytes):
+        data = base64.b64encode(pdf)
+    else:
+        data = None
+        chunks = iter_base64(pdf, chunk_size)
+
+    if data is not None and len(data) <= settings.BASE64_STREAM_THRESHOLD:
+        body = BASE64_PREFIX + data + BASE64_SUFFIX
+        if coding and len(body) >= content_encoding.MINIMUM_SIZE:
+            body = await run_in_threadpool(content_encoding.encode, body, coding)
+            headers["Content-Encoding"] = coding
+        return Response(content=body, media_type="application/json", headers=headers)
+
+    if data is not None:
+        chunks = (data[start:start + chunk_size] for start in range(0, len(data), chunk_size))
+    if coding:
+        headers["Content-Encoding"] = coding
+    return StreamingResponse(
+        content_encoding.encode_chunks(chain([BASE64_PREFIX], chunks, [BASE64_SUFFIX]), coding),
+        media_type="application/json",
+        headers=headers
+    )
+
+class ZipStreamBuffer:
+    """Unseekable sink for zipfile whose written bytes are drained after each entry"""
+
+    def __init__(self):
+        self._chunks: List[bytes] = []
+
+    def write(self, data: bytes) -> int:
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks = []
+        return data
 
 router = APIRouter()
 pdf_service = PDFService()
+job_manager = JobManager(JobStore(settings.JOBS_DIR), pdf_service)
+
+def report_headers(report: RenderReport) -> dict:
+    """Response headers carrying the counters of a render"""
+    headers = {
+        "X-Requests-Blocked": str(report.requestsBlocked),
+        "X-Requests-Fulfilled": str(report.requestsFulfilled),
+        "X-Requests-Cached": str(report.requestsCached)
+    }
+    if report.originalSize is not None:
+        headers["X-Original-Size"] = str(report.originalSize)
+        headers["X-Final-Size"] = str(report.finalSize)
+    return headers
+
+def timing_headers(timings: dict) -> dict:
+    """Server-Timing header for per-stage durations in milliseconds"""
+    return {"Server-Timing": metrics.server_timing(timings)} if timings else {}
+
+async def render_cached(
+    request: PDFRequest,
+    reject_when_full: bool = True,
+    report: Optional[RenderReport] = None,
+    encoded: bool = False
+) -> Tuple[Union[bytes, str], Optional[str], bool]:
+    """
+    Render through the render cache when enabled, returning (pdf, cache key, cache hit).
+
+    With encoded=True a fresh render is returned as the engine's base64 string;
+    cache hits are always bytes.
+    """
+    if not pdf_service.render_cache:
+        pdf_content = await pdf_service.render(
+            request, reject_when_full=reject_when_full, report=report, encoded=encoded
+        )
+        return pdf_content, None, False
+
+    with metrics.timed(report.timings if report is not None else None, 'cache'):
+        cache_key = pdf_service.cache_key(request)
+        pdf_content = await run_in_threadpool(pdf_service.render_cache.get, cache_key)
+    if pdf_content is not None:
+        return pdf_content, cache_key, True
+
+    pdf_content = await pdf_service.render(
+        request, reject_when_full=reject_when_full, report=report, encoded=encoded
+    )
+    await run_in_threadpool(
+        pdf_service.render_cache.set,
+        cache_key,
+        base64.b64decode(pdf_content) if encoded else pdf_content
+    )
+    return pdf_content, cache_key, False
+
+async def compress_cached(
+    file: BinaryIO,
+    compression_level: int,
+    target_dpi: Optional[int] = None,
+    report: Optional[CompressionReport] = None,
+    use_cache: bool = True
+) -> Tuple[bytes, Optional[str], bool]:
+    """Compress through the compression cache when enabled, returning (pdf, cache key, cache hit)"""
+    if (not use_cache or not pdf_service.compression_cache
+            or (compression_level == 0 and not target_dpi)):
+        # Level 0 hands the input back unchanged, so there is nothing worth caching
+        pdf_content = await run_in_threadpool(
+            pdf_service.compress_pdf, file, compression_level, target_dpi, report
+        )
+        return pdf_content, None, False
+
+    timings = report.timings if report is not None else None
+    with metrics.timed(timings, 'hash'):
+        cache_key = await run_in_threadpool(pdf_service.compression_cache_key, file, compression_level, target_dpi)
+    with metrics.timed(timings, 'cache'):
+        pdf_content = await run_in_threadpool(pdf_service.compression_cache.get, cache_key)
+    if pdf_content is not None:
+        if report is not None:
+            report.originalSize = file.seek(0, os.SEEK_END)
+            report.finalSize = len(pdf_content)
+        return pdf_content, cache_key, True
+
+    pdf_content = await run_in_threadpool(
+        pdf_service.compress_pdf, file, compression_level, target_dpi, report
+    )
+    await run_in_threadpool(pdf_service.compression_cache.set, cache_key, pdf_content)
+    return pdf_content, cache_key, False
+
+def check_engine_support(request: PDFRequest, item: Optional[int] = None):
+    """Reject options the rendering engine would otherwise silently ignore"""
+    unsupported = pdf_service.unsupported_options(request)
+    if unsupported:
+        raise HTTPException(
+            status_code=400,
+            detail=unsupported if item is None else f"Item {item}: {unsupported}"
+        )
+
+async def debug_response(request: PDFRequest, report: RenderReport, started: float) -> JSONResponse:
+    """Render a request past the render cache and report on it instead of returning the PDF"""
+    report.collectResources = True
+    pdf_content = await pdf_service.render(request, report=report)
+    with metrics.timed(report.timings, 'inspect'):
+        pages = await run_in_threadpool(pdf_service.page_count, pdf_content)
+    metrics.record_timing(report.timings, 'total', time.perf_counter() - started)
+    return JSONResponse(
+        content={
+            "success": True,
+            "pages": pages,
+            "size": len(pdf_content),
+            **report.model_dump()
+        },
+        headers=timing_headers(report.timings)
+    )
+
+async def pdf_response(
+    request: PDFRequest,
+    return_base64: bool = False,
+    stream: bool = False,
+    if_none_match: Optional[str] = None,
+    debug: bool = False,
+    report: Optional[RenderReport] = None,
+    accept_encoding: Optional[str] = None,
+    started: Optional[float] = None
+) -> Response:
+    """
+    Render a request and build the /generate-pdf style response for it.
+
+    `started` is when the caller began handling the request, so the total
+    timing also covers work done before rendering.
+    """
+    started = started or time.perf_counter()
+    report = report or RenderReport()
+    try:
+        if debug:
+            return await debug_response(request, report, started)
+
+        if stream:
+            pdf_file = await pdf_service.render(request, stream=True, report=report)
+            size = pdf_file.seek(0, os.SEEK_END)
+            pdf_file.seek(0)
+            metrics.record_timing(report.timings, 'total', time.perf_counter() - started)
+            if return_base64:
+                return await base64_response(
+                    pdf_file,
+                    {**report_headers(report), **timing_headers(report.timings)},
+                    accept_encoding
+                )
+            return StreamingResponse(
+                iter_file(pdf_file, settings.PDF_STREAM_CHUNK_SIZE),
+                media_type="application/pdf",
+                headers={
+                    "Content-Disposition": "attachment; filename=generated.pdf",
+                    "Content-Length": str(size),
+                    **report_headers(report),
+                    **timing_headers(report.timings)
+                }
+            )
+
+        # Base64 from Chrome is passed through instead of decoded and encoded again
+        pdf_content, cache_key, cache_hit = await render_cached(request, report=report, encoded=return_base64)
+
+        cache_headers = {}
+        if cache_key:
+            etag = f'"{cache_key}"'
+            cache_headers = {"ETag": etag, "X-Cache": "HIT" if cache_hit else "MISS"}
+            if cache_hit and if_none_match and etag in [
+                tag.strip() for tag in if_none_match.split(",")
+            ]:
+                return Response(status_code=304, headers=cache_headers)
+        if not cache_hit:
+            # A cached PDF was not rendered by this request, so there is nothing to report
+            cache_headers.update(report_headers(report))
+        metrics.record_timing(report.timings, 'total', time.perf_counter() - started)
+        cache_headers.update(timing_headers(report.timings))
+        
+        if return_base64:
+            return await base64_response(pdf_content, cache_headers, accept_encoding)
+        
+        return Response(
+            content=pdf_content,
+            media_type="application/pdf",
+            headers={
+                "Content-Disposition": "attachment; filename=generated.pdf",
+                **cache_headers
+            }
+        )
+    except QueueFullError as e:
+        raise HTTPException(
+            status_code=503,
+            detail=str(e),
+            headers={"Retry-After": str(e.retry_after)}
+        )
+    except Exception as e:
+        raise HTTPException(
+            status_code=500,
+            detail=f"PDF generation failed: {str(e)}"
+        )
+
+@router.get("/stats")
+async def stats(api_key: str = Depends(get_api_key)):
+    """
+    Report the state of the rendering resources of this worker.
+
+    Requires a valid API key in the x-api-key header.
+    """
+    return {
+        "engine": "cdp" if pdf_service.cdp else "selenium",
+        "pool": pdf_service.pool.stats(),
+        "cdp": pdf_service.cdp.stats() if pdf_service.cdp else None,
+        "queue": pdf_service.queue.stats(),
+        "render_cache": pdf_service.render_cache.stats() if pdf_service.render_cache else None,
+        "subresource_cache": pdf_service.subresource_cache.stats() if pdf_service.subresource_cache else None,
+        "compression_cache": pdf_service.compression_cache.stats() if pdf_service.compression_cache else None,
+        "markdown_cache": markdown_renderer.stats(),
+        "jobs": await run_in_threadpool(job_manager.stats)
+    }
 
 @router.post("/markdown-to-html")
 async def markdown_to_html(
@@ -428,35 +451,67 @@ async def markdown_to_html(
     }
     ```
     
-    Returns an HTML response with proper styling for markdown elements.
+    Returns an HTML response with proper styling for markdown elements. The
+    Server-Timing header carries the time spent in each conversion phase.
     
     Requires a valid API key in the x-api-key header.
     """
     try:
-        html_content = convert_markdown_to_html(
-            request.content,
-            title=request.title,
-            header=request.header,
-            footer=request.footer,
-            add_toc=request.add_table_of_contents,
-            theme=request.theme,
-            font_family=request.font_family,
-            font_size=request.font_size,
-            heading_font_family=request.heading_font_family,
-            line_height=request.line_height,
-            margin_top=request.margin_top,
-            margin_right=request.margin_right,
-            margin_bottom=request.margin_bottom,
-            margin_left=request.margin_left,
-            content_width=request.content_width
+        timings = {}
+        with metrics.timed(timings, 'total'):
+            html_content = markdown_request_html(request, timings)
+        return HTMLResponse(content=html_content, headers=timing_headers(timings))
+    except Exception as e:
+        raise HTTPException(
+            status_code=500,
+            detail=f"Markdown to HTML conversion failed: {str(e)}"
         )
-        return HTMLResponse(content=html_content)
+
+@router.post("/markdown-to-pdf")
+async def markdown_to_pdf(
+    request: MarkdownPDFRequest,
+    api_key: str = Depends(get_api_key),
+    return_base64: bool = Query(
+        False,
+        description="If true, returns the PDF as a base64 string in JSON response"
+    ),
+    stream: bool = Query(
+        False,
+        description="If true, streams the PDF in chunks so memory stays bounded for large documents"
+    ),
+    if_none_match: Optional[str] = Header(None),
+    debug: bool = Query(
+        False,
+        description="If true, returns a JSON report on the render (timings, subresources, page count, size) instead of the PDF"
+    ),
+    accept_encoding: Optional[str] = Header(None)
+):
+    """
+    Convert Markdown content straight to PDF.
+
+    Takes the /markdown-to-html fields plus "options" (PDF options as for
+    /generate-pdf). The styled HTML is rendered in-process, so it never makes
+    a round trip through the client. Query parameters and response headers
+    are the same as for /generate-pdf.
+
+    Requires a valid API key in the x-api-key header.
+    """
+    started = time.perf_counter()
+    report = RenderReport()
+    try:
+        with metrics.timed(report.timings, 'markdown'):
+            html_content = markdown_request_html(request)
     except Exception as e:
         raise HTTPException(
             status_code=500,
             detail=f"Markdown to HTML conversion failed: {str(e)}"
         )
 
+    pdf_request = PDFRequest(html=html_content, options=request.options)
+    return await pdf_response(
+        pdf_request, return_base64, stream, if_none_match, debug, report, accept_encoding, started
+    )
+
 @router.post("/generate-pdf")
 async def generate_pdf(
     request: PDFRequest,
@@ -464,7 +519,17 @@ async def generate_pdf(
     return_base64: bool = Query(
         False,
         description="If true, returns the PDF as a base64 string in JSON response"
-    )
+    ),
+    stream: bool = Query(
+        False,
+        description="If true, streams the PDF in chunks so memory stays bounded for large documents"
+    ),
+    if_none_match: Optional[str] = Header(None),
+    debug: bool = Query(
+        False,
+        description="If true, returns a JSON report on the render (timings, subresources, page count, size) instead of the PDF"
+    ),
+    accept_encoding: Optional[str] = Header(None)
 ):
     """
     Generate a PDF from HTML content or URL with various options.
@@ -480,33 +545,182 @@ async def generate_pdf(
     - And more
     
     Returns either a PDF file or base64 encoded PDF string based on return_base64 parameter.
+    With stream=true the PDF is sent in chunks; together with return_base64 the
+    JSON is streamed, base64 encoding one chunk at a time. Base64 responses are
+    compressed with gzip or brotli when the client sends Accept-Encoding.
+
+    When the render cache is enabled, non-streamed responses carry an ETag derived
+    from the document and its normalized options, and If-None-Match is honored.
+
+    Rendered responses report the requests blocked by rejectRequestPattern /
+    rejectResourceTypes and answered by requestInterceptors in the
+    X-Requests-Blocked and X-Requests-Fulfilled headers, and requests served from
+    the subresource cache in X-Requests-Cached. Those options need PDF_ENGINE=cdp;
+    the Selenium engine answers 400 instead of ignoring them.
+
+    Every response carries a Server-Timing header with the milliseconds spent in
+    each stage (queue, acquire, load, readiness, fonts, print, decode, ...). With
+    debug=true the render bypasses the render cache and a JSON report of those
+    timings, the subresources the page loaded, the page count and the PDF size
+    is returned instead of the PDF.
     
     Requires a valid API key in the x-api-key header.
     """
+    check_engine_support(request)
+    return await pdf_response(request, return_base64, stream, if_none_match, debug, None, accept_encoding)
+
+async def stream_batch_zip(items: List[PDFRequest]) -> AsyncIterator[bytes]:
+    """Render items concurrently and yield ZIP bytes as each document finishes"""
+    # Hold at most one render slot per worker so the batch waits for capacity
+    # instead of being rejected, without starving interactive requests
+    slots = asyncio.Semaphore(pdf_service.queue.workers)
+
+    async def render_item(index: int, item: PDFRequest):
+        report = RenderReport()
+        async with slots:
+            try:
+                pdf_content, _, _ = await render_cached(item, reject_when_full=False, report=report)
+                return index, pdf_content, report, None
+            except Exception as e:
+                return index, None, report, str(e)
+
+    tasks = [asyncio.create_task(render_item(index, item)) for index, item in enumerate(items)]
+    buffer = ZipStreamBuffer()
+    manifest = []
     try:
-        pdf_content = pdf_service.generate_pdf(request)
-        
-        if return_base64:
-            import base64
-            return JSONResponse(
-                content={
-                    "success": True,
-                    "data": base64.b64encode(pdf_content).decode('utf-8')
-                }
-            )
-        
-        return Response(
-            content=pdf_content,
-            media_type="application/pdf",
-            headers={
-                "Content-Disposition": "attachment; filename=generated.pdf"
-            }
+        with zipfile.ZipFile(buffer, mode="w", compression=zipfile.ZIP_STORED) as archive:
+            for finished in asyncio.as_completed(tasks):
+                index, pdf_content, report, error = await finished
+                if error is None:
+                    filename = f"{index:04d}.pdf"
+                    archive.writestr(filename, pdf_content)
+                    manifest.append({
+                        "index": index,
+                        "success": True,
+                        "file": filename,
+                        "size": len(pdf_content),
+                        **report.model_dump()
+                    })
+                else:
+                    filename = f"{index:04d}.error.txt"
+                    archive.writestr(filename, error)
+                    manifest.append({"index": index, "success": False, "file": filename, "error": error})
+                yield buffer.drain()
+
+            manifest.sort(key=lambda entry: entry["index"])
+            archive.writestr("manifest.json", json.dumps({
+                "total": len(items),
+                "succeeded": sum(1 for entry in manifest if entry["success"]),
+                "failed": sum(1 for entry in manifest if not entry["success"]),
+                "items": manifest
+            }, indent=2))
+        yield buffer.drain()
+    finally:
+        for task in tasks:
+            task.cancel()
+
+@router.post("/generate-pdf/batch")
+async def generate_pdf_batch(
+    request: PDFBatchRequest,
+    api_key: str = Depends(get_api_key)
+):
+    """
+    Generate many PDFs in one request.
+
+    The request body is {"items": [PDFRequest, ...]}. Items are rendered concurrently
+    across the available browser capacity and streamed back as a ZIP archive as each
+    one finishes: NNNN.pdf for successes, NNNN.error.txt for failures (NNNN being the
+    item index), plus a final manifest.json with per-item status. A failing item never
+    fails the batch.
+
+    Requires a valid API key in the x-api-key header.
+    """
+    if len(request.items) > settings.BATCH_MAX_ITEMS:
+        raise HTTPException(
+            status_code=413,
+            detail=f"Batch exceeds the maximum of {settings.BATCH_MAX_ITEMS} items"
         )
-    except Exception as e:
+    for index, item in enumerate(request.items):
+        check_engine_support(item, index)
+
+    return StreamingResponse(
+        stream_batch_zip(request.items),
+        media_type="application/zip",
+        headers={
+            "Content-Disposition": "attachment; filename=batch.zip"
+        }
+    )
+
+@router.post("/jobs", status_code=202)
+async def create_job(
+    request: PDFRequest,
+    http_request: Request,
+    api_key: str = Depends(get_api_key),
+    webhook_url: Optional[str] = Query(
+        None,
+        description="Optional URL that receives a POST with the job status when the job finishes"
+    )
+):
+    """
+    Submit a PDF generation job and return immediately.
+
+    The request body is the same as for /generate-pdf. Poll /jobs/{job_id} for the
+    status and download the PDF from /jobs/{job_id}/result once it is done. Jobs
+    and results are persisted, so they survive a worker restart.
+
+    Requires a valid API key in the x-api-key header.
+    """
+    if webhook_url is not None and not valid_webhook_url(webhook_url):
         raise HTTPException(
-            status_code=500,
-            detail=f"PDF generation failed: {str(e)}"
-        ) 
+            status_code=400,
+            detail="webhook_url must be an http or https URL"
+        )
+    check_engine_support(request)
+    job = await job_manager.submit(request, webhook_url)
+    return {
+        **job_status(job),
+        "status_url": str(http_request.url_for("get_job", job_id=job["id"])),
+        "result_url": str(http_request.url_for("get_job_result", job_id=job["id"]))
+    }
+
+@router.get("/jobs/{job_id}")
+async def get_job(
+    job_id: str,
+    api_key: str = Depends(get_api_key)
+):
+    """
+    Return the status and progress of a PDF generation job.
+
+    Requires a valid API key in the x-api-key header.
+    """
+    job = await run_in_threadpool(job_manager.store.get, job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job_status(job)
+
+@router.get("/jobs/{job_id}/result")
+async def get_job_result(
+    job_id: str,
+    api_key: str = Depends(get_api_key)
+):
+    """
+    Download the PDF produced by a finished job.
+
+    Requires a valid API key in the x-api-key header.
+    """
+    job = await run_in_threadpool(job_manager.store.get, job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    if job["status"] != DONE:
+        raise HTTPException(
+            status_code=409,
+            detail=f"Job is {job['status']}" + (f": {job['error']}" if job["error"] else "")
+        )
+    return FileResponse(
+        job_manager.store.result_path(job_id),
+        media_type="application/pdf",
+        filename=f"{job_id}.pdf"
+    )
 
 @router.post("/compress-pdf")
 async def compress_pdf(
@@ -515,11 +729,21 @@ async def compress_pdf(
         CompressionLevel.LEVEL_5,
         description="Compression level from 0 (no compression) to 9 (maximum compression)"
     ),
+    target_dpi: Optional[int] = Query(
+        None,
+        gt=0,
+        description="Downsample images drawn above this resolution (pixels per inch on the page)"
+    ),
     api_key: str = Depends(get_api_key),
     return_base64: bool = Query(
         False,
         description="If true, returns the PDF as a base64 string in JSON response"
-    )
+    ),
+    debug: bool = Query(
+        False,
+        description="If true, returns a JSON report on the compression (timings, image counts, page count, sizes) instead of the PDF"
+    ),
+    accept_encoding: Optional[str] = Header(None)
 ):
     """
     Compress a PDF file with specified compression level.
@@ -527,9 +751,14 @@ async def compress_pdf(
     Parameters:
     - file: PDF file to compress
     - compression_level: Integer from 1 (minimum compression) to 5 (maximum compression)
+    - target_dpi: Downsample images shown at a higher resolution than this on their page
     - return_base64: If true, returns base64 encoded string instead of file
     
     Returns either a compressed PDF file or base64 encoded PDF string.
+    Uploads larger than COMPRESSION_MAX_UPLOAD_BYTES are rejected with 413.
+    The Server-Timing header carries the time spent in each stage; with
+    debug=true the compression bypasses the cache and a JSON report of the
+    stages, image counts, page count and sizes is returned instead.
     
     Requires a valid API key in the x-api-key header.
     """
@@ -539,39 +768,45 @@ async def compress_pdf(
             detail="Uploaded file must be a PDF"
         )
     
+    started = time.perf_counter()
+    report = CompressionReport()
     try:
-        # Save uploaded file temporarily
-        with tempfile.NamedTemporaryFile(delete=False, suffix='.pdf') as tmp_file:
-            content = await file.read()
-            tmp_file.write(content)
-            tmp_file.flush()
-            
-            # Compress the PDF
-            compressed_content = pdf_service.compress_pdf(
-                tmp_file.name,
-                compression_level.value
-            )
-            
-            # Clean up
-            os.unlink(tmp_file.name)
-            
-            if return_base64:
-                import base64
-                return JSONResponse(
-                    content={
-                        "success": True,
-                        "data": base64.b64encode(compressed_content).decode('utf-8')
-                    }
-                )
-            
-            return Response(
-                content=compressed_content,
-                media_type="application/pdf",
-                headers={
-                    "Content-Disposition": f"attachment; filename=compressed_{file.filename}"
-                }
+        # The upload is already spooled to disk in chunks; compress it in place
+        compressed_content, cache_key, cache_hit = await compress_cached(
+            file.file,
+            compression_level.value,
+            target_dpi,
+            report,
+            use_cache=not debug
+        )
+
+        if debug:
+            with metrics.timed(report.timings, 'inspect'):
+                pages = await run_in_threadpool(pdf_service.page_count, compressed_content)
+            metrics.record_timing(report.timings, 'total', time.perf_counter() - started)
+            return JSONResponse(
+                content={"success": True, "pages": pages, **report.model_dump()},
+                headers=timing_headers(report.timings)
             )
-            
+
+        cache_headers = {}
+        if cache_key:
+            cache_headers = {"ETag": f'"{cache_key}"', "X-Cache": "HIT" if cache_hit else "MISS"}
+        metrics.record_timing(report.timings, 'total', time.perf_counter() - started)
+        cache_headers.update(timing_headers(report.timings))
+
+        if return_base64:
+            return await base64_response(compressed_content, cache_headers, accept_encoding)
+
+        return Response(
+            content=compressed_content,
+            media_type="application/pdf",
+            headers={
+                "Content-Disposition": f"attachment; filename=compressed_{file.filename}",
+                **cache_headers
+            }
+        )
+
     except Exception as e:
         raise HTTPException(
             status_code=500,
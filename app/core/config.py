@@ -11,6 +11,76 @@ class Settings(BaseSettings):
     PORT: int = 8000
     TZ: str = "UTC"
 
+    # Rendering engine: "selenium" (chromedriver) or "cdp" (direct DevTools websocket)
+    PDF_ENGINE: str = "selenium"
+    CHROME_BINARY: Optional[str] = None  # Chrome executable, looked up on PATH when unset
+    CDP_MAX_PAGES: int = 8  # Concurrent pages rendered by the cdp engine
+    CDP_PRINT_TIMEOUT: float = 300.0  # Seconds for printing and each stream read, apart from the load timeout
+
+    # Driver resolution, done once at startup
+    CHROMEDRIVER_PATH: Optional[str] = None  # Pinned chromedriver, skips webdriver-manager
+    WEBDRIVER_OFFLINE: bool = False  # Never download drivers, use chromedriver from PATH
+    WARMUP_ON_STARTUP: bool = False  # Render a tiny page per browser at boot
+
+    # Base URL for relative links in injected HTML, overridable per request with baseUrl
+    DOCUMENT_BASE_URL: Optional[str] = None
+
+    # Chunk size for streamed PDF output (?stream=true)
+    PDF_STREAM_CHUNK_SIZE: int = 1024 * 1024
+
+    # return_base64 responses larger than this are sent as streamed JSON
+    BASE64_STREAM_THRESHOLD: int = 4 * 1024 * 1024
+
+    # Largest number of documents accepted by /generate-pdf/batch
+    BATCH_MAX_ITEMS: int = 1000
+
+    # Background jobs (/jobs)
+    JOBS_DIR: str = "data/jobs"  # SQLite database and rendered results
+    JOB_RETENTION: int = 86400  # Seconds finished jobs and results are kept
+    JOB_PRUNE_INTERVAL: int = 3600  # Seconds between removals of expired jobs
+    JOB_WEBHOOK_TIMEOUT: float = 10.0  # Seconds to wait for a completion webhook
+
+    # Memoized /markdown-to-html output, keyed by a hash of the content and styling options
+    MARKDOWN_CACHE_MEMORY_BYTES: int = 16 * 1024 * 1024  # In-memory LRU budget, 0 disables it
+    MARKDOWN_CACHE_TTL: int = 3600  # Seconds a converted document is reused
+
+    # Render cache for /generate-pdf (opt-in)
+    RENDER_CACHE_ENABLED: bool = False
+    RENDER_CACHE_TTL: int = 3600  # Seconds a rendered PDF stays valid
+    RENDER_CACHE_MEMORY_BYTES: int = 64 * 1024 * 1024  # In-memory LRU budget
+    RENDER_CACHE_DIR: Optional[str] = None  # Disk tier directory, disabled when unset
+    RENDER_CACHE_DISK_BYTES: int = 1024 * 1024 * 1024  # Disk tier budget
+
+    # Shared cache for CSS, fonts and images fetched by the cdp engine (opt-in)
+    SUBRESOURCE_CACHE_ENABLED: bool = False
+    SUBRESOURCE_CACHE_MAX_TTL: int = 86400  # Cap on the freshness lifetime taken from Cache-Control
+    SUBRESOURCE_CACHE_MEMORY_BYTES: int = 64 * 1024 * 1024  # In-memory LRU budget
+    SUBRESOURCE_CACHE_DIR: Optional[str] = None  # Disk tier directory, disabled when unset
+    SUBRESOURCE_CACHE_DISK_BYTES: int = 512 * 1024 * 1024  # Disk tier budget
+
+    # Browser pool settings
+    BROWSER_POOL_SIZE: int = 2  # Long-lived Chrome instances per worker
+    BROWSER_MAX_JOBS: int = 100  # Recycle a browser after this many renders
+    BROWSER_ACQUIRE_TIMEOUT: float = 30.0  # Seconds to wait for a free browser
+
+    # Render queue settings
+    RENDER_QUEUE_SIZE: int = 16  # Renders allowed to wait for a free worker
+    RENDER_RETRY_AFTER: int = 5  # Retry-After seconds sent when the queue is full
+
+    # PDF compression settings
+    COMPRESSION_WORKERS: int = 0  # Processes re-encoding images in parallel, 0 for one per CPU
+    COMPRESSION_MAX_UPLOAD_BYTES: int = 200 * 1024 * 1024  # Largest upload accepted by /compress-pdf, 0 for no limit
+
+    # Cache of /compress-pdf output by input hash and options
+    COMPRESSION_CACHE_ENABLED: bool = True
+    COMPRESSION_CACHE_TTL: int = 3600  # Seconds a compressed PDF is reused
+    COMPRESSION_CACHE_MEMORY_BYTES: int = 64 * 1024 * 1024  # In-memory LRU budget
+    COMPRESSION_CACHE_DIR: Optional[str] = None  # Disk tier directory, disabled when unset
+    COMPRESSION_CACHE_DISK_BYTES: int = 1024 * 1024 * 1024  # Disk tier budget
+
+    # Prometheus metrics at /metrics, served without API key
+    METRICS_ENABLED: bool = True
+
     # Coolify specific variables
     SOURCE_COMMIT: Optional[str] = None
     COOLIFY_URL: Optional[str] = None
@@ -0,0 +1,92 @@
+import zlib
+from typing import Iterable, Iterator, Optional
+
+try:
+    import brotli
+except ImportError:  # Optional dependency, install the "brotli" extra to offer br
+    brotli = None
+
+# Fast settings: the bodies are large and compressed on the response path
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 4
+
+# Bodies smaller than this are sent as they are
+MINIMUM_SIZE = 1024
+
+
+def _accepted(accept_encoding: str) -> dict:
+    """Map each coding of an Accept-Encoding header to its q-value"""
+    codings = {}
+    for part in accept_encoding.split(","):
+        coding, *params = [item.strip() for item in part.split(";")]
+        if not coding:
+            continue
+        q = 1.0
+        for param in params:
+            name, _, value = param.partition("=")
+            if name.strip() == "q":
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        codings[coding.lower()] = q
+    return codings
+
+
+def negotiate(accept_encoding: Optional[str]) -> Optional[str]:
+    """Pick "br" or "gzip" for an Accept-Encoding header, None to send the body as is"""
+    if not accept_encoding:
+        return None
+    codings = _accepted(accept_encoding)
+    wildcard = codings.get("*", 0.0)
+    offered = ["br", "gzip"] if brotli is not None else ["gzip"]
+    ranked = sorted(
+        (codings.get(coding, wildcard), -index, coding) for index, coding in enumerate(offered)
+    )
+    q, _, coding = ranked[-1]
+    return coding if q > 0 else None
+
+
+class _GzipEncoder:
+    def __init__(self):
+        self._compressor = zlib.compressobj(GZIP_LEVEL, zlib.DEFLATED, 31)
+
+    def compress(self, data: bytes) -> bytes:
+        return self._compressor.compress(data)
+
+    def flush(self) -> bytes:
+        return self._compressor.flush()
+
+
+class _BrotliEncoder:
+    def __init__(self):
+        self._compressor = brotli.Compressor(quality=BROTLI_QUALITY)
+
+    def compress(self, data: bytes) -> bytes:
+        return self._compressor.process(data)
+
+    def flush(self) -> bytes:
+        return self._compressor.finish()
+
+
+def _encoder(coding: str):
+    return _BrotliEncoder() if coding == "br" else _GzipEncoder()
+
+
+def encode(body: bytes, coding: str) -> bytes:
+    """Compress a whole body with a negotiated coding"""
+    encoder = _encoder(coding)
+    return encoder.compress(body) + encoder.flush()
+
+
+def encode_chunks(chunks: Iterable[bytes], coding: Optional[str]) -> Iterator[bytes]:
+    """Compress a streamed body chunk by chunk, passing it through when coding is None"""
+    if coding is None:
+        yield from chunks
+        return
+    encoder = _encoder(coding)
+    for chunk in chunks:
+        compressed = encoder.compress(chunk)
+        if compressed:
+            yield compressed
+    yield encoder.flush()
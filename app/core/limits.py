@@ -0,0 +1,54 @@
+from typing import Iterable
+
+from fastapi import HTTPException
+from fastapi.responses import JSONResponse
+from starlette.datastructures import Headers
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+
+class BodySizeLimitMiddleware:
+    """
+    Reject request bodies larger than `max_bytes` on the given paths with 413.
+
+    A declared Content-Length over the limit is refused before any of the body
+    is read; otherwise the body is counted as it arrives, so an oversized
+    upload is cut off instead of being spooled to the end.
+    """
+
+    def __init__(self, app: ASGIApp, max_bytes: int, paths: Iterable[str]):
+        self.app = app
+        self.max_bytes = max_bytes
+        self.paths = set(paths)
+
+    def _detail(self) -> str:
+        return f"Request body exceeds the {self.max_bytes} byte limit"
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http" or self.max_bytes <= 0 or scope["path"] not in self.paths:
+            await self.app(scope, receive, send)
+            return
+
+        length = Headers(scope=scope).get("content-length")
+        if length and length.isdigit() and int(length) > self.max_bytes:
+            response = JSONResponse(
+                {"detail": self._detail()},
+                status_code=413
+            )
+            await response(scope, receive, send)
+            return
+
+        received = 0
+
+        async def limited_receive() -> Message:
+            nonlocal received
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > self.max_bytes:
+                    raise HTTPException(
+                        status_code=413,
+                        detail=self._detail()
+                    )
+            return message
+
+        await self.app(scope, limited_receive, send)
@@ -0,0 +1,107 @@
+import time
+from contextlib import contextmanager
+from typing import Dict, Optional
+
+from prometheus_client import Counter, Gauge, Histogram
+
+# Seconds, from a few milliseconds for a CDP command to a minute for slow pages
+STAGE_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+RENDER_STAGE_SECONDS = Histogram(
+    'pdf_render_stage_seconds',
+    'Time spent in each stage of a PDF render',
+    ['engine', 'stage'],
+    buckets=STAGE_BUCKETS,
+)
+COMPRESSION_STAGE_SECONDS = Histogram(
+    'pdf_compression_stage_seconds',
+    'Time spent in each stage of a PDF compression',
+    ['stage'],
+    buckets=STAGE_BUCKETS,
+)
+
+RENDER_ERRORS = Counter(
+    'pdf_render_errors_total',
+    'Renders that failed, by reason (timeout, queue_full, error)',
+    ['engine', 'reason'],
+)
+COMPRESSION_ERRORS = Counter(
+    'pdf_compression_errors_total',
+    'Compressions that failed',
+)
+WAIT_TIMEOUTS = Counter(
+    'pdf_render_wait_timeouts_total',
+    'Content load, readiness and font waits that timed out',
+    ['engine', 'stage'],
+)
+BEST_ATTEMPT_FALLBACKS = Counter(
+    'pdf_render_best_attempt_total',
+    'Renders printed anyway after a wait timed out because bestAttempt was set',
+    ['engine', 'stage'],
+)
+OUTPUT_BYTES = Counter(
+    'pdf_output_bytes_total',
+    'Bytes of PDF produced, by operation (render, compress)',
+    ['operation'],
+)
+
+QUEUE_DEPTH = Gauge('pdf_render_queue_depth', 'Renders waiting for a worker')
+RENDERS_IN_FLIGHT = Gauge('pdf_renders_in_flight', 'Renders running')
+
+
+def track_queue(queue):
+    """Report the depth and running renders of a RenderQueue, read at scrape time"""
+    QUEUE_DEPTH.set_function(lambda: queue.stats()['depth'])
+    RENDERS_IN_FLIGHT.set_function(lambda: queue.stats()['running'])
+
+
+def record_timing(timings: Optional[Dict[str, float]], stage: str, seconds: float):
+    """Add a stage duration, in milliseconds, to per-request timings"""
+    if timings is not None:
+        timings[stage] = round(timings.get(stage, 0.0) + seconds * 1000, 3)
+
+
+@contextmanager
+def timed(timings: Optional[Dict[str, float]], stage: str):
+    """Time a stage into per-request timings only"""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        record_timing(timings, stage, time.perf_counter() - start)
+
+
+def _timings(report) -> Optional[Dict[str, float]]:
+    return report.timings if report is not None else None
+
+
+def observe_render_stage(engine: str, stage: str, seconds: float, report=None):
+    RENDER_STAGE_SECONDS.labels(engine, stage).observe(seconds)
+    record_timing(_timings(report), stage, seconds)
+
+
+@contextmanager
+def render_stage(engine: str, stage: str, report=None):
+    """Time a stage of a render into pdf_render_stage_seconds and the report's timings"""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe_render_stage(engine, stage, time.perf_counter() - start, report)
+
+
+@contextmanager
+def compression_stage(stage: str, report=None):
+    """Time a stage of a compression into pdf_compression_stage_seconds and the report's timings"""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        seconds = time.perf_counter() - start
+        COMPRESSION_STAGE_SECONDS.labels(stage).observe(seconds)
+        record_timing(_timings(report), stage, seconds)
+
+
+def server_timing(timings: Dict[str, float]) -> str:
+    """Server-Timing header value for stage durations in milliseconds"""
+    return ", ".join(f"{stage};dur={duration:.1f}" for stage, duration in timings.items())
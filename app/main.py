@@ -1,11 +1,27 @@
-from fastapi import FastAPI
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, Response
 from fastapi.middleware.cors import CORSMiddleware
+from prometheus_client import CONTENT_TYPE_LATEST, generate_latest
 from app.api.v1.endpoints import pdf
+from app.core.config import settings
+from app.core.limits import BodySizeLimitMiddleware
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Resolve Chrome/chromedriver once, off the request path
+    await pdf.pdf_service.start()
+    # Pick up jobs left queued or interrupted by a previous process
+    await pdf.job_manager.start()
+    yield
+    await pdf.job_manager.close()
+    # Quit pooled browsers on shutdown
+    await pdf.pdf_service.close()
 
 app = FastAPI(
     title="HTML to PDF Service",
     description="A service to convert HTML to PDF using Selenium",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan
 )
 
 # Add CORS middleware
@@ -17,9 +33,22 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Refuse oversized uploads before they are spooled
+app.add_middleware(
+    BodySizeLimitMiddleware,
+    max_bytes=settings.COMPRESSION_MAX_UPLOAD_BYTES,
+    paths=["/api/v1/compress-pdf"],
+)
+
 # Include PDF router
 app.include_router(pdf.router, prefix="/api/v1", tags=["pdf"])
 
 @app.get("/")
 async def root():
-    return {"message": "HTML to PDF Service is running"} 
\ No newline at end of file
+    return {"message": "HTML to PDF Service is running"} 
+
+if settings.METRICS_ENABLED:
+    @app.get("/metrics", include_in_schema=False)
+    async def metrics():
+        """Prometheus metrics of this worker process"""
+        return Response(content=generate_latest(), media_type=CONTENT_TYPE_LATEST)
@@ -1,6 +1,7 @@
+import re
 from typing import List, Optional, Dict, Any, Union
 from enum import Enum
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, Field, field_validator
 
 class MediaType(str, Enum):
     SCREEN = "screen"
@@ -41,6 +42,18 @@ class ResourceType(str, Enum):
     CSPVIOLATIONREPORT = "cspviolationreport"
     OTHER = "other"
 
+class CompressionLevel(int, Enum):
+    NONE = 0
+    LEVEL_1 = 1
+    LEVEL_2 = 2
+    LEVEL_3 = 3
+    LEVEL_4 = 4
+    LEVEL_5 = 5
+    LEVEL_6 = 6
+    LEVEL_7 = 7
+    LEVEL_8 = 8
+    MAXIMUM = 9
+
 class ScriptTag(BaseModel):
     url: Optional[str] = None
     path: Optional[str] = None
@@ -108,10 +121,34 @@ class PDFOptions(BaseModel):
     outline: Optional[bool] = False
     timeout: Optional[int] = 30000
     waitForFonts: Optional[bool] = True
+    compressionLevel: Optional[CompressionLevel] = Field(
+        None,
+        description="Compress the generated PDF at this level (0-9) before it is returned"
+    )
+    compressionTargetDpi: Optional[int] = Field(
+        None,
+        gt=0,
+        description="Downsample images of the generated PDF drawn above this resolution"
+    )
+
+def _check_pattern(pattern: str) -> str:
+    try:
+        re.compile(pattern)
+    except re.error as e:
+        raise ValueError(f"Invalid regular expression {pattern!r}: {e}")
+    return pattern
 
 class RequestInterceptor(BaseModel):
-    pattern: str
-    response: Dict[str, Any]
+    pattern: str = Field(..., description="Regular expression searched in the request URL")
+    response: Dict[str, Any] = Field(
+        ...,
+        description="Canned response: status (default 200), headers, contentType and body"
+    )
+
+    @field_validator("pattern")
+    @classmethod
+    def validate_pattern(cls, value: str) -> str:
+        return _check_pattern(value)
 
 class PDFRequest(BaseModel):
     addScriptTag: Optional[List[ScriptTag]] = None
@@ -122,6 +159,7 @@ class PDFRequest(BaseModel):
     emulateMediaType: Optional[MediaType] = None
     html: Optional[str] = None
     url: Optional[str] = None
+    baseUrl: Optional[str] = None
     options: Optional[PDFOptions] = Field(default_factory=PDFOptions)
     rejectRequestPattern: Optional[List[str]] = None
     rejectResourceTypes: Optional[List[ResourceType]] = None
@@ -131,25 +169,53 @@ class PDFRequest(BaseModel):
     userAgent: Optional[str] = None
     viewport: Optional[Viewport] = None
     waitForTimeout: Optional[int] = None
+    waitUntil: Optional[WaitUntil] = WaitUntil.LOAD
+
+    @field_validator("rejectRequestPattern")
+    @classmethod
+    def validate_reject_patterns(cls, value: Optional[List[str]]) -> Optional[List[str]]:
+        for pattern in value or []:
+            _check_pattern(pattern)
+        return value
 
     class Config:
         use_enum_values = True 
 
-class CompressionLevel(int, Enum):
-    NONE = 0
-    LEVEL_1 = 1
-    LEVEL_2 = 2
-    LEVEL_3 = 3
-    LEVEL_4 = 4
-    LEVEL_5 = 5
-    LEVEL_6 = 6
-    LEVEL_7 = 7
-    LEVEL_8 = 8
-    MAXIMUM = 9
+class RenderReport(BaseModel):
+    """Counters and stage timings collected while rendering a single document"""
+    requestsBlocked: int = 0
+    requestsFulfilled: int = 0
+    requestsCached: int = 0
+    originalSize: Optional[int] = None  # Bytes before compression, when the PDF was compressed
+    finalSize: Optional[int] = None  # Bytes after compression
+    timings: Dict[str, float] = Field(default_factory=dict)  # Milliseconds per stage
+    resources: Optional[Dict[str, Any]] = None  # Subresources loaded by the page, when collected
+    collectResources: bool = Field(False, exclude=True)  # Ask the engine to fill `resources`
+
+class PDFBatchRequest(BaseModel):
+    items: List[PDFRequest] = Field(
+        ...,
+        min_length=1,
+        description="Documents to render; results are returned in a ZIP named by item index"
+    )
+
+class CompressionReport(BaseModel):
+    """Sizes, image counts and stage timings of a single compression"""
+    originalSize: int = 0
+    finalSize: int = 0
+    images: int = 0  # Distinct images re-encoded
+    duplicateImages: int = 0  # Repeated image uses that shared an encoding
+    downsampledImages: int = 0
+    timings: Dict[str, float] = Field(default_factory=dict)  # Milliseconds per stage
 
 class PDFCompressionRequest(BaseModel):
     file_path: str
     compression_level: CompressionLevel = Field(
         default=CompressionLevel.LEVEL_5,
         description="Compression level from 0 (no compression) to 9 (maximum compression)"
+    )
+    target_dpi: Optional[int] = Field(
+        default=None,
+        gt=0,
+        description="Downsample images drawn above this resolution (pixels per inch on the page)"
     ) 
\ No newline at end of file
@@ -0,0 +1,194 @@
+import time
+import logging
+import threading
+from contextlib import contextmanager
+from typing import Callable, List, Optional
+
+from selenium.common.exceptions import TimeoutException, WebDriverException
+
+logger = logging.getLogger(__name__)
+
+
+class PooledBrowser:
+    """A long-lived Chrome driver checked out from a BrowserPool."""
+
+    def __init__(self, driver, browser_id: int):
+        self.driver = driver
+        self.id = browser_id
+        self.jobs = 0
+        self.created_at = time.monotonic()
+
+
+class BrowserPool:
+    """
+    Fixed-size pool of long-lived headless Chrome drivers.
+
+    Browsers are launched lazily up to `size`, health-checked on checkout,
+    reset after every job and recycled after `max_jobs` jobs or a crash.
+    """
+
+    def __init__(
+        self,
+        factory: Callable[[], object],
+        size: int = 2,
+        max_jobs: int = 100,
+        acquire_timeout: float = 30.0,
+        reset: Optional[Callable[[object], None]] = None,
+    ):
+        self.factory = factory
+        self.size = max(1, size)
+        self.max_jobs = max(1, max_jobs)
+        self.acquire_timeout = acquire_timeout
+        self.reset = reset
+
+        self._cond = threading.Condition()
+        self._idle: List[PooledBrowser] = []
+        self._live = 0
+        self._in_use = 0
+        self._waiting = 0
+        self._next_id = 1
+        self._closed = False
+
+        # Lifetime counters
+        self._launched = 0
+        self._recycled = 0
+        self._crashed = 0
+        self._health_check_failures = 0
+        self._jobs = 0
+
+    def _launch(self) -> PooledBrowser:
+        with self._cond:
+            browser_id = self._next_id
+            self._next_id += 1
+        logger.info(f"Launching pooled Chrome browser #{browser_id}")
+        driver = self.factory()
+        with self._cond:
+            self._launched += 1
+        return PooledBrowser(driver, browser_id)
+
+    def _quit(self, browser: PooledBrowser):
+        try:
+            browser.driver.quit()
+        except Exception as e:
+            logger.warning(f"Error while closing pooled browser #{browser.id}: {str(e)}")
+
+    def _is_healthy(self, browser: PooledBrowser) -> bool:
+        try:
+            return bool(browser.driver.window_handles)
+        except Exception as e:
+            logger.warning(f"Pooled browser #{browser.id} failed health check: {str(e)}")
+            return False
+
+    def acquire(self) -> PooledBrowser:
+        """Check out a healthy browser, launching or replacing one if needed."""
+        deadline = time.monotonic() + self.acquire_timeout
+        with self._cond:
+            self._waiting += 1
+            try:
+                while True:
+                    if self._closed:
+                        raise RuntimeError("Browser pool is closed")
+                    if self._idle:
+                        browser = self._idle.pop()
+                        break
+                    if self._live < self.size:
+                        self._live += 1
+                        browser = None
+                        break
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        raise TimeoutError("Timed out waiting for a browser from the pool")
+                    self._cond.wait(remaining)
+            finally:
+                self._waiting -= 1
+            self._in_use += 1
+
+        try:
+            if browser is not None and not self._is_healthy(browser):
+                with self._cond:
+                    self._health_check_failures += 1
+                    self._crashed += 1
+                self._quit(browser)
+                browser = None
+            if browser is None:
+                browser = self._launch()
+        except Exception:
+            with self._cond:
+                self._live -= 1
+                self._in_use -= 1
+                self._cond.notify()
+            raise
+
+        return browser
+
+    def release(self, browser: PooledBrowser, broken: bool = False):
+        """Return a browser to the pool, recycling it when worn out or broken."""
+        browser.jobs += 1
+        retire = broken or self._closed or browser.jobs >= self.max_jobs
+
+        if not retire and self.reset:
+            try:
+                self.reset(browser.driver)
+            except Exception as e:
+                logger.warning(f"Failed to reset pooled browser #{browser.id}: {str(e)}")
+                broken = retire = True
+
+        if retire:
+            logger.info(
+                f"Recycling pooled browser #{browser.id} after {browser.jobs} jobs"
+                f"{' (crashed)' if broken else ''}"
+            )
+            self._quit(browser)
+
+        with self._cond:
+            self._jobs += 1
+            self._in_use -= 1
+            if retire:
+                self._live -= 1
+                if broken:
+                    self._crashed += 1
+                else:
+                    self._recycled += 1
+            else:
+                self._idle.append(browser)
+            self._cond.notify()
+
+    @contextmanager
+    def browser(self):
+        """Context manager yielding a pooled driver; WebDriver failures recycle it."""
+        browser = self.acquire()
+        broken = False
+        try:
+            yield browser.driver
+        except WebDriverException as e:
+            # A page timeout leaves the browser usable, anything else is treated as a crash
+            broken = not isinstance(e, TimeoutException)
+            raise
+        finally:
+            self.release(browser, broken=broken)
+
+    def close(self):
+        """Quit all idle browsers; browsers in use are quit when released."""
+        with self._cond:
+            self._closed = True
+            idle, self._idle = self._idle, []
+            self._live -= len(idle)
+            self._cond.notify_all()
+        for browser in idle:
+            self._quit(browser)
+
+    def stats(self) -> dict:
+        with self._cond:
+            return {
+                "size": self.size,
+                "max_jobs": self.max_jobs,
+                "live": self._live,
+                "idle": len(self._idle),
+                "in_use": self._in_use,
+                "waiting": self._waiting,
+                "launched": self._launched,
+                "recycled": self._recycled,
+                "crashed": self._crashed,
+                "health_check_failures": self._health_check_failures,
+                "jobs": self._jobs,
+            }
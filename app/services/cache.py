@@ -0,0 +1,204 @@
+import os
+import time
+import struct
+import logging
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Disk entries start with their expiry timestamp
+_HEADER = struct.Struct('!d')
+
+
+class TieredCache:
+    """
+    Two-tier cache of byte blobs: an in-memory LRU backed by an optional
+    size-bounded directory on disk. Both tiers expire entries after a TTL and
+    evict least recently used entries once over their byte budget.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        memory_bytes: int,
+        ttl: int = 3600,
+        disk_dir: Optional[str] = None,
+        disk_bytes: int = 0,
+    ):
+        self.name = name
+        self.memory_bytes = memory_bytes
+        self.ttl = ttl
+        self.disk_dir = Path(disk_dir) if disk_dir and disk_bytes > 0 else None
+        self.disk_bytes = disk_bytes
+
+        self._lock = threading.Lock()
+        self._memory: 'OrderedDict[str, Tuple[float, bytes]]' = OrderedDict()
+        self._memory_used = 0
+        self._disk: 'OrderedDict[str, int]' = OrderedDict()
+        self._disk_used = 0
+
+        self._memory_hits = 0
+        self._disk_hits = 0
+        self._misses = 0
+        self._bytes_saved = 0
+        self._evictions = 0
+        self._expirations = 0
+
+        if self.disk_dir:
+            self._load_disk_index()
+
+    def _path(self, key: str) -> Path:
+        return self.disk_dir / key[:2] / key
+
+    def _load_disk_index(self):
+        """Rebuild the disk LRU from files left by a previous process, oldest access first"""
+        self.disk_dir.mkdir(parents=True, exist_ok=True)
+        entries = []
+        for path in self.disk_dir.glob('*/*'):
+            if '.' in path.name:
+                # Leftover partial write
+                path.unlink(missing_ok=True)
+                continue
+            try:
+                stat = path.stat()
+            except OSError:
+                continue
+            entries.append((stat.st_atime, path.name, stat.st_size))
+        for _, key, size in sorted(entries):
+            self._disk[key] = size
+            self._disk_used += size
+        self._evict_disk()
+
+    def _evict_memory(self):
+        while self._memory_used > self.memory_bytes and self._memory:
+            _, (_, value) = self._memory.popitem(last=False)
+            self._memory_used -= len(value)
+            self._evictions += 1
+
+    def _evict_disk(self):
+        while self._disk_used > self.disk_bytes and self._disk:
+            key, size = self._disk.popitem(last=False)
+            self._disk_used -= size
+            self._evictions += 1
+            try:
+                self._path(key).unlink()
+            except OSError:
+                pass
+
+    def _drop_disk(self, key: str):
+        size = self._disk.pop(key, None)
+        if size is not None:
+            self._disk_used -= size
+        try:
+            self._path(key).unlink()
+        except OSError:
+            pass
+
+    def _store_memory(self, key: str, expires_at: float, value: bytes):
+        if len(value) > self.memory_bytes:
+            return
+        previous = self._memory.pop(key, None)
+        if previous is not None:
+            self._memory_used -= len(previous[1])
+        self._memory[key] = (expires_at, value)
+        self._memory_used += len(value)
+        self._evict_memory()
+
+    def _read_disk(self, key: str) -> Optional[Tuple[float, bytes]]:
+        try:
+            with open(self._path(key), 'rb') as f:
+                (expires_at,) = _HEADER.unpack(f.read(_HEADER.size))
+                return expires_at, f.read()
+        except (OSError, struct.error):
+            return None
+
+    def get(self, key: str) -> Optional[bytes]:
+        now = time.time()
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                expires_at, value = entry
+                if expires_at > now:
+                    self._memory.move_to_end(key)
+                    self._memory_hits += 1
+                    self._bytes_saved += len(value)
+                    return value
+                del self._memory[key]
+                self._memory_used -= len(value)
+                self._expirations += 1
+
+            if self.disk_dir is None or key not in self._disk:
+                self._misses += 1
+                return None
+            self._disk.move_to_end(key)
+
+        entry = self._read_disk(key)
+        with self._lock:
+            if entry is None or entry[0] <= now:
+                if entry is not None:
+                    self._expirations += 1
+                self._drop_disk(key)
+                self._misses += 1
+                return None
+            expires_at, value = entry
+            self._disk_hits += 1
+            self._bytes_saved += len(value)
+            # Promote to memory so repeated hits skip the disk
+            self._store_memory(key, expires_at, value)
+            return value
+
+    def set(self, key: str, value: bytes, ttl: Optional[int] = None):
+        expires_at = time.time() + (self.ttl if ttl is None else ttl)
+        with self._lock:
+            self._store_memory(key, expires_at, value)
+
+        if self.disk_dir is None or len(value) + _HEADER.size > self.disk_bytes:
+            return
+        path = self._path(key)
+        tmp_path = path.with_name(f'{key}.{threading.get_ident()}.tmp')
+        try:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            with open(tmp_path, 'wb') as f:
+                f.write(_HEADER.pack(expires_at))
+                f.write(value)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            logger.warning(f"Failed to write {self.name} cache entry to disk: {str(e)}")
+            try:
+                tmp_path.unlink()
+            except OSError:
+                pass
+            return
+
+        size = len(value) + _HEADER.size
+        with self._lock:
+            previous = self._disk.pop(key, None)
+            if previous is not None:
+                self._disk_used -= previous
+            self._disk[key] = size
+            self._disk_used += size
+            self._evict_disk()
+
+    def stats(self) -> dict:
+        with self._lock:
+            hits = self._memory_hits + self._disk_hits
+            lookups = hits + self._misses
+            return {
+                "hits": hits,
+                "memory_hits": self._memory_hits,
+                "disk_hits": self._disk_hits,
+                "misses": self._misses,
+                "hit_ratio": round(hits / lookups, 4) if lookups else 0.0,
+                "bytes_saved": self._bytes_saved,
+                "memory_entries": len(self._memory),
+                "memory_bytes": self._memory_used,
+                "memory_limit": self.memory_bytes,
+                "disk_entries": len(self._disk),
+                "disk_bytes": self._disk_used,
+                "disk_limit": self.disk_bytes if self.disk_dir else 0,
+                "evictions": self._evictions,
+                "expirations": self._expirations,
+            }
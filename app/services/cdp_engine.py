@@ -0,0 +1,716 @@
+import json
+import time
+import shutil
+import asyncio
+import logging
+import tempfile
+import base64
+from collections import defaultdict
+from pathlib import Path
+from typing import Any, BinaryIO, Callable, Dict, List, Optional, Tuple, Union
+
+import websockets
+
+from app.core import metrics
+from app.core.config import settings
+from app.models.pdf_options import PDFRequest, PDFOptions, RenderReport, WaitUntil
+from app.services.interception import (
+    BLOCK,
+    CACHEABLE_RESOURCE_TYPES,
+    FULFILL,
+    InterceptionRules,
+    SubresourceCache,
+    freshness_lifetime,
+    fulfill_params,
+)
+from app.services.page_scripts import (
+    DOCUMENT_LOADED_SCRIPT,
+    DOM_CONTENT_LOADED_SCRIPT,
+    FONTS_READY_SCRIPT,
+    RESOURCE_SUMMARY_SCRIPT,
+)
+
+logger = logging.getLogger(__name__)
+
+CHROME_CANDIDATES = ['google-chrome', 'google-chrome-stable', 'chromium', 'chromium-browser', 'chrome']
+
+CHROME_ARGS = [
+    '--headless=new',
+    '--no-sandbox',
+    '--disable-dev-shm-usage',
+    '--disable-gpu',
+    '--disable-software-rasterizer',
+    '--no-first-run',
+    '--no-default-browser-check',
+    '--remote-debugging-port=0',
+]
+
+# Requests allowed to stay in flight for the network idle modes
+NETWORK_IDLE_INFLIGHT = {
+    WaitUntil.NETWORKIDLE0.value: 0,
+    WaitUntil.NETWORKIDLE2.value: 2,
+}
+
+# Quiet period before the network counts as idle, as in Chrome's own lifecycle events
+NETWORK_IDLE_TIME = 0.5
+
+
+class CDPError(Exception):
+    """Raised when Chrome answers a DevTools command with an error or the connection drops."""
+
+
+def page_function(script: str, *args) -> str:
+    """Wrap a page_scripts function body in an IIFE called with JSON-encoded arguments."""
+    return f'(function () {{{script}}})({", ".join(json.dumps(arg) for arg in args)})'
+
+
+class CDPConnection:
+    """A DevTools websocket connection multiplexing flattened target sessions."""
+
+    def __init__(self, ws):
+        self._ws = ws
+        self._next_id = 0
+        self._pending: Dict[int, asyncio.Future] = {}
+        self._listeners: Dict[Tuple[Optional[str], str], List[Callable]] = defaultdict(list)
+        self.closed = False
+        self._reader = asyncio.create_task(self._read_loop())
+
+    @classmethod
+    async def connect(cls, url: str) -> 'CDPConnection':
+        ws = await websockets.connect(url, max_size=None, ping_interval=None)
+        return cls(ws)
+
+    async def send(self, method: str, params: Optional[dict] = None,
+                   session_id: Optional[str] = None, timeout: Optional[float] = None) -> dict:
+        if self.closed:
+            raise CDPError("DevTools connection is closed")
+        self._next_id += 1
+        message_id = self._next_id
+        message = {'id': message_id, 'method': method, 'params': params or {}}
+        if session_id:
+            message['sessionId'] = session_id
+
+        future = asyncio.get_running_loop().create_future()
+        self._pending[message_id] = future
+        try:
+            await self._ws.send(json.dumps(message))
+            return await asyncio.wait_for(future, timeout)
+        finally:
+            self._pending.pop(message_id, None)
+
+    def on(self, method: str, callback: Callable[[dict], Any], session_id: Optional[str] = None) -> Callable[[], None]:
+        """Register an event listener, returning a function that removes it."""
+        key = (session_id, method)
+        self._listeners[key].append(callback)
+        return lambda: self._listeners[key].remove(callback)
+
+    async def _read_loop(self):
+        try:
+            async for raw in self._ws:
+                message = json.loads(raw)
+                if 'id' in message:
+                    future = self._pending.get(message['id'])
+                    if future is None or future.done():
+                        continue
+                    if 'error' in message:
+                        future.set_exception(CDPError(message['error'].get('message', str(message['error']))))
+                    else:
+                        future.set_result(message.get('result', {}))
+                    continue
+
+                key = (message.get('sessionId'), message.get('method'))
+                for callback in list(self._listeners.get(key, ())):
+                    try:
+                        callback(message.get('params', {}))
+                    except Exception as e:
+                        logger.warning(f"DevTools event handler for {key[1]} failed: {str(e)}")
+        except websockets.ConnectionClosed:
+            pass
+        finally:
+            self.closed = True
+            for future in self._pending.values():
+                if not future.done():
+                    future.set_exception(CDPError("DevTools connection closed"))
+
+    async def close(self):
+        self.closed = True
+        await self._ws.close()
+        self._reader.cancel()
+
+
+class CDPSession:
+    """A flattened DevTools session attached to a single page target."""
+
+    def __init__(self, connection: CDPConnection, session_id: str, timeout: Optional[float] = None):
+        self.connection = connection
+        self.session_id = session_id
+        self.timeout = timeout
+
+    async def send(self, method: str, params: Optional[dict] = None, timeout: Optional[float] = None) -> dict:
+        return await self.connection.send(method, params, session_id=self.session_id, timeout=timeout or self.timeout)
+
+    def on(self, method: str, callback: Callable[[dict], Any]) -> Callable[[], None]:
+        return self.connection.on(method, callback, session_id=self.session_id)
+
+    def wait_for(self, method: str) -> asyncio.Future:
+        """Return a future resolved with the params of the next `method` event."""
+        future = asyncio.get_running_loop().create_future()
+
+        def resolve(params):
+            if not future.done():
+                future.set_result(params)
+
+        remove = self.on(method, resolve)
+        future.add_done_callback(lambda _: remove())
+        return future
+
+    async def evaluate(self, expression: str, timeout: Optional[float] = None) -> Any:
+        """Evaluate an expression in the page, awaiting it if it returns a promise."""
+        result = await self.connection.send('Runtime.evaluate', {
+            'expression': expression,
+            'awaitPromise': True,
+            'returnByValue': True,
+        }, session_id=self.session_id, timeout=timeout or self.timeout)
+        if 'exceptionDetails' in result:
+            details = result['exceptionDetails']
+            raise CDPError(details.get('exception', {}).get('description') or details.get('text'))
+        return result.get('result', {}).get('value')
+
+
+class PageReadiness:
+    """
+    Waits for a page to reach a WaitUntil condition, driven by DevTools events.
+
+    Create it before loading content so no lifecycle or network event is missed.
+    Navigations are tracked with Page.lifecycleEvent for their loader; injected
+    documents await their own DOMContentLoaded/load event in the page. The
+    network idle modes then wait until at most 0 (networkidle0) or 2
+    (networkidle2) requests stay in flight for NETWORK_IDLE_TIME.
+    """
+
+    def __init__(self, session: CDPSession, frame_id: str, wait_until: Optional[str]):
+        self.session = session
+        self.frame_id = frame_id
+        self.wait_until = wait_until or WaitUntil.LOAD.value
+        self._loop = asyncio.get_running_loop()
+
+        self._lifecycle: Dict[str, set] = defaultdict(set)
+        self._lifecycle_waiters: List[Tuple[str, str, asyncio.Future]] = []
+        self._inflight: set = set()
+        self._idle: Optional[asyncio.Future] = None
+        self._idle_timer: Optional[asyncio.TimerHandle] = None
+
+        self._removers = [session.on('Page.lifecycleEvent', self._on_lifecycle)]
+        if self.network_idle:
+            self._removers += [
+                session.on('Network.requestWillBeSent', self._on_request),
+                session.on('Network.loadingFinished', self._on_request_done),
+                session.on('Network.loadingFailed', self._on_request_done),
+            ]
+
+    @property
+    def network_idle(self) -> bool:
+        return self.wait_until in NETWORK_IDLE_INFLIGHT
+
+    def _on_lifecycle(self, params: dict):
+        if params.get('frameId') != self.frame_id:
+            return
+        loader_id, name = params.get('loaderId'), params.get('name')
+        self._lifecycle[loader_id].add(name)
+        for waiter_loader, waiter_name, future in self._lifecycle_waiters:
+            if waiter_loader == loader_id and waiter_name == name and not future.done():
+                future.set_result(True)
+
+    def _on_request(self, params: dict):
+        self._inflight.add(params['requestId'])
+        self._check_idle()
+
+    def _on_request_done(self, params: dict):
+        self._inflight.discard(params['requestId'])
+        self._check_idle()
+
+    def _check_idle(self):
+        if self._idle is None or self._idle.done():
+            return
+        if len(self._inflight) > NETWORK_IDLE_INFLIGHT[self.wait_until]:
+            if self._idle_timer is not None:
+                self._idle_timer.cancel()
+                self._idle_timer = None
+        elif self._idle_timer is None:
+            self._idle_timer = self._loop.call_later(NETWORK_IDLE_TIME, self._set_idle)
+
+    def _set_idle(self):
+        self._idle_timer = None
+        if not self._idle.done():
+            self._idle.set_result(True)
+
+    async def _lifecycle_event(self, loader_id: str, name: str):
+        if name in self._lifecycle[loader_id]:
+            return
+        future = self._loop.create_future()
+        waiter = (loader_id, name, future)
+        self._lifecycle_waiters.append(waiter)
+        try:
+            await future
+        finally:
+            self._lifecycle_waiters.remove(waiter)
+
+    async def wait(self, loader_id: Optional[str] = None):
+        """Wait for the navigation identified by `loader_id`, or for injected content when None."""
+        if self.wait_until == WaitUntil.DOMCONTENTLOADED.value:
+            event, script = 'DOMContentLoaded', DOM_CONTENT_LOADED_SCRIPT
+        else:
+            event, script = 'load', DOCUMENT_LOADED_SCRIPT
+
+        if loader_id:
+            await self._lifecycle_event(loader_id, event)
+        else:
+            await self.session.evaluate(page_function(script))
+
+        if self.network_idle:
+            self._idle = self._loop.create_future()
+            self._check_idle()
+            await self._idle
+
+    def close(self):
+        for remove in self._removers:
+            remove()
+        if self._idle_timer is not None:
+            self._idle_timer.cancel()
+
+
+class RequestInterception:
+    """
+    Answers a page's paused requests according to its InterceptionRules and,
+    when given, serves static subresources from the shared SubresourceCache,
+    storing cacheable responses as they arrive. With credentials in the rules
+    it also answers the page's HTTP auth challenges.
+    """
+
+    def __init__(self, session: CDPSession, rules: InterceptionRules, report: RenderReport,
+                 cache: Optional[SubresourceCache] = None):
+        self.session = session
+        self.rules = rules
+        self.report = report
+        self.cache = cache
+        self._tasks: set = set()
+        self._removers = [
+            session.on('Fetch.requestPaused', self._on_paused),
+            session.on('Fetch.authRequired', self._on_auth_required),
+        ]
+
+    async def enable(self):
+        # Chrome only reports auth challenges for requests paused by a pattern
+        if self.rules.active or self.rules.credentials:
+            patterns = [{'urlPattern': '*', 'requestStage': 'Request'}]
+        else:
+            patterns = [
+                {'urlPattern': '*', 'resourceType': resource_type, 'requestStage': 'Request'}
+                for resource_type in sorted(CACHEABLE_RESOURCE_TYPES)
+            ]
+        if self.cache:
+            patterns += [
+                {'urlPattern': '*', 'resourceType': resource_type, 'requestStage': 'Response'}
+                for resource_type in sorted(CACHEABLE_RESOURCE_TYPES)
+            ]
+        await self.session.send('Fetch.enable', {
+            'patterns': patterns,
+            'handleAuthRequests': bool(self.rules.credentials),
+        })
+
+    def _spawn(self, coro):
+        task = asyncio.create_task(coro)
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    def _on_paused(self, params: dict):
+        self._spawn(self._handle(params))
+
+    def _on_auth_required(self, params: dict):
+        self._spawn(self._answer_auth(params))
+
+    async def _answer_auth(self, params: dict):
+        try:
+            await self.session.send('Fetch.continueWithAuth', {
+                'requestId': params['requestId'],
+                'authChallengeResponse': self.rules.auth_response(params.get('authChallenge', {})),
+            })
+        except (CDPError, asyncio.TimeoutError) as e:
+            logger.debug(f"Could not answer auth challenge for {params['request']['url']}: {str(e)}")
+
+    def _cacheable(self, params: dict) -> bool:
+        # Chrome adds challenge credentials below the Fetch domain, so credentialed
+        # requests are recognized by origin rather than by their headers
+        return (
+            self.cache is not None
+            and not self.rules.credentialed(params['request']['url'])
+            and self.cache.cacheable(params['request'], params.get('resourceType', ''))
+        )
+
+    async def _handle(self, params: dict):
+        url = params['request']['url']
+        try:
+            # Paused at the response stage when either response field is present
+            if 'responseStatusCode' in params or 'responseErrorReason' in params:
+                await self._handle_response(params)
+            else:
+                await self._handle_request(params)
+        except (CDPError, asyncio.TimeoutError) as e:
+            # The page may already be gone once the PDF is printed
+            logger.debug(f"Could not answer intercepted request {url}: {str(e)}")
+
+    async def _handle_request(self, params: dict):
+        request_id = params['requestId']
+        resource_type = params.get('resourceType', '')
+        action, interceptor = self.rules.match(params['request']['url'], resource_type)
+        if action == BLOCK:
+            await self.session.send('Fetch.failRequest', {'requestId': request_id, 'errorReason': 'BlockedByClient'})
+            self.report.requestsBlocked += 1
+            return
+        if action == FULFILL:
+            await self.session.send('Fetch.fulfillRequest', fulfill_params(request_id, interceptor))
+            self.report.requestsFulfilled += 1
+            return
+
+        if self._cacheable(params):
+            cached = await asyncio.to_thread(self.cache.get, params['request']['url'])
+            if cached is not None:
+                status, headers, body = cached
+                await self.session.send('Fetch.fulfillRequest', {
+                    'requestId': request_id,
+                    'responseCode': status,
+                    'responseHeaders': headers,
+                    'body': base64.b64encode(body).decode('ascii'),
+                })
+                self.report.requestsCached += 1
+                return
+        await self.session.send('Fetch.continueRequest', {'requestId': request_id})
+
+    async def _handle_response(self, params: dict):
+        request_id = params['requestId']
+        status = params.get('responseStatusCode')
+        headers = params.get('responseHeaders', [])
+        if (
+            status != 200
+            or not self._cacheable(params)
+            or not freshness_lifetime({h['name']: h['value'] for h in headers}, self.cache.max_ttl)
+        ):
+            await self.session.send('Fetch.continueRequest', {'requestId': request_id})
+            return
+
+        response = await self.session.send('Fetch.getResponseBody', {'requestId': request_id})
+        data = response['body']
+        body = base64.b64decode(data) if response.get('base64Encoded') else data.encode('utf-8')
+        await asyncio.to_thread(self.cache.put, params['request']['url'], status, headers, body)
+        # Once its body has been read the response has to be answered explicitly;
+        # the body is already decoded so encoding and length headers no longer apply
+        await self.session.send('Fetch.fulfillRequest', {
+            'requestId': request_id,
+            'responseCode': status,
+            'responseHeaders': [
+                header for header in headers
+                if header['name'].lower() not in ('content-encoding', 'content-length')
+            ],
+            'body': data if response.get('base64Encoded') else base64.b64encode(body).decode('ascii'),
+        })
+
+    def close(self):
+        for remove in self._removers:
+            remove()
+        for task in self._tasks:
+            task.cancel()
+
+
+class ChromeProcess:
+    """A headless Chrome launched with a DevTools websocket endpoint."""
+
+    def __init__(self, binary: str):
+        self.binary = binary
+        self.process: Optional[asyncio.subprocess.Process] = None
+        self.user_data_dir: Optional[str] = None
+        self.connection: Optional[CDPConnection] = None
+
+    async def start(self, timeout: float = 30.0):
+        self.user_data_dir = tempfile.mkdtemp(prefix='html2pdf-chrome-')
+        self.process = await asyncio.create_subprocess_exec(
+            self.binary, *CHROME_ARGS, f'--user-data-dir={self.user_data_dir}', 'about:blank',
+            stdout=asyncio.subprocess.DEVNULL,
+            stderr=asyncio.subprocess.DEVNULL,
+        )
+
+        # Chrome writes the chosen port and browser target path once DevTools is listening
+        port_file = Path(self.user_data_dir) / 'DevToolsActivePort'
+        deadline = asyncio.get_running_loop().time() + timeout
+        while not port_file.exists() or len(port_file.read_text().splitlines()) < 2:
+            if self.process.returncode is not None:
+                raise CDPError(f"Chrome exited during startup with code {self.process.returncode}")
+            if asyncio.get_running_loop().time() > deadline:
+                raise CDPError("Timed out waiting for Chrome DevTools endpoint")
+            await asyncio.sleep(0.05)
+
+        port, path = port_file.read_text().splitlines()[:2]
+        self.connection = await CDPConnection.connect(f'ws://127.0.0.1:{port}{path}')
+        logger.info(f"Chrome {self.process.pid} listening for DevTools on port {port}")
+
+    @property
+    def alive(self) -> bool:
+        return (
+            self.process is not None
+            and self.process.returncode is None
+            and self.connection is not None
+            and not self.connection.closed
+        )
+
+    async def close(self):
+        if self.connection and not self.connection.closed:
+            try:
+                await self.connection.send('Browser.close', timeout=5)
+            except Exception:
+                pass
+            await self.connection.close()
+        if self.process and self.process.returncode is None:
+            try:
+                self.process.terminate()
+                await asyncio.wait_for(self.process.wait(), 5)
+            except Exception:
+                self.process.kill()
+        if self.user_data_dir:
+            shutil.rmtree(self.user_data_dir, ignore_errors=True)
+
+
+class CDPEngine:
+    """
+    Rendering engine driving Chrome over its DevTools websocket from asyncio.
+
+    A single browser process is shared by all renders; every render gets its
+    own browser context and tab, so many pages can render concurrently without
+    chromedriver or worker threads.
+    """
+
+    def __init__(self, pdf_service):
+        self.pdf_service = pdf_service
+        self.binary = settings.CHROME_BINARY
+        self._chrome: Optional[ChromeProcess] = None
+        self._launch_lock: Optional[asyncio.Lock] = None
+        self._pages = 0
+        self._launched = 0
+        self._crashed = 0
+        self._jobs = 0
+
+    def _find_chrome(self) -> str:
+        if self.binary:
+            return self.binary
+        for candidate in CHROME_CANDIDATES:
+            path = shutil.which(candidate)
+            if path:
+                return path
+        raise CDPError("Chrome binary not found, set CHROME_BINARY")
+
+    def _lock(self) -> asyncio.Lock:
+        # Created lazily so it binds to the server's event loop
+        if self._launch_lock is None:
+            self._launch_lock = asyncio.Lock()
+        return self._launch_lock
+
+    async def _browser(self) -> CDPConnection:
+        async with self._lock():
+            if self._chrome is not None and not self._chrome.alive:
+                logger.warning("Chrome process died, relaunching")
+                self._crashed += 1
+                await self._chrome.close()
+                self._chrome = None
+            if self._chrome is None:
+                chrome = ChromeProcess(self._find_chrome())
+                try:
+                    await chrome.start()
+                except Exception:
+                    await chrome.close()
+                    raise
+                self._chrome = chrome
+                self._launched += 1
+            return self._chrome.connection
+
+    async def start(self):
+        await self._browser()
+
+    async def generate_pdf(self, request: PDFRequest, stream: bool = False,
+                           report: Optional[RenderReport] = None,
+                           encoded: bool = False) -> Union[bytes, BinaryIO, str]:
+        options = request.options or PDFOptions()
+        timeout = options.timeout / 1000 if options.timeout else 10
+        report = report or RenderReport()
+        acquire_started = time.perf_counter()
+        connection = await self._browser()
+
+        context_id = None
+        interception = None
+        self._pages += 1
+        try:
+            context_id = (await connection.send('Target.createBrowserContext', timeout=timeout))['browserContextId']
+            target_id = (await connection.send('Target.createTarget', {
+                'url': 'about:blank',
+                'browserContextId': context_id,
+            }, timeout=timeout))['targetId']
+            session_id = (await connection.send('Target.attachToTarget', {
+                'targetId': target_id,
+                'flatten': True,
+            }, timeout=timeout))['sessionId']
+            session = CDPSession(connection, session_id, timeout=timeout)
+
+            await session.send('Page.enable')
+            metrics.observe_render_stage('cdp', 'acquire', time.perf_counter() - acquire_started, report)
+            for method, params in self.pdf_service._request_setting_commands(request):
+                await session.send(method, params)
+
+            rules = InterceptionRules(request)
+            # The shared cache is keyed by URL alone, so it must not see per-user responses
+            cache = None if rules.personalized else self.pdf_service.subresource_cache
+            if rules.active or rules.credentials or cache:
+                # Blocked, fulfilled and cached requests never reach the network
+                interception = RequestInterception(session, rules, report, cache)
+                await interception.enable()
+
+            frame_id = (await session.send('Page.getFrameTree'))['frameTree']['frame']['id']
+            readiness = PageReadiness(session, frame_id, request.waitUntil)
+            try:
+                if readiness.network_idle:
+                    await session.send('Network.enable')
+                with metrics.render_stage('cdp', 'load', report):
+                    loader_id = await self._load_content(session, frame_id, request)
+
+                # Continue as soon as the requested readiness condition fires
+                try:
+                    with metrics.render_stage('cdp', 'readiness', report):
+                        await asyncio.wait_for(readiness.wait(loader_id), timeout)
+                except asyncio.TimeoutError:
+                    metrics.WAIT_TIMEOUTS.labels('cdp', 'readiness').inc()
+                    if not request.bestAttempt:
+                        raise
+                    metrics.BEST_ATTEMPT_FALLBACKS.labels('cdp', 'readiness').inc()
+                    logger.warning(f"Timeout waiting for {readiness.wait_until}, attempting to continue...")
+            finally:
+                readiness.close()
+
+            # Wait for fonts if requested
+            if options.waitForFonts:
+                logger.info("Waiting for fonts to load...")
+                with metrics.render_stage('cdp', 'fonts', report):
+                    await self._wait_for_fonts(session, timeout, request.bestAttempt)
+
+            if report.collectResources:
+                report.resources = await session.evaluate(page_function(RESOURCE_SUMMARY_SCRIPT))
+
+            # Generate PDF
+            logger.info("Generating PDF")
+            print_options = self.pdf_service._build_print_options(options)
+            logger.info(f"Using print options: {print_options}")
+            if stream:
+                print_options['transferMode'] = 'ReturnAsStream'
+            with metrics.render_stage('cdp', 'print', report):
+                # Long documents take longer to print than to load
+                pdf_data = await session.send('Page.printToPDF', print_options, timeout=settings.CDP_PRINT_TIMEOUT)
+
+            if stream:
+                if not pdf_data or 'stream' not in pdf_data:
+                    raise ValueError("Failed to generate PDF stream")
+                with metrics.render_stage('cdp', 'decode', report):
+                    pdf_file = await self._read_stream(session, pdf_data['stream'])
+                logger.info("PDF generation successful")
+                self._jobs += 1
+                return pdf_file
+
+            if not pdf_data or 'data' not in pdf_data:
+                raise ValueError("Failed to generate PDF data")
+
+            if encoded:
+                # Chrome already sent base64, which is what the caller wants
+                logger.info("PDF generation successful")
+                self._jobs += 1
+                return pdf_data['data']
+
+            with metrics.render_stage('cdp', 'decode', report):
+                pdf_content = base64.b64decode(pdf_data['data'])
+            logger.info("PDF generation successful")
+            self._jobs += 1
+
+            return pdf_content
+
+        except Exception as e:
+            logger.error(f"PDF generation failed: {str(e)}", exc_info=True)
+            raise
+
+        finally:
+            self._pages -= 1
+            if interception:
+                interception.close()
+                logger.info(
+                    f"Blocked {report.requestsBlocked}, fulfilled {report.requestsFulfilled} "
+                    f"and served {report.requestsCached} cached request(s)"
+                )
+            if context_id and not connection.closed:
+                try:
+                    await connection.send('Target.disposeBrowserContext', {'browserContextId': context_id}, timeout=5)
+                except Exception as e:
+                    logger.warning(f"Error while disposing browser context: {str(e)}")
+
+    async def _load_content(self, session: CDPSession, frame_id: str, request: PDFRequest) -> Optional[str]:
+        """Navigate to the request URL or inject its HTML, returning the navigation's loader id"""
+        if request.url and not request.html:
+            logger.info(f"Navigating to {request.url}")
+            await session.send('Page.setLifecycleEventsEnabled', {'enabled': True})
+            result = await session.send('Page.navigate', {'url': request.url, 'frameId': frame_id})
+            if result.get('errorText'):
+                raise CDPError(f"Navigation to {request.url} failed: {result['errorText']}")
+            return result.get('loaderId')
+
+        # Load content straight into the blank tab, no temporary file involved
+        logger.info("Injecting HTML content into the page")
+        await session.send('Page.setDocumentContent', {
+            'frameId': frame_id,
+            'html': self.pdf_service._document_html(request),
+        })
+        return None
+
+    async def _read_stream(self, session: CDPSession, handle: str) -> BinaryIO:
+        """Drain a DevTools IO stream chunk by chunk into a spooled file"""
+        spool = self.pdf_service._new_spool()
+        try:
+            while True:
+                chunk = await session.send('IO.read', {
+                    'handle': handle,
+                    'size': settings.PDF_STREAM_CHUNK_SIZE,
+                }, timeout=settings.CDP_PRINT_TIMEOUT)
+                self.pdf_service._write_stream_chunk(spool, chunk)
+                if chunk.get('eof'):
+                    break
+        except Exception:
+            spool.close()
+            raise
+        finally:
+            await session.send('IO.close', {'handle': handle}, timeout=settings.CDP_PRINT_TIMEOUT)
+        spool.seek(0)
+        return spool
+
+    async def _wait_for_fonts(self, session: CDPSession, timeout: float, best_attempt: bool = True) -> dict:
+        """Wait for web fonts in one evaluation and report faces that timed out or failed."""
+        fonts = await session.evaluate(page_function(FONTS_READY_SCRIPT, int(timeout * 1000)), timeout + 5)
+        error = self.pdf_service._check_fonts(fonts, best_attempt)
+        if error:
+            raise asyncio.TimeoutError(error)
+        return fonts
+
+    async def close(self):
+        async with self._lock():
+            if self._chrome is not None:
+                await self._chrome.close()
+                self._chrome = None
+
+    def stats(self) -> dict:
+        return {
+            "pid": self._chrome.process.pid if self._chrome and self._chrome.process else None,
+            "alive": bool(self._chrome and self._chrome.alive),
+            "pages": self._pages,
+            "launched": self._launched,
+            "crashed": self._crashed,
+            "jobs": self._jobs,
+        }
@@ -0,0 +1,204 @@
+import re
+import json
+import time
+import base64
+import hashlib
+from email.utils import parsedate_to_datetime
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import urlsplit
+
+from app.core.config import settings
+from app.models.pdf_options import PDFRequest, RequestInterceptor
+from app.services.cache import TieredCache
+
+CONTINUE = "continue"
+BLOCK = "block"
+FULFILL = "fulfill"
+
+DEFAULT_PORTS = {'http': 80, 'https': 443}
+
+
+def origin(url: Optional[str]) -> Optional[Tuple[str, str, Optional[int]]]:
+    """Normalized (scheme, host, port) of a URL, None when it has no network origin"""
+    if not url:
+        return None
+    try:
+        parts = urlsplit(url)
+        port = parts.port
+    except ValueError:
+        return None
+    if not parts.scheme or not parts.hostname:
+        return None
+    scheme = parts.scheme.lower()
+    return scheme, parts.hostname.lower(), port or DEFAULT_PORTS.get(scheme)
+
+
+class InterceptionRules:
+    """
+    Request rules of a single render, compiled from its PDFRequest.
+
+    Requests whose URL matches a rejectRequestPattern regular expression or
+    whose resource type is listed in rejectResourceTypes are blocked. Otherwise
+    the first requestInterceptor whose pattern matches answers with its canned
+    response, and anything else goes to the network.
+
+    Credentials from `authenticate` are only given in answer to an HTTP auth
+    challenge from the document's own origin (its url, or its base URL for
+    html), never sent up front to every host the page talks to.
+    """
+
+    def __init__(self, request: PDFRequest):
+        self.reject_patterns = [re.compile(pattern) for pattern in request.rejectRequestPattern or []]
+        self.reject_types = {
+            str(getattr(resource_type, 'value', resource_type)).lower()
+            for resource_type in request.rejectResourceTypes or []
+        }
+        self.interceptors = [
+            (re.compile(interceptor.pattern), interceptor)
+            for interceptor in request.requestInterceptors or []
+        ]
+        self.credentials = request.authenticate
+        # Cookies and extra headers are applied below the Fetch domain, so paused
+        # requests do not show them and any response may be personalized
+        self.personalized = bool(request.cookies or request.setExtraHTTPHeaders)
+        self.auth_origin = origin(request.url or request.baseUrl or settings.DOCUMENT_BASE_URL)
+
+    @property
+    def active(self) -> bool:
+        return bool(self.reject_patterns or self.reject_types or self.interceptors)
+
+    def match(self, url: str, resource_type: str) -> Tuple[str, Optional[RequestInterceptor]]:
+        """Decide what to do with a request, given its URL and DevTools resource type"""
+        if resource_type.lower() in self.reject_types:
+            return BLOCK, None
+        if any(pattern.search(url) for pattern in self.reject_patterns):
+            return BLOCK, None
+        for pattern, interceptor in self.interceptors:
+            if pattern.search(url):
+                return FULFILL, interceptor
+        return CONTINUE, None
+
+    def credentialed(self, url: str) -> bool:
+        """Whether requests to this URL may be answered with the render's credentials"""
+        if not self.credentials:
+            return False
+        # Without a document origin any host may challenge, e.g. absolute URLs in plain html
+        return self.auth_origin is None or origin(url) == self.auth_origin
+
+    def auth_response(self, challenge: dict) -> dict:
+        """Build the Fetch.continueWithAuth answer to a Fetch.authRequired challenge"""
+        if challenge.get('source') == 'Server' and self.credentialed(challenge.get('origin', '')):
+            return {
+                'response': 'ProvideCredentials',
+                'username': self.credentials.username,
+                'password': self.credentials.password,
+            }
+        return {'response': 'CancelAuth'}
+
+
+def fulfill_params(request_id: str, interceptor: RequestInterceptor) -> dict:
+    """Build Fetch.fulfillRequest parameters answering a request with an interceptor's response"""
+    response = interceptor.response
+    body = response.get('body', '')
+    if isinstance(body, (dict, list)):
+        body = json.dumps(body)
+    if isinstance(body, str):
+        body = body.encode('utf-8')
+
+    headers = {str(name): str(value) for name, value in (response.get('headers') or {}).items()}
+    if response.get('contentType') and not any(name.lower() == 'content-type' for name in headers):
+        headers['Content-Type'] = response['contentType']
+
+    return {
+        'requestId': request_id,
+        'responseCode': int(response.get('status', 200)),
+        'responseHeaders': [{'name': name, 'value': value} for name, value in headers.items()],
+        'body': base64.b64encode(body).decode('ascii'),
+    }
+
+
+# DevTools resource types served from the shared subresource cache
+CACHEABLE_RESOURCE_TYPES = {'Stylesheet', 'Font', 'Image'}
+
+# Headers that describe the original transfer or the client, not the cached body
+UNCACHED_HEADERS = {
+    'age', 'connection', 'content-encoding', 'content-length', 'date',
+    'keep-alive', 'set-cookie', 'transfer-encoding',
+}
+
+
+def freshness_lifetime(headers: Dict[str, str], max_ttl: int) -> int:
+    """Seconds a response may be served from a shared cache, 0 when it must not be stored"""
+    headers = {name.lower(): value for name, value in headers.items()}
+    if 'set-cookie' in headers or headers.get('vary', '').strip() == '*':
+        return 0
+
+    directives = {}
+    for directive in headers.get('cache-control', '').lower().split(','):
+        name, _, value = directive.strip().partition('=')
+        directives[name] = value.strip('"')
+    if {'no-store', 'no-cache', 'private'} & directives.keys():
+        return 0
+
+    try:
+        if 's-maxage' in directives:
+            lifetime = int(directives['s-maxage'])
+        elif 'max-age' in directives:
+            lifetime = int(directives['max-age'])
+        elif 'expires' in headers:
+            expires = parsedate_to_datetime(headers['expires']).timestamp()
+            date = parsedate_to_datetime(headers['date']).timestamp() if 'date' in headers else time.time()
+            lifetime = int(expires - date)
+        else:
+            return 0
+        lifetime -= int(headers.get('age', 0))
+    except (TypeError, ValueError):
+        return 0
+    return max(0, min(lifetime, max_ttl))
+
+
+class SubresourceCache:
+    """
+    Shared cache of static subresources (CSS, fonts, images) keyed by URL.
+
+    Only successful GET responses that are fresh according to their
+    Cache-Control / Expires headers are stored, for at most `max_ttl` seconds.
+    Entries are kept in a TieredCache so memory and disk use stay bounded.
+    """
+
+    def __init__(self, cache: TieredCache, max_ttl: int):
+        self.cache = cache
+        self.max_ttl = max_ttl
+
+    @staticmethod
+    def cacheable(request: dict, resource_type: str) -> bool:
+        """Whether a paused request may be answered from or stored in the cache"""
+        if request.get('method') != 'GET' or resource_type not in CACHEABLE_RESOURCE_TYPES:
+            return False
+        # Credentialed requests may get per-user responses
+        return not any(name.lower() == 'authorization' for name in request.get('headers', {}))
+
+    def _key(self, url: str) -> str:
+        return hashlib.sha256(url.encode('utf-8')).hexdigest()
+
+    def get(self, url: str) -> Optional[Tuple[int, List[dict], bytes]]:
+        """Return (status, DevTools header entries, body) for a cached URL"""
+        entry = self.cache.get(self._key(url))
+        if entry is None:
+            return None
+        meta, _, body = entry.partition(b'\n')
+        meta = json.loads(meta)
+        return meta['status'], meta['headers'], body
+
+    def put(self, url: str, status: int, headers: List[dict], body: bytes) -> bool:
+        """Store a response if its headers allow it; return whether it was stored"""
+        ttl = freshness_lifetime({header['name']: header['value'] for header in headers}, self.max_ttl)
+        if status != 200 or ttl <= 0:
+            return False
+        kept = [header for header in headers if header['name'].lower() not in UNCACHED_HEADERS]
+        meta = json.dumps({'status': status, 'headers': kept}, separators=(',', ':')).encode('utf-8')
+        self.cache.set(self._key(url), meta + b'\n' + body, ttl=ttl)
+        return True
+
+    def stats(self) -> dict:
+        return self.cache.stats()
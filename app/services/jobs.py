@@ -0,0 +1,294 @@
+import os
+import json
+import time
+import uuid
+import shutil
+import sqlite3
+import asyncio
+import logging
+import threading
+import urllib.request
+from pathlib import Path
+from urllib.parse import urlsplit
+from typing import Dict, List, Optional
+
+from app.core.config import settings
+from app.models.pdf_options import PDFRequest
+
+logger = logging.getLogger(__name__)
+
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+
+# Coarse progress reported for each status
+PROGRESS = {QUEUED: 0.0, RUNNING: 0.5, DONE: 1.0, FAILED: 1.0}
+
+# Webhooks are POSTed with urllib, which would also open file: and ftp: URLs
+WEBHOOK_SCHEMES = {"http", "https"}
+
+# Identifies this process as a job owner; pids alone get reused across container restarts
+OWNER = f"{os.getpid()}:{uuid.uuid4().hex}"
+
+
+class JobStore:
+    """SQLite-backed job records with results stored as files next to the database."""
+
+    def __init__(self, directory: str):
+        self.directory = Path(directory)
+        self._lock = threading.Lock()
+        self._db: Optional[sqlite3.Connection] = None
+
+    def _conn(self) -> sqlite3.Connection:
+        if self._db is None:
+            self.directory.mkdir(parents=True, exist_ok=True)
+            db = sqlite3.connect(str(self.directory / "jobs.db"), check_same_thread=False)
+            db.row_factory = sqlite3.Row
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute(
+                """
+                CREATE TABLE IF NOT EXISTS jobs (
+                    id TEXT PRIMARY KEY,
+                    status TEXT NOT NULL,
+                    request TEXT NOT NULL,
+                    webhook_url TEXT,
+                    error TEXT,
+                    size INTEGER,
+                    owner TEXT,
+                    created_at REAL NOT NULL,
+                    updated_at REAL NOT NULL,
+                    finished_at REAL
+                )
+                """
+            )
+            db.commit()
+            self._db = db
+        return self._db
+
+    def _execute(self, sql: str, params: tuple = ()) -> sqlite3.Cursor:
+        with self._lock:
+            conn = self._conn()
+            cursor = conn.execute(sql, params)
+            conn.commit()
+            return cursor
+
+    def result_path(self, job_id: str) -> Path:
+        return self.directory / f"{job_id}.pdf"
+
+    def create(self, request: PDFRequest, webhook_url: Optional[str] = None) -> dict:
+        job_id = uuid.uuid4().hex
+        now = time.time()
+        self._execute(
+            "INSERT INTO jobs (id, status, request, webhook_url, created_at, updated_at) VALUES (?, ?, ?, ?, ?, ?)",
+            (job_id, QUEUED, request.model_dump_json(), webhook_url, now, now),
+        )
+        return self.get(job_id)
+
+    def get(self, job_id: str) -> Optional[dict]:
+        row = self._execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return dict(row) if row else None
+
+    def claim(self, job_id: str) -> bool:
+        """Atomically move a queued job to running for this process."""
+        cursor = self._execute(
+            "UPDATE jobs SET status = ?, owner = ?, updated_at = ? WHERE id = ? AND status = ?",
+            (RUNNING, OWNER, time.time(), job_id, QUEUED),
+        )
+        return cursor.rowcount == 1
+
+    def finish(self, job_id: str, size: int):
+        now = time.time()
+        self._execute(
+            "UPDATE jobs SET status = ?, size = ?, updated_at = ?, finished_at = ? WHERE id = ?",
+            (DONE, size, now, now, job_id),
+        )
+
+    def fail(self, job_id: str, error: str):
+        now = time.time()
+        self._execute(
+            "UPDATE jobs SET status = ?, error = ?, updated_at = ?, finished_at = ? WHERE id = ?",
+            (FAILED, error, now, now, job_id),
+        )
+
+    def requeue_orphans(self) -> List[str]:
+        """Requeue jobs left running by a process that no longer exists; return all queued ids."""
+        for row in self._execute("SELECT id, owner FROM jobs WHERE status = ?", (RUNNING,)).fetchall():
+            if not _is_orphan(row["owner"]):
+                continue
+            self._execute(
+                "UPDATE jobs SET status = ?, owner = NULL, updated_at = ? WHERE id = ? AND status = ?",
+                (QUEUED, time.time(), row["id"], RUNNING),
+            )
+        rows = self._execute("SELECT id FROM jobs WHERE status = ? ORDER BY created_at", (QUEUED,)).fetchall()
+        return [row["id"] for row in rows]
+
+    def prune(self, retention: int):
+        """Delete finished jobs and their results older than `retention` seconds."""
+        cutoff = time.time() - retention
+        rows = self._execute("SELECT id FROM jobs WHERE finished_at < ?", (cutoff,)).fetchall()
+        for row in rows:
+            try:
+                self.result_path(row["id"]).unlink()
+            except OSError:
+                pass
+        self._execute("DELETE FROM jobs WHERE finished_at < ?", (cutoff,))
+
+    def counts(self) -> Dict[str, int]:
+        rows = self._execute("SELECT status, COUNT(*) AS n FROM jobs GROUP BY status").fetchall()
+        return {row["status"]: row["n"] for row in rows}
+
+    def close(self):
+        with self._lock:
+            if self._db is not None:
+                self._db.close()
+                self._db = None
+
+
+def _is_orphan(owner: Optional[str]) -> bool:
+    """Whether a running job's owning process is gone."""
+    if owner == OWNER:
+        return False
+    try:
+        pid = int((owner or "").split(":", 1)[0])
+    except ValueError:
+        return True
+    if pid == os.getpid():
+        # Our pid, different token: the previous owner was an earlier process
+        return True
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return True
+    except PermissionError:
+        return False
+    return False
+
+
+def valid_webhook_url(url: str) -> bool:
+    """Whether a webhook URL is an absolute http(s) URL."""
+    parts = urlsplit(url)
+    return parts.scheme.lower() in WEBHOOK_SCHEMES and bool(parts.netloc)
+
+
+def job_status(job: dict) -> dict:
+    """Public view of a job record."""
+    return {
+        "job_id": job["id"],
+        "status": job["status"],
+        "progress": PROGRESS.get(job["status"], 0.0),
+        "error": job["error"],
+        "size": job["size"],
+        "created_at": job["created_at"],
+        "updated_at": job["updated_at"],
+        "finished_at": job["finished_at"],
+    }
+
+
+class JobManager:
+    """
+    Runs render jobs in the background of this worker.
+
+    Jobs are persisted in a JobStore before they run, so jobs still queued or
+    interrupted by a restart are picked up again on startup. Finished jobs are
+    pruned on startup and every JOB_PRUNE_INTERVAL seconds afterwards.
+    """
+
+    def __init__(self, store: JobStore, pdf_service):
+        self.store = store
+        self.pdf_service = pdf_service
+        self._tasks: Dict[str, asyncio.Task] = {}
+        self._slots: Optional[asyncio.Semaphore] = None
+        self._pruner: Optional[asyncio.Task] = None
+
+    async def start(self):
+        await asyncio.to_thread(self.store.prune, settings.JOB_RETENTION)
+        for job_id in await asyncio.to_thread(self.store.requeue_orphans):
+            self._schedule(job_id)
+        self._pruner = asyncio.create_task(self._prune_periodically())
+
+    async def _prune_periodically(self):
+        while True:
+            await asyncio.sleep(settings.JOB_PRUNE_INTERVAL)
+            try:
+                await asyncio.to_thread(self.store.prune, settings.JOB_RETENTION)
+            except Exception as e:
+                logger.warning(f"Pruning finished jobs failed: {str(e)}")
+
+    async def submit(self, request: PDFRequest, webhook_url: Optional[str] = None) -> dict:
+        job = await asyncio.to_thread(self.store.create, request, webhook_url)
+        self._schedule(job["id"])
+        return job
+
+    def _schedule(self, job_id: str):
+        if job_id in self._tasks:
+            return
+        if self._slots is None:
+            # Created lazily so it binds to the server's event loop
+            self._slots = asyncio.Semaphore(self.pdf_service.queue.workers)
+        task = asyncio.create_task(self._run(job_id))
+        self._tasks[job_id] = task
+        task.add_done_callback(lambda _: self._tasks.pop(job_id, None))
+
+    async def _run(self, job_id: str):
+        async with self._slots:
+            if not await asyncio.to_thread(self.store.claim, job_id):
+                return
+            job = await asyncio.to_thread(self.store.get, job_id)
+            request = PDFRequest.model_validate_json(job["request"])
+            logger.info(f"Running job {job_id}")
+            try:
+                pdf_file = await self.pdf_service.render(request, stream=True, reject_when_full=False)
+                size = await asyncio.to_thread(self._save_result, job_id, pdf_file)
+                await asyncio.to_thread(self.store.finish, job_id, size)
+                logger.info(f"Job {job_id} finished ({size} bytes)")
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Job {job_id} failed: {str(e)}")
+                await asyncio.to_thread(self.store.fail, job_id, str(e))
+
+        if job["webhook_url"]:
+            job = await asyncio.to_thread(self.store.get, job_id)
+            await asyncio.to_thread(self._notify, job["webhook_url"], job_status(job))
+
+    def _save_result(self, job_id: str, pdf_file) -> int:
+        path = self.store.result_path(job_id)
+        tmp_path = path.with_suffix(".tmp")
+        try:
+            with open(tmp_path, "wb") as f:
+                shutil.copyfileobj(pdf_file, f, settings.PDF_STREAM_CHUNK_SIZE)
+            os.replace(tmp_path, path)
+        finally:
+            pdf_file.close()
+        return path.stat().st_size
+
+    def _notify(self, url: str, payload: dict):
+        if not valid_webhook_url(url):
+            logger.warning(f"Webhook for job {payload['job_id']} skipped: {url} is not an http(s) URL")
+            return
+        request = urllib.request.Request(
+            url,
+            data=json.dumps(payload).encode("utf-8"),
+            headers={"Content-Type": "application/json"},
+            method="POST",
+        )
+        try:
+            with urllib.request.urlopen(request, timeout=settings.JOB_WEBHOOK_TIMEOUT) as response:
+                logger.info(f"Webhook for job {payload['job_id']} answered {response.status}")
+        except Exception as e:
+            logger.warning(f"Webhook for job {payload['job_id']} failed: {str(e)}")
+
+    async def close(self):
+        if self._pruner:
+            self._pruner.cancel()
+        # Interrupted jobs stay "running" for this pid and are requeued by the next process
+        for task in list(self._tasks.values()):
+            task.cancel()
+        self.store.close()
+
+    def stats(self) -> dict:
+        return {
+            "active": len(self._tasks),
+            "by_status": self.store.counts(),
+        }
@@ -0,0 +1,404 @@
+import hashlib
+import threading
+import time
+from functools import lru_cache
+from typing import Dict, Optional
+
+import markdown
+
+from app.core import metrics
+from app.core.config import settings
+from app.services.cache import TieredCache
+
+# Markdown extensions used for every document; "toc" is added on request
+MARKDOWN_EXTENSIONS = (
+    'extra',             # Tables, footnotes, attribute lists, etc.
+    'codehilite',        # Code highlighting
+    'fenced_code',       # Fenced code blocks
+    'nl2br',             # Newlines to <br>
+    'sane_lists',        # Better list handling
+    'smarty',            # Smart quotes, dashes, etc.
+    'tables',            # Tables
+)
+
+THEME_COLORS = {
+    "light": {
+        "bg": "#ffffff",
+        "text": "#333333",
+        "border": "#e2e8f0",
+        "heading": "#2d3748",
+        "link": "#3182ce",
+        "hover": "#2c5282",
+        "code_bg": "#f7fafc",
+        "blockquote": "#718096",
+        "section_bg": "#f8fafc"
+    },
+    "dark": {
+        "bg": "#1a202c",
+        "text": "#e2e8f0",
+        "border": "#4a5568",
+        "heading": "#f7fafc",
+        "link": "#63b3ed",
+        "hover": "#90cdf4",
+        "code_bg": "#2d3748",
+        "blockquote": "#a0aec0",
+        "section_bg": "#2d3748"
+    }
+}
+
+# Default settings
+DEFAULT_FONT_FAMILY = "-apple-system, BlinkMacSystemFont, 'Segoe UI', Roboto, 'Helvetica Neue', Arial, sans-serif"
+DEFAULT_FONT_SIZE = "12pt"
+DEFAULT_LINE_HEIGHT = "1.6"
+DEFAULT_MARGIN = "20px"
+DEFAULT_CONTENT_WIDTH = "800px"
+
+# Markdown instances are expensive to build and not thread-safe, so each thread
+# keeps one per extension set and resets it between documents
+_engines = threading.local()
+
+# Rendered documents keyed by a hash of the content and every styling option
+_output_cache = TieredCache(
+    'markdown',
+    memory_bytes=settings.MARKDOWN_CACHE_MEMORY_BYTES,
+    ttl=settings.MARKDOWN_CACHE_TTL,
+)
+
+
+def _markdown_engine(add_toc: bool) -> markdown.Markdown:
+    extensions = MARKDOWN_EXTENSIONS + (('toc',) if add_toc else ())
+    engines = getattr(_engines, 'by_extensions', None)
+    if engines is None:
+        engines = _engines.by_extensions = {}
+    engine = engines.get(extensions)
+    if engine is None:
+        engine = engines[extensions] = markdown.Markdown(
+            extensions=list(extensions),
+            output_format='html5'
+        )
+    return engine
+
+
+@lru_cache(maxsize=128)
+def stylesheet(
+    theme: str = "light",
+    font_family: Optional[str] = None,
+    font_size: Optional[str] = None,
+    heading_font_family: Optional[str] = None,
+    line_height: Optional[str] = None,
+    margin_top: Optional[str] = None,
+    margin_right: Optional[str] = None,
+    margin_bottom: Optional[str] = None,
+    margin_left: Optional[str] = None,
+    content_width: Optional[str] = None
+) -> str:
+    """Document CSS for a theme and typography combination, built once per combination"""
+    colors = THEME_COLORS[theme]
+    default_font_family = DEFAULT_FONT_FAMILY
+    default_heading_font = DEFAULT_FONT_FAMILY
+    default_font_size = DEFAULT_FONT_SIZE
+    default_line_height = DEFAULT_LINE_HEIGHT
+    default_margin = DEFAULT_MARGIN
+    default_content_width = DEFAULT_CONTENT_WIDTH
+
+    return f"""
+            :root {{
+                color-scheme: {theme};
+            }}
+            body {{
+                font-family: {font_family or default_font_family};
+                line-height: {line_height or default_line_height};
+                font-size: {font_size or default_font_size};
+                color: {colors["text"]};
+                background-color: {colors["bg"]};
+                /* Remove fixed margins to allow PDF options to control them */
+                margin: {margin_top or default_margin} {margin_right or default_margin} {margin_bottom or default_margin} {margin_left or default_margin};
+                padding: 0;
+            }}
+            .container {{
+                width: 100%;
+                /* Remove fixed margins */
+                padding: 0;
+            }}
+            .header {{
+                position: sticky;
+                top: 0;
+                background-color: {colors["bg"]};
+                border-bottom: 1px solid {colors["border"]};
+                padding: 1rem 0;
+                margin-bottom: 2rem;
+                z-index: 100;
+                width: 100%;
+            }}
+            .footer {{
+                margin-top: 2rem;
+                padding: 1rem 0;
+                border-top: 1px solid {colors["border"]};
+                text-align: center;
+                font-size: 0.875rem;
+                color: {colors["blockquote"]};
+                width: 100%;
+            }}
+            .markdown-content {{
+                /* Allow content width to be controlled while keeping it centered */
+                width: {content_width or default_content_width};
+                margin: 0 auto;
+                background-color: {colors["bg"]};
+                padding: 0;
+            }}
+            h1, h2, h3, h4, h5, h6 {{
+                font-family: {heading_font_family or font_family or default_heading_font};
+                font-weight: 600;
+                line-height: 1.25;
+                margin-top: 1.5em;
+                margin-bottom: 0.5em;
+                color: {colors["heading"]};
+            }}
+            h1 {{ font-size: 2em; margin-top: 0; }}
+            h2 {{ font-size: 1.5em; }}
+            h3 {{ font-size: 1.25em; }}
+            h4 {{ font-size: 1em; }}
+            h5 {{ font-size: 0.875em; }}
+            h6 {{ font-size: 0.85em; }}
+            p {{
+                margin: 1em 0;
+            }}
+            ul, ol {{
+                margin: 1em 0;
+                padding-left: 2em;
+            }}
+            li + li {{
+                margin-top: 0.25em;
+            }}
+            li > p {{
+                margin: 0.5em 0;
+            }}
+            blockquote {{
+                margin: 1em 0;
+                padding: 0.5em 1em;
+                color: {colors["blockquote"]};
+                border-left: 4px solid {colors["border"]};
+                background-color: {colors["section_bg"]};
+            }}
+            code {{
+                font-family: 'SFMono-Regular', Consolas, 'Liberation Mono', Menlo, Courier, monospace;
+                padding: 0.2em 0.4em;
+                margin: 0;
+                font-size: 85%;
+                background-color: {colors["code_bg"]};
+                border-radius: 3px;
+            }}
+            pre {{
+                font-family: 'SFMono-Regular', Consolas, 'Liberation Mono', Menlo, Courier, monospace;
+                padding: 1em;
+                overflow: auto;
+                font-size: 85%;
+                line-height: 1.45;
+                background-color: {colors["code_bg"]};
+                border-radius: 6px;
+                margin: 1em 0;
+            }}
+            pre code {{
+                padding: 0;
+                margin: 0;
+                font-size: 100%;
+                background-color: transparent;
+            }}
+            table {{
+                width: 100%;
+                border-collapse: collapse;
+                margin: 1em 0;
+                overflow-x: auto;
+                display: block;
+            }}
+            table th, table td {{
+                padding: 0.5em 1em;
+                border: 1px solid {colors["border"]};
+            }}
+            table tr:nth-child(2n) {{
+                background-color: {colors["section_bg"]};
+            }}
+            img {{
+                max-width: 100%;
+                height: auto;
+                border-radius: 6px;
+            }}
+            hr {{
+                height: 1px;
+                border: none;
+                background-color: {colors["border"]};
+                margin: 2em 0;
+            }}
+            strong {{
+                color: {colors["heading"]};
+                font-weight: 600;
+            }}
+            .true {{
+                color: #48bb78;
+                font-weight: bold;
+            }}
+            .false {{
+                color: #f56565;
+                font-weight: bold;
+            }}
+            .experience-section {{
+                background-color: {colors["section_bg"]};
+                border: 1px solid {colors["border"]};
+                border-radius: 8px;
+                padding: 1.5em;
+                margin: 1.5em 0;
+            }}
+            .experience-header {{
+                display: flex;
+                justify-content: space-between;
+                align-items: flex-start;
+                margin-bottom: 1em;
+            }}
+            .experience-title {{
+                margin: 0;
+                color: {colors["heading"]};
+            }}
+            .experience-meta {{
+                color: {colors["blockquote"]};
+                font-size: 0.875em;
+            }}
+            .experience-content {{
+                margin-top: 1em;
+            }}
+            .toc {{
+                background-color: {colors["section_bg"]};
+                padding: 1.5em;
+                border-radius: 8px;
+                margin: 1.5em 0;
+            }}
+            .toc ul {{
+                list-style-type: none;
+                padding-left: 1em;
+            }}
+            .toc a {{
+                color: {colors["link"]};
+                text-decoration: none;
+            }}
+            .toc a:hover {{
+                color: {colors["hover"]};
+                text-decoration: underline;
+            }}
+            @media print {{
+                body {{
+                    /* Reset all margins for PDF generation */
+                    margin: 0 !important;
+                    padding: 0 !important;
+                    background-color: transparent !important;
+                }}
+                .container {{
+                    margin: 0 !important;
+                    padding: 0 !important;
+                    width: 100% !important;
+                }}
+                .markdown-content {{
+                    /* Reset content constraints for PDF */
+                    width: 100% !important;
+                    max-width: none !important;
+                    margin: 0 !important;
+                    padding: 0 !important;
+                    background-color: transparent !important;
+                }}
+                .header, .footer {{
+                    display: none !important;
+                }}
+                h1:first-of-type {{
+                    margin-top: 0 !important;
+                    padding-top: 0 !important;
+                }}
+                /* Hide default headers and footers */
+                title, head {{
+                    display: none !important;
+                }}
+            }}
+        """
+
+
+def convert_markdown_to_html(
+    markdown_content: str, 
+    title: Optional[str] = None,
+    header: Optional[str] = None,
+    footer: Optional[str] = None,
+    add_toc: bool = False,
+    theme: str = "light",
+    font_family: Optional[str] = None,
+    font_size: Optional[str] = None,
+    heading_font_family: Optional[str] = None,
+    line_height: Optional[str] = None,
+    margin_top: Optional[str] = None,
+    margin_right: Optional[str] = None,
+    margin_bottom: Optional[str] = None,
+    margin_left: Optional[str] = None,
+    content_width: Optional[str] = None,
+    timings: Optional[Dict[str, float]] = None
+) -> str:
+    """
+    Helper function to convert markdown to styled HTML.
+
+    Milliseconds spent in each phase (cache, stylesheet, parse, document) are
+    added to `timings` when given.
+    """
+    style_args = (
+        theme, font_family, font_size, heading_font_family, line_height,
+        margin_top, margin_right, margin_bottom, margin_left, content_width
+    )
+    with metrics.timed(timings, 'cache'):
+        cache_key = hashlib.sha256(
+            repr((markdown_content, title, header, footer, add_toc, style_args)).encode('utf-8')
+        ).hexdigest()
+        cached = _output_cache.get(cache_key)
+    if cached is not None:
+        return cached.decode('utf-8')
+
+    with metrics.timed(timings, 'stylesheet'):
+        css = stylesheet(*style_args)
+
+    if add_toc:
+        markdown_content = '[TOC]\n\n' + markdown_content
+
+    # Convert Markdown to HTML with extended features
+    engine = _markdown_engine(add_toc)
+    try:
+        with metrics.timed(timings, 'parse'):
+            html_content = engine.convert(markdown_content)
+    finally:
+        engine.reset()
+
+    document_started = time.perf_counter()
+
+    # Process TRUE and FALSE to add color classes
+    html_content = html_content.replace('>TRUE<', ' class="true">TRUE<')
+    html_content = html_content.replace('>FALSE<', ' class="false">FALSE<')
+
+    # Create a complete HTML document with styling
+    document = f"""
+    <!DOCTYPE html>
+    <html>
+    <head>
+        <meta charset="UTF-8">
+        <title>{title or 'Markdown Document'}</title>
+        <style>{css}</style>
+    </head>
+    <body>
+        {f'<div class="header">{header}</div>' if header else ''}
+        <div class="container">
+            <div class="markdown-content">
+                {html_content}
+            </div>
+        </div>
+        {f'<div class="footer">{footer}</div>' if footer else ''}
+    </body>
+    </html>
+    """
+
+    _output_cache.set(cache_key, document.encode('utf-8'))
+    metrics.record_timing(timings, 'document', time.perf_counter() - document_started)
+    return document
+
+
+def stats() -> dict:
+    return _output_cache.stats()
@@ -0,0 +1,99 @@
+"""
+JavaScript snippets evaluated in rendered pages.
+
+Each snippet is a function body: Selenium runs it with execute_script and the
+CDP engine wraps it in an IIFE for Runtime.evaluate. Snippets taking parameters
+read them from `arguments`.
+"""
+
+# Wait for the injected document and its subresources to finish loading
+DOCUMENT_LOADED_SCRIPT = """
+    return new Promise((resolve) => {
+        if (document.readyState === 'complete') {
+            resolve(true);
+            return;
+        }
+        window.addEventListener('load', () => resolve(true), { once: true });
+    });
+"""
+
+# Wait for the injected document to be parsed
+DOM_CONTENT_LOADED_SCRIPT = """
+    return new Promise((resolve) => {
+        if (document.readyState !== 'loading') {
+            resolve(true);
+            return;
+        }
+        document.addEventListener('DOMContentLoaded', () => resolve(true), { once: true });
+    });
+"""
+
+# Wait until no resource has finished loading for `idleMs` milliseconds.
+# Only completed resources are observable from the page, so unlike the CDP
+# engine this cannot tell networkidle0 from networkidle2.
+NETWORK_IDLE_SCRIPT = """
+    const idleMs = arguments[0];
+    return new Promise((resolve) => {
+        let timer = setTimeout(finish, idleMs);
+        const observer = new PerformanceObserver(() => {
+            clearTimeout(timer);
+            timer = setTimeout(finish, idleMs);
+        });
+        observer.observe({ type: 'resource' });
+        function finish() {
+            observer.disconnect();
+            resolve(true);
+        }
+    });
+"""
+
+# Wait for web fonts in a single evaluation, giving up after `timeoutMs`.
+# Resolves with the number of declared faces and the faces that timed out or failed.
+FONTS_READY_SCRIPT = """
+    const timeoutMs = arguments[0];
+    const describe = (face) => `${face.family.replace(/["']/g, '')} ${face.style} ${face.weight}`;
+
+    return new Promise((resolve) => {
+        const deadline = new Promise((done) => setTimeout(done, timeoutMs));
+
+        // @font-face rules only appear in document.fonts once their stylesheet has loaded
+        // and once the document has loaded every stylesheet has either loaded or failed
+        const links = document.readyState === 'complete' ? [] : document.querySelectorAll('link[rel~="stylesheet"]');
+        const pendingSheets = Array.from(links)
+            .filter((link) => !link.sheet)
+            .map((link) => new Promise((done) => {
+                link.addEventListener('load', done, { once: true });
+                link.addEventListener('error', done, { once: true });
+            }));
+
+        Promise.race([Promise.all(pendingSheets), deadline]).then(() => {
+            if (!document.fonts || document.fonts.size === 0) {
+                resolve({ fonts: 0, timedOut: [], failed: [] });
+                return;
+            }
+            // Force layout so faces used by the document start loading
+            void (document.body && document.body.offsetHeight);
+            Promise.race([document.fonts.ready, deadline]).then(() => {
+                const faces = Array.from(document.fonts);
+                resolve({
+                    fonts: faces.length,
+                    timedOut: faces.filter((face) => face.status === 'loading').map(describe),
+                    failed: faces.filter((face) => face.status === 'error').map(describe),
+                });
+            });
+        });
+    });
+"""
+
+# Summarize the subresources the page loaded, from the Resource Timing entries.
+# transferSize is 0 for cached, intercepted and cross-origin responses without Timing-Allow-Origin.
+RESOURCE_SUMMARY_SCRIPT = """
+    const entries = performance.getEntriesByType('resource');
+    const byType = {};
+    let transferSize = 0;
+    for (const entry of entries) {
+        byType[entry.initiatorType] = (byType[entry.initiatorType] || 0) + 1;
+        transferSize += entry.transferSize || 0;
+    }
+    return { count: entries.length, byType: byType, transferSize: transferSize };
+"""
@@ -0,0 +1,491 @@
+import os
+import math
+import hashlib
+import logging
+import threading
+import multiprocessing
+from io import BytesIO
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import BinaryIO, Dict, List, Optional, Tuple, Union
+
+from PIL import Image
+from pypdf import PdfReader, PdfWriter
+from pypdf.generic import ContentStream, DictionaryObject, IndirectObject, NameObject
+
+from app.core import metrics
+from app.models.pdf_options import CompressionReport
+
+logger = logging.getLogger(__name__)
+
+# Where an image is used: the /XObject resource dictionary and the name inside it
+ImageUse = Tuple[DictionaryObject, NameObject]
+
+# Linear part (a, b, c, d) of a PDF transformation matrix
+Matrix = Tuple[float, float, float, float]
+
+IDENTITY: Matrix = (1.0, 0.0, 0.0, 1.0)
+
+# PDF user space units per inch
+POINTS_PER_INCH = 72
+
+
+def _encode_image(
+    source: Union[bytes, Image.Image],
+    quality: int,
+    size: Optional[Tuple[int, int]] = None
+) -> bytes:
+    """
+    Re-encode an image as a one-page PDF holding it as a JPEG XObject,
+    downsampled to `size` pixels when given.
+
+    Runs in worker processes: `source` is either raw JPEG data or a decoded
+    PIL image.
+    """
+    if isinstance(source, bytes):
+        image = Image.open(BytesIO(source))
+        if size:
+            # Let the JPEG decoder shrink by a power of two while decoding
+            image.draft(image.mode, size)
+    else:
+        image = source
+    if size and image.size != size:
+        image = image.resize(size, Image.Resampling.LANCZOS)
+    buffer = BytesIO()
+    image.save(buffer, "PDF", quality=quality)
+    return buffer.getvalue()
+
+
+def _image_uses(writer: PdfWriter) -> Dict[int, List[ImageUse]]:
+    """Map every image XObject of the document to the resource entries using it"""
+    uses: Dict[int, List[ImageUse]] = {}
+    visited_forms = set()
+
+    def visit(resources: DictionaryObject):
+        xobjects = resources.get("/XObject")
+        if xobjects is None:
+            return
+        xobjects = xobjects.get_object()
+        for name in list(xobjects.keys()):
+            reference = xobjects.raw_get(name)
+            if not isinstance(reference, IndirectObject):
+                continue
+            xobject = reference.get_object()
+            subtype = xobject.get("/Subtype")
+            if subtype == "/Image":
+                # Stencil masks are 1-bit shapes, not pictures; JPEG would destroy them
+                if not xobject.get("/ImageMask", False):
+                    uses.setdefault(reference.idnum, []).append((xobjects, name))
+            elif subtype == "/Form" and reference.idnum not in visited_forms:
+                visited_forms.add(reference.idnum)
+                if "/Resources" in xobject:
+                    visit(xobject["/Resources"].get_object())
+
+    for page in writer.pages:
+        if "/Resources" in page:
+            visit(page["/Resources"].get_object())
+    return uses
+
+
+def _multiply(m: Matrix, ctm: Matrix) -> Matrix:
+    """Concatenate `m` onto the current transformation matrix, as the cm operator does"""
+    a, b, c, d = m
+    return (
+        a * ctm[0] + b * ctm[2],
+        a * ctm[1] + b * ctm[3],
+        c * ctm[0] + d * ctm[2],
+        c * ctm[1] + d * ctm[3],
+    )
+
+
+def _effective_resolutions(writer: PdfWriter) -> Dict[int, float]:
+    """
+    Map every image XObject drawn by the page contents to the lowest resolution,
+    in pixels per inch, at which it appears on a page.
+
+    The page content streams and the forms they draw are interpreted just far
+    enough to track the transformation matrix in effect at each Do.
+    """
+    resolutions: Dict[int, float] = {}
+
+    def visit(content: ContentStream, resources: DictionaryObject, ctm: Matrix, forms: frozenset):
+        xobjects = resources.get("/XObject")
+        xobjects = xobjects.get_object() if xobjects is not None else {}
+        saved: List[Matrix] = []
+        for operands, operator in content.operations:
+            if operator == b"q":
+                saved.append(ctm)
+            elif operator == b"Q":
+                if saved:
+                    ctm = saved.pop()
+            elif operator == b"cm" and len(operands) == 6:
+                ctm = _multiply(tuple(float(x) for x in operands[:4]), ctm)
+            elif operator == b"Do" and operands and operands[0] in xobjects:
+                reference = xobjects.raw_get(operands[0])
+                if not isinstance(reference, IndirectObject):
+                    continue
+                xobject = reference.get_object()
+                subtype = xobject.get("/Subtype")
+                if subtype == "/Image":
+                    # Images fill the unit square, so the matrix axes give the size on the page
+                    width = math.hypot(ctm[0], ctm[1]) / POINTS_PER_INCH
+                    height = math.hypot(ctm[2], ctm[3]) / POINTS_PER_INCH
+                    if width <= 0 or height <= 0:
+                        continue
+                    resolution = min(xobject["/Width"] / width, xobject["/Height"] / height)
+                    resolutions[reference.idnum] = min(resolutions.get(reference.idnum, math.inf), resolution)
+                elif subtype == "/Form" and reference.idnum not in forms:
+                    matrix = xobject.get("/Matrix") or IDENTITY
+                    form_resources = xobject.get("/Resources")
+                    visit(
+                        ContentStream(xobject, writer),
+                        form_resources.get_object() if form_resources is not None else resources,
+                        _multiply(tuple(float(x) for x in matrix[:4]), ctm),
+                        forms | {reference.idnum}
+                    )
+
+    for page_num, page in enumerate(writer.pages, 1):
+        if "/Contents" not in page or "/Resources" not in page:
+            continue
+        try:
+            visit(ContentStream(page["/Contents"], writer), page["/Resources"].get_object(), IDENTITY, frozenset())
+        except Exception as e:
+            logger.warning(f"Failed to measure image resolutions on page {page_num}: {str(e)}")
+    return resolutions
+
+
+def _downsampled_size(xobject, resolution: Optional[float], target_dpi: Optional[int]) -> Optional[Tuple[int, int]]:
+    """Pixel size bringing an image drawn at `resolution` down to `target_dpi`, or None to keep it"""
+    if not target_dpi or resolution is None or resolution <= target_dpi:
+        return None
+    scale = target_dpi / resolution
+    return (
+        max(1, round(xobject["/Width"] * scale)),
+        max(1, round(xobject["/Height"] * scale)),
+    )
+
+
+def _content_hash(xobject) -> str:
+    """Identify an image by its encoded data and the entries needed to decode it"""
+    digest = hashlib.sha256(xobject._data)
+    entries = sorted((str(key), repr(value)) for key, value in xobject.items() if key != "/Length")
+    digest.update(repr(entries).encode("utf-8"))
+    return digest.hexdigest()
+
+
+def _image_source(xobject) -> Union[bytes, Image.Image]:
+    """What a worker needs to re-encode an image: plain JPEG data as is, anything else decoded"""
+    filters = xobject.get("/Filter")
+    if (
+        filters in ("/DCTDecode", ["/DCTDecode"])
+        and xobject.get("/ColorSpace") in ("/DeviceRGB", "/DeviceGray")
+        and not {"/SMask", "/Mask", "/Decode"} & set(xobject.keys())
+    ):
+        return xobject._data
+    return xobject.decode_as_image()
+
+
+def _install_image(writer: PdfWriter, idnum: int, pdf_data: bytes):
+    """Swap the image object `idnum` for the image of a one-page PDF, as ImageFile.replace does"""
+    page = PdfReader(BytesIO(pdf_data)).pages[0]
+    xobjects = page["/Resources"]["/XObject"]
+    new_image = xobjects[next(iter(xobjects))]
+    reference = IndirectObject(idnum, 0, writer)
+    writer._objects[idnum - 1] = new_image
+    new_image.indirect_reference = reference
+
+
+def _install_contents(page, content, content_obj):
+    """Swap a page's contents for their compressed form, as PageObject.compress_content_streams does"""
+    try:
+        content.indirect_reference.pdf._objects[content.indirect_reference.idnum - 1] = content_obj
+    except AttributeError:
+        page.replace_contents(content_obj)
+
+
+class PDFCompressor:
+    """
+    Recompresses PDF images and content streams.
+
+    Each distinct image is re-encoded once: repeated uses of an image object
+    and byte-identical copies in separate objects share the new encoding, and
+    copies are merged into a single object. Image decoding and JPEG encoding
+    run on a process pool; page content streams are deflated on threads, as
+    zlib releases the GIL.
+    """
+
+    def __init__(self, workers: int = 0):
+        self.workers = workers or os.cpu_count() or 1
+        self._lock = threading.Lock()
+        self._processes: Optional[ProcessPoolExecutor] = None
+        self._threads: Optional[ThreadPoolExecutor] = None
+
+    def _process_pool(self) -> ProcessPoolExecutor:
+        with self._lock:
+            if self._processes is None:
+                # Forking a process that runs threads and browsers is unsafe, so spawn workers
+                self._processes = ProcessPoolExecutor(
+                    max_workers=self.workers,
+                    mp_context=multiprocessing.get_context("spawn")
+                )
+            return self._processes
+
+    def _discard_process_pool(self, executor: ProcessPoolExecutor):
+        """Drop a pool whose worker died so the next document starts a fresh one"""
+        with self._lock:
+            if self._processes is executor:
+                self._processes = None
+        executor.shutdown(wait=False, cancel_futures=True)
+
+    def _thread_pool(self) -> ThreadPoolExecutor:
+        with self._lock:
+            if self._threads is None:
+                self._threads = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="compress")
+            return self._threads
+
+    def _compress_images(self, writer: PdfWriter, quality: int, target_dpi: Optional[int] = None,
+                         report: Optional[CompressionReport] = None,
+                         downsampled_only: bool = False) -> Tuple[int, int]:
+        """
+        Re-encode every distinct image once, downsampling those drawn above
+        `target_dpi`, and return how many duplicate uses were merged and how
+        many images were replaced. With `downsampled_only`, images already at
+        or below `target_dpi` keep their original encoding.
+        """
+        uses = _image_uses(writer)
+        groups: Dict[str, List[int]] = {}
+        for idnum in uses:
+            xobject = writer.get_object(idnum)
+            groups.setdefault(_content_hash(xobject), []).append(idnum)
+
+        # Point every use of a duplicate at the first copy so it is stored and encoded once
+        merged = 0
+        for idnums in groups.values():
+            canonical = IndirectObject(idnums[0], 0, writer)
+            for idnum in idnums[1:]:
+                for xobjects, name in uses[idnum]:
+                    xobjects[name] = canonical
+                    merged += 1
+
+        targets = [idnums[0] for idnums in groups.values()]
+        repeated = sum(len(u) for u in uses.values()) - len(targets)
+        logger.info(f"Compressing {len(targets)} distinct image(s), {repeated} repeated use(s) skipped")
+
+        # Measured after merging, so every placement of a copy counts for the shared object
+        resolutions = _effective_resolutions(writer) if target_dpi else {}
+
+        sources = []
+        for idnum in targets:
+            xobject = writer.get_object(idnum)
+            try:
+                size = _downsampled_size(xobject, resolutions.get(idnum), target_dpi)
+                sources.append((idnum, _image_source(xobject), size))
+            except Exception as e:
+                logger.warning(f"Failed to decode image object {idnum}: {str(e)}")
+        downsampled = sum(1 for _, _, size in sources if size)
+        if downsampled_only:
+            sources = [(idnum, source, size) for idnum, source, size in sources if size]
+        if target_dpi:
+            logger.info(f"Downsampling {downsampled} image(s) drawn above {target_dpi} DPI")
+        if report is not None:
+            report.images = len(sources)
+            report.duplicateImages = repeated
+            report.downsampledImages = downsampled
+
+        executor: Optional[Executor] = self._process_pool() if self.workers > 1 and len(sources) > 1 else None
+        if executor is None:
+            results = ((idnum, _run(_encode_image, source, quality, size)) for idnum, source, size in sources)
+        else:
+            futures = [
+                (idnum, executor.submit(_encode_image, source, quality, size)) for idnum, source, size in sources
+            ]
+            results = ((idnum, _result(future)) for idnum, future in futures)
+
+        replaced = 0
+        for idnum, (pdf_data, error) in results:
+            if isinstance(error, BrokenProcessPool):
+                self._discard_process_pool(executor)
+            if error is not None:
+                logger.warning(f"Failed to compress image object {idnum}: {str(error)}")
+                continue
+            try:
+                _install_image(writer, idnum, pdf_data)
+                replaced += 1
+            except Exception as e:
+                logger.warning(f"Failed to replace image object {idnum}: {str(e)}")
+
+        return merged, replaced
+
+    def _compress_content_streams(self, writer: PdfWriter, level: int):
+        contents = []
+        for page_num, page in enumerate(writer.pages, 1):
+            try:
+                content = page.get_contents()
+            except Exception as e:
+                logger.warning(f"Failed to read content stream for page {page_num}: {str(e)}")
+                continue
+            if content is not None:
+                contents.append((page_num, page, content))
+
+        logger.info(f"Compressing content streams of {len(contents)} page(s)")
+        encoded = self._thread_pool().map(
+            lambda item: _run(item[2].flate_encode, level), contents
+        )
+        # Installing touches the writer's object table, so it stays on this thread
+        for (page_num, page, content), (content_obj, error) in zip(contents, encoded):
+            try:
+                if error is not None:
+                    raise error
+                _install_contents(page, content, content_obj)
+            except Exception as e:
+                logger.warning(f"Failed to compress content stream for page {page_num}: {str(e)}")
+
+    def compress(
+        self,
+        source: Union[str, BinaryIO],
+        compression_level: int,
+        target_dpi: Optional[int] = None,
+        report: Optional[CompressionReport] = None
+    ) -> bytes:
+        """
+        Compress a PDF with the specified compression level (0-9).
+
+        `source` is a path or a seekable binary file, which is read in place.
+        With `target_dpi`, images drawn at a higher resolution than that on
+        their page are downsampled to it before being re-encoded. Sizes, image
+        counts and stage timings are collected into `report` when given. The
+        original is returned whenever the result would not be smaller.
+
+        Level 0: No compression, only downsampling to `target_dpi`
+        Level 1-3: Light compression
+        Level 4-6: Medium compression
+        Level 7-8: High compression
+        Level 9: Maximum compression
+        """
+        if isinstance(source, str):
+            # pypdf copies a path into memory first; a file handle is read in place
+            with open(source, 'rb') as f:
+                return self.compress(f, compression_level, target_dpi, report)
+
+        def original() -> bytes:
+            source.seek(0)
+            data = source.read()
+            metrics.OUTPUT_BYTES.labels('compress').inc(len(data))
+            if report is not None:
+                report.originalSize = report.finalSize = len(data)
+                # Nothing of the document was re-encoded or merged
+                report.images = report.duplicateImages = report.downsampledImages = 0
+            return data
+
+        try:
+            source.seek(0)
+
+            # No compression for level 0 unless images are downsampled
+            if compression_level == 0 and not target_dpi:
+                return original()
+
+            # Calculate image quality based on compression level
+            # Level 0: Original quality (100%)
+            # Level 9: Lowest quality (20%)
+            # Linear interpolation between these points
+            image_quality = max(20, 100 - (compression_level * 10))
+
+            logger.info(f"Processing PDF with compression level {compression_level}")
+            logger.info(f"Image quality: {image_quality}%")
+            logger.info(f"Zlib level: {compression_level}")
+            if target_dpi:
+                logger.info(f"Target image resolution: {target_dpi} DPI")
+
+            # Create writer with the input PDF and add all pages to it
+            with metrics.compression_stage('read', report):
+                writer = PdfWriter()
+                reader = PdfReader(source)
+                for page in reader.pages:
+                    writer.add_page(page)
+
+            # First pass: compress all distinct images. Level 0 only touches images it
+            # downsamples, as re-encoding the rest at full quality just grows them
+            with metrics.compression_stage('images', report):
+                merged, replaced = self._compress_images(
+                    writer, image_quality, target_dpi, report, downsampled_only=compression_level == 0
+                )
+            if compression_level == 0 and not merged and not replaced:
+                logger.info("No image to downsample, keeping the original")
+                return original()
+
+            # Second pass: apply content stream compression
+            if compression_level > 0:
+                with metrics.compression_stage('content_streams', report):
+                    self._compress_content_streams(writer, compression_level)
+
+            # Drop the image copies merged above, and at high compression levels (7-9)
+            # any other duplicate or unreferenced objects
+            if merged or compression_level >= 7:
+                try:
+                    with metrics.compression_stage('deduplicate', report):
+                        writer.compress_identical_objects()
+                except Exception as e:
+                    logger.warning(f"Failed to remove duplicate objects: {str(e)}")
+
+            # Additional optimization for high compression levels (7-9)
+            if compression_level >= 7:
+                try:
+                    logger.info("Applying additional optimizations")
+                    writer.compress_streams = True
+                    writer.compress_content_streams = True
+                except Exception as e:
+                    logger.warning(f"Failed to apply additional optimizations: {str(e)}")
+
+            # Write the compressed PDF in memory
+            with metrics.compression_stage('write', report):
+                output = BytesIO()
+                writer.write(output)
+                compressed_data = output.getvalue()
+
+            source.seek(0, os.SEEK_END)
+            original_size = source.tell()
+            if len(compressed_data) >= original_size:
+                logger.info(f"Compressed size {len(compressed_data) / 1024:.2f}KB is not smaller, keeping the original")
+                return original()
+            metrics.OUTPUT_BYTES.labels('compress').inc(len(compressed_data))
+
+            # Log compression results
+            compressed_size = len(compressed_data)
+            reduction = ((original_size - compressed_size) / original_size) * 100
+            logger.info(f"Original size: {original_size / 1024:.2f}KB")
+            logger.info(f"Compressed size: {compressed_size / 1024:.2f}KB")
+            logger.info(f"Size reduction: {reduction:.1f}%")
+            if report is not None:
+                report.originalSize = original_size
+                report.finalSize = compressed_size
+
+            return compressed_data
+
+        except Exception as e:
+            metrics.COMPRESSION_ERRORS.inc()
+            logger.error(f"PDF compression failed: {str(e)}", exc_info=True)
+            raise
+
+    def close(self):
+        with self._lock:
+            if self._processes is not None:
+                self._processes.shutdown(wait=False, cancel_futures=True)
+                self._processes = None
+            if self._threads is not None:
+                self._threads.shutdown(wait=False, cancel_futures=True)
+                self._threads = None
+
+
+def _run(func, *args):
+    """Call func, returning (result, None) or (None, exception) so one failure never stops the rest"""
+    try:
+        return func(*args), None
+    except Exception as e:
+        return None, e
+
+
+def _result(future):
+    try:
+        return future.result(), None
+    except Exception as e:
+        return None, e
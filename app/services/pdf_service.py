@@ -1,27 +1,138 @@
 import os
+import re
+import time
+import json
+import hashlib
+import shutil
+import asyncio
 import tempfile
 import logging
 import base64
-from pathlib import Path
-from typing import Optional, Union
+import itertools
+import urllib.request
+from contextlib import contextmanager
+from io import BytesIO
+from html import escape
+from typing import BinaryIO, List, Optional, Tuple, Union
+from urllib.parse import quote, urlsplit, urlunsplit
 from selenium import webdriver
 from selenium.webdriver.chrome.service import Service
 from selenium.webdriver.chrome.options import Options
-from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
 from selenium.webdriver.common.by import By
 from webdriver_manager.chrome import ChromeDriverManager
+from pypdf import PdfReader
+from websockets.sync.client import connect as websocket_connect
 from selenium.common.exceptions import TimeoutException, WebDriverException
 
-from app.models.pdf_options import PDFRequest, PDFOptions, PageFormat
+from app.core import metrics
+from app.core.config import settings
+from app.models.pdf_options import CompressionReport, PDFRequest, PDFOptions, PageFormat, RenderReport, WaitUntil
+from app.services.browser_pool import BrowserPool
+from app.services.cache import TieredCache
+from app.services.render_queue import QueueFullError, RenderQueue
+from app.services.pdf_compression import PDFCompressor
+from app.services.interception import InterceptionRules, SubresourceCache
+from app.services.cdp_engine import CDPEngine, NETWORK_IDLE_INFLIGHT, NETWORK_IDLE_TIME
+from app.services.page_scripts import (
+    DOCUMENT_LOADED_SCRIPT,
+    DOM_CONTENT_LOADED_SCRIPT,
+    FONTS_READY_SCRIPT,
+    NETWORK_IDLE_SCRIPT,
+    RESOURCE_SUMMARY_SCRIPT,
+)
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+WARMUP_HTML = "<!DOCTYPE html><html><body><p>warm-up</p></body></html>"
+
+
+def base64_decoded_size(data: str) -> int:
+    """Bytes a base64 string decodes to, without decoding it"""
+    return len(data) * 3 // 4 - len(data[-2:]) + len(data[-2:].rstrip('='))
+
+
+class BrowserConnection:
+    """
+    Blocking DevTools connection to the browser target of a Selenium-driven Chrome.
+
+    execute_cdp_cmd runs on the current page's session, where Chrome refuses
+    browser-wide commands such as Target.createBrowserContext with "Not allowed".
+    Chromedriver reports the browser's DevTools address as debuggerAddress.
+    """
+
+    def __init__(self, ws, timeout: float):
+        self._ws = ws
+        self.timeout = timeout
+        self._ids = itertools.count(1)
+
+    @classmethod
+    @contextmanager
+    def open(cls, driver, timeout: float = 10.0):
+        address = driver.capabilities['goog:chromeOptions']['debuggerAddress']
+        with urllib.request.urlopen(f'http://{address}/json/version', timeout=timeout) as response:
+            url = json.load(response)['webSocketDebuggerUrl']
+        with websocket_connect(url, max_size=None, open_timeout=timeout) as ws:
+            yield cls(ws, timeout)
+
+    def send(self, method: str, params: Optional[dict] = None) -> dict:
+        message_id = next(self._ids)
+        self._ws.send(json.dumps({'id': message_id, 'method': method, 'params': params or {}}))
+        while True:
+            message = json.loads(self._ws.recv(timeout=self.timeout))
+            # No domain is enabled on this session, anything else is a stray event
+            if message.get('id') != message_id:
+                continue
+            if 'error' in message:
+                raise WebDriverException(f"{method} failed: {message['error'].get('message')}")
+            return message.get('result', {})
+
+
 class PDFService:
     def __init__(self):
+        self.driver_path: Optional[str] = None
         self.setup_chrome_options()
+        self.pool = BrowserPool(
+            self._launch_browser,
+            size=settings.BROWSER_POOL_SIZE,
+            max_jobs=settings.BROWSER_MAX_JOBS,
+            acquire_timeout=settings.BROWSER_ACQUIRE_TIMEOUT,
+            reset=self._reset_browser,
+        )
+        self.cdp = CDPEngine(self) if settings.PDF_ENGINE == 'cdp' else None
+        self.queue = RenderQueue(
+            workers=settings.CDP_MAX_PAGES if self.cdp else settings.BROWSER_POOL_SIZE,
+            max_queue=settings.RENDER_QUEUE_SIZE,
+            retry_after=settings.RENDER_RETRY_AFTER,
+        )
+        metrics.track_queue(self.queue)
+        self.render_cache = TieredCache(
+            'render',
+            memory_bytes=settings.RENDER_CACHE_MEMORY_BYTES,
+            ttl=settings.RENDER_CACHE_TTL,
+            disk_dir=settings.RENDER_CACHE_DIR,
+            disk_bytes=settings.RENDER_CACHE_DISK_BYTES,
+        ) if settings.RENDER_CACHE_ENABLED else None
+        # Shared by every page of the cdp engine, which serves it through request interception
+        self.subresource_cache = SubresourceCache(
+            TieredCache(
+                'subresource',
+                memory_bytes=settings.SUBRESOURCE_CACHE_MEMORY_BYTES,
+                disk_dir=settings.SUBRESOURCE_CACHE_DIR,
+                disk_bytes=settings.SUBRESOURCE_CACHE_DISK_BYTES,
+            ),
+            max_ttl=settings.SUBRESOURCE_CACHE_MAX_TTL,
+        ) if settings.SUBRESOURCE_CACHE_ENABLED and self.cdp else None
+        self.compressor = PDFCompressor(workers=settings.COMPRESSION_WORKERS)
+        self.compression_cache = TieredCache(
+            'compression',
+            memory_bytes=settings.COMPRESSION_CACHE_MEMORY_BYTES,
+            ttl=settings.COMPRESSION_CACHE_TTL,
+            disk_dir=settings.COMPRESSION_CACHE_DIR,
+            disk_bytes=settings.COMPRESSION_CACHE_DISK_BYTES,
+        ) if settings.COMPRESSION_CACHE_ENABLED else None
         
     def setup_chrome_options(self):
         self.chrome_options = Options()
@@ -31,6 +142,180 @@ class PDFService:
         self.chrome_options.add_argument('--disable-gpu')
         self.chrome_options.add_argument('--disable-software-rasterizer')
         self.chrome_options.add_experimental_option('excludeSwitches', ['enable-logging'])
+        # driver.get returns at DOMContentLoaded; _wait_until_ready waits for the rest as requested
+        self.chrome_options.page_load_strategy = 'eager'
+        if settings.CHROME_BINARY:
+            self.chrome_options.binary_location = settings.CHROME_BINARY
+
+    def _resolve_driver(self) -> str:
+        """Locate the chromedriver binary once; pinned or offline setups never touch the network"""
+        if self.driver_path:
+            return self.driver_path
+
+        if settings.CHROMEDRIVER_PATH:
+            if not os.path.isfile(settings.CHROMEDRIVER_PATH):
+                raise FileNotFoundError(f"CHROMEDRIVER_PATH {settings.CHROMEDRIVER_PATH} does not exist")
+            driver_path = settings.CHROMEDRIVER_PATH
+        elif settings.WEBDRIVER_OFFLINE:
+            driver_path = shutil.which('chromedriver')
+            if not driver_path:
+                raise FileNotFoundError("chromedriver not found on PATH and WEBDRIVER_OFFLINE is set")
+        else:
+            driver_path = ChromeDriverManager().install()
+
+        logger.info(f"Using chromedriver at {driver_path}")
+        self.driver_path = driver_path
+        return driver_path
+
+    def _launch_browser(self):
+        logger.info("Initializing Chrome driver")
+        service = Service(self._resolve_driver())
+        return webdriver.Chrome(service=service, options=self.chrome_options)
+
+    async def start(self):
+        """Resolve browser binaries before serving traffic and optionally warm up the engine"""
+        if self.cdp:
+            await self.cdp.start()
+        else:
+            await asyncio.to_thread(self._resolve_driver)
+            if settings.SUBRESOURCE_CACHE_ENABLED:
+                logger.warning("The subresource cache requires PDF_ENGINE=cdp and is disabled")
+
+        if settings.WARMUP_ON_STARTUP:
+            # One render per browser so every pooled instance is launched and warm
+            renders = 1 if self.cdp else self.pool.size
+            logger.info(f"Warming up with {renders} render(s)")
+            results = await asyncio.gather(
+                *(self.render(PDFRequest(html=WARMUP_HTML)) for _ in range(renders)),
+                return_exceptions=True
+            )
+            for result in results:
+                if isinstance(result, Exception):
+                    logger.warning(f"Warm-up render failed: {str(result)}")
+
+    def _reset_browser(self, driver):
+        """Make sure no per-request tab survived before a browser goes back to the pool"""
+        if len(driver.window_handles) > 1:
+            raise RuntimeError("Browser context was not disposed")
+
+    @contextmanager
+    def _browser_context(self, driver):
+        """Switch the driver to a fresh tab in a throwaway incognito-style browser context"""
+        base_handle = driver.current_window_handle
+        with BrowserConnection.open(driver) as browser:
+            context_id = browser.send('Target.createBrowserContext')['browserContextId']
+            try:
+                target_id = browser.send('Target.createTarget', {
+                    'url': 'about:blank',
+                    'browserContextId': context_id,
+                })['targetId']
+                # Chromedriver window handles are derived from the DevTools target id
+                handle = next((h for h in driver.window_handles if h.endswith(target_id)), None)
+                if handle is None:
+                    raise WebDriverException(f"Tab {target_id} for browser context not found")
+                driver.switch_to.window(handle)
+                yield driver
+            finally:
+                try:
+                    driver.switch_to.window(base_handle)
+                finally:
+                    # Disposing the context closes its tab and drops its cookies, storage and cache
+                    browser.send('Target.disposeBrowserContext', {'browserContextId': context_id})
+
+    async def close(self):
+        self.queue.close()
+        if self.cdp:
+            await self.cdp.close()
+        await asyncio.to_thread(self.pool.close)
+        self.compressor.close()
+
+    def _request_setting_commands(self, request: PDFRequest) -> List[Tuple[str, dict]]:
+        """Build the CDP commands applying per-request emulation, cookies and headers to a tab"""
+        commands = []
+        if request.viewport:
+            commands.append(('Emulation.setDeviceMetricsOverride', {
+                'width': request.viewport.width,
+                'height': request.viewport.height,
+                'deviceScaleFactor': request.viewport.deviceScaleFactor or 1,
+                'mobile': bool(request.viewport.isMobile),
+            }))
+
+        if request.userAgent:
+            commands.append(('Network.setUserAgentOverride', {'userAgent': request.userAgent}))
+
+        if request.emulateMediaType:
+            commands.append(('Emulation.setEmulatedMedia', {'media': request.emulateMediaType}))
+
+        if request.setJavaScriptEnabled is False:
+            commands.append(('Emulation.setScriptExecutionDisabled', {'value': True}))
+
+        # Credentials from `authenticate` are not a header: they only answer auth challenges
+        headers = request.setExtraHTTPHeaders or {}
+        cookies = []
+        document_url = request.url or request.baseUrl or settings.DOCUMENT_BASE_URL
+        for cookie in request.cookies or []:
+            params = cookie.model_dump(exclude_none=True)
+            # Chrome rejects cookies that tie to neither a url nor a domain
+            if not params.get('url') and not params.get('domain'):
+                if not document_url:
+                    logger.warning(f"Skipping cookie {cookie.name}: it has no url or domain and the document has no URL")
+                    continue
+                params['url'] = document_url
+            cookies.append(params)
+
+        if headers or cookies:
+            commands.append(('Network.enable', {}))
+        if headers:
+            commands.append(('Network.setExtraHTTPHeaders', {'headers': headers}))
+        if cookies:
+            commands.append(('Network.setCookies', {'cookies': cookies}))
+        return commands
+
+    def unsupported_options(self, request: PDFRequest) -> Optional[str]:
+        """Explain which requested options the configured engine cannot honor, if any"""
+        if self.cdp:
+            return None
+        if InterceptionRules(request).active:
+            # Chromedriver cannot deliver Fetch.requestPaused events to answer
+            return "rejectRequestPattern, rejectResourceTypes and requestInterceptors require PDF_ENGINE=cdp"
+        if request.authenticate and request.html:
+            # Only a navigated URL can carry the credentials, see _navigation_url
+            return "authenticate for html content requires PDF_ENGINE=cdp"
+        return None
+
+    def _document_html(self, request: PDFRequest) -> str:
+        """Return the HTML to inject, with a <base> tag so relative URLs resolve against the base URL"""
+        html = request.html or ""
+        base_url = request.baseUrl or settings.DOCUMENT_BASE_URL
+        if not base_url:
+            return html
+
+        base_tag = f'<base href="{escape(base_url, quote=True)}">'
+        head = re.search(r'<head(\s[^>]*)?>', html, re.IGNORECASE)
+        if head:
+            return html[:head.end()] + base_tag + html[head.end():]
+        # The doctype has to stay first or the page drops into quirks mode
+        doctype = re.match(r'\s*<!doctype[^>]*>', html, re.IGNORECASE)
+        if doctype:
+            return html[:doctype.end()] + base_tag + html[doctype.end():]
+        return base_tag + html
+
+    def cache_key(self, request: PDFRequest) -> str:
+        """Content address of a render: the document plus its normalized print options"""
+        options = request.options or PDFOptions()
+        key_data = {
+            'request': request.model_dump(mode='json', exclude={'options'}, exclude_none=True),
+            'baseUrl': request.baseUrl or settings.DOCUMENT_BASE_URL,
+            'print': self._build_print_options(options),
+            'waitForFonts': bool(options.waitForFonts),
+        }
+        if options.compressionLevel is not None or options.compressionTargetDpi:
+            key_data['compression'] = [
+                None if options.compressionLevel is None else int(options.compressionLevel),
+                options.compressionTargetDpi,
+            ]
+        encoded = json.dumps(key_data, sort_keys=True, separators=(',', ':')).encode('utf-8')
+        return hashlib.sha256(encoded).hexdigest()
 
     def _convert_margin_to_inches(self, value: str) -> float:
         """Convert CSS-style margin values to inches"""
@@ -73,270 +358,329 @@ class PDFService:
         
         return page_sizes.get(format or PageFormat.A4)
 
-    def _wait_for_fonts(self, driver, timeout: int = 10):
-        """Wait for all fonts to be loaded on the page."""
+    def _build_print_options(self, options: PDFOptions) -> dict:
+        """Translate PDFOptions into Page.printToPDF parameters"""
+        page_size = self._get_page_size(options.format, options.width, options.height)
+
+        print_options = {
+            'scale': float(options.scale or 1.0),
+            'printBackground': bool(options.printBackground),
+            'paperWidth': float(page_size['width']),
+            'paperHeight': float(page_size['height']),
+            'marginTop': self._convert_margin_to_inches(options.margin.top) if options.margin else 0,
+            'marginBottom': self._convert_margin_to_inches(options.margin.bottom) if options.margin else 0,
+            'marginLeft': self._convert_margin_to_inches(options.margin.left) if options.margin else 0,
+            'marginRight': self._convert_margin_to_inches(options.margin.right) if options.margin else 0,
+            'landscape': bool(options.landscape),
+            'preferCSSPageSize': bool(options.preferCSSPageSize)
+        }
+
+        # Add optional parameters only if they are specified and not None
+        if options.displayHeaderFooter:
+            print_options['displayHeaderFooter'] = True
+            if options.headerTemplate:
+                print_options['headerTemplate'] = options.headerTemplate
+            if options.footerTemplate:
+                print_options['footerTemplate'] = options.footerTemplate
+
+        if options.pageRanges:
+            print_options['pageRanges'] = options.pageRanges
+
+        return print_options
+
+    def _wait_for_fonts(self, driver, timeout: float = 10, best_attempt: bool = True) -> dict:
+        """Wait for web fonts in one evaluation and report faces that timed out or failed."""
+        # The script gives up on its own at the timeout; leave it room to report back
+        driver.set_script_timeout(timeout + 5)
+        fonts = driver.execute_script(FONTS_READY_SCRIPT, int(timeout * 1000))
+        error = self._check_fonts(fonts, best_attempt)
+        if error:
+            raise TimeoutException(error)
+        return fonts
+
+    @property
+    def engine(self) -> str:
+        return 'cdp' if self.cdp else 'selenium'
+
+    def _check_fonts(self, fonts: dict, best_attempt: bool = True) -> Optional[str]:
+        """Log a font readiness report, returning an error when timed out faces should fail the render"""
+        if fonts['failed']:
+            logger.warning(f"Fonts failed to load: {', '.join(fonts['failed'])}")
+        if fonts['timedOut']:
+            metrics.WAIT_TIMEOUTS.labels(self.engine, 'fonts').inc()
+            message = f"Timeout while waiting for fonts to load: {', '.join(fonts['timedOut'])}"
+            if not best_attempt:
+                return message
+            metrics.BEST_ATTEMPT_FALLBACKS.labels(self.engine, 'fonts').inc()
+            logger.warning(f"{message}, attempting to continue...")
+        elif fonts['fonts']:
+            logger.info(f"{fonts['fonts']} font face(s) ready")
+        return None
+
+    async def render(self, request: PDFRequest, stream: bool = False,
+                     reject_when_full: bool = True,
+                     report: Optional[RenderReport] = None,
+                     encoded: bool = False) -> Union[bytes, BinaryIO, str]:
+        """
+        Render with the configured engine without blocking the event loop.
+
+        With stream=True the PDF is read from Chrome in chunks into a spooled
+        file, returned rewound, so memory stays bounded by the chunk size.
+        With encoded=True (ignored when streaming) the PDF is returned as the
+        base64 string Chrome produced, without decoding it.
+        Per-render counters are collected into `report` when given.
+
+        When the options ask for compression, the PDF goes through the
+        compressor in memory after its render slot is released.
+        """
+        queued_at = time.perf_counter()
+        options = request.options or PDFOptions()
+        compress = options.compressionLevel is not None or options.compressionTargetDpi
+        encoded = encoded and not stream
+        # The compressor needs the decoded PDF, so only skip decoding when nothing follows
+        engine_encoded = encoded and not compress
+
+        def started():
+            metrics.observe_render_stage(self.engine, 'queue', time.perf_counter() - queued_at, report)
+
         try:
-            # First wait for Google Fonts stylesheet to load
-            script_google_fonts = """
-                return new Promise((resolve) => {
-                    const links = document.querySelectorAll('link[href*="fonts.googleapis.com"]');
-                    if (links.length === 0) {
-                        resolve(true);
-                        return;
-                    }
-                    
-                    const promises = Array.from(links).map(link => {
-                        return new Promise((resolve) => {
-                            if (link.sheet) {
-                                resolve();
-                            } else {
-                                link.onload = () => resolve();
-                                link.onerror = () => resolve();
-                            }
-                        });
-                    });
-                    
-                    Promise.all(promises).then(() => {
-                        // Add a small delay to ensure fonts start loading
-                        setTimeout(() => resolve(true), 100);
-                    });
-                });
-            """
-            WebDriverWait(driver, timeout).until(
-                lambda d: d.execute_script(script_google_fonts)
-            )
-            logger.info("Google Fonts stylesheet loaded")
-
-            # Then wait for all fonts to be loaded
-            script_fonts = """
-                return new Promise((resolve) => {
-                    if (document.fonts && document.fonts.ready) {
-                        document.fonts.ready.then(() => {
-                            // Additional check for each font load state
-                            const fontPromises = Array.from(document.fonts).map(font => font.load());
-                            Promise.all(fontPromises)
-                                .then(() => {
-                                    // Add a small delay to ensure complete font loading
-                                    setTimeout(() => resolve(true), 100);
-                                })
-                                .catch(() => resolve(false));
-                        });
-                    } else {
-                        // Fallback for browsers not supporting document.fonts
-                        setTimeout(() => resolve(true), 1000);
-                    }
-                });
-            """
-            WebDriverWait(driver, timeout).until(
-                lambda d: d.execute_script(script_fonts)
+            if self.cdp:
+                async def run():
+                    started()
+                    return await self.cdp.generate_pdf(request, stream, report, engine_encoded)
+                pdf = await self.queue.run_async(run, reject_when_full=reject_when_full)
+            else:
+                def run():
+                    started()
+                    return self.generate_pdf(request, stream, report, engine_encoded)
+                pdf = await self.queue.run(run, reject_when_full=reject_when_full)
+        except QueueFullError:
+            metrics.RENDER_ERRORS.labels(self.engine, 'queue_full').inc()
+            raise
+        except (TimeoutException, asyncio.TimeoutError):
+            metrics.RENDER_ERRORS.labels(self.engine, 'timeout').inc()
+            raise
+        except Exception:
+            metrics.RENDER_ERRORS.labels(self.engine, 'error').inc()
+            raise
+
+        if compress:
+            pdf = await self._compress_output(
+                pdf, stream, int(options.compressionLevel or 0), options.compressionTargetDpi, report
             )
-            logger.info("All fonts loaded successfully")
 
-            # Final verification of font loading
-            verification_script = """
-                return Array.from(document.fonts).every(font => font.status === 'loaded');
-            """
-            if not driver.execute_script(verification_script):
-                logger.warning("Font verification failed, some fonts might not be loaded correctly")
-                raise TimeoutException("Font verification failed")
+        if stream:
+            size = pdf.seek(0, os.SEEK_END)
+            pdf.seek(0)
+        elif engine_encoded:
+            size = base64_decoded_size(pdf)
+        else:
+            size = len(pdf)
+        if encoded and not engine_encoded:
+            pdf = base64.b64encode(pdf).decode('ascii')
+        metrics.OUTPUT_BYTES.labels('render').inc(size)
+        return pdf
+
+    async def _compress_output(self, pdf: Union[bytes, BinaryIO], stream: bool, compression_level: int,
+                               target_dpi: Optional[int],
+                               report: Optional[RenderReport] = None) -> Union[bytes, BinaryIO]:
+        """Compress a rendered PDF, keeping the original when compression does not make it smaller"""
+        source = pdf if stream else BytesIO(pdf)
+        try:
+            source.seek(0, os.SEEK_END)
+            original_size = source.tell()
+            with metrics.timed(report.timings if report is not None else None, 'compress'):
+                compressed = await asyncio.to_thread(self.compress_pdf, source, compression_level, target_dpi)
+            if len(compressed) >= original_size:
+                logger.info("Compression did not reduce the PDF, keeping the original")
+                source.seek(0)
+                compressed = source.read()
+        finally:
+            source.close()
+
+        if report is not None:
+            report.originalSize = original_size
+            report.finalSize = len(compressed)
+        return BytesIO(compressed) if stream else compressed
+
+    def _new_spool(self) -> BinaryIO:
+        """Spooled file holding at most one chunk in memory before rolling over to disk"""
+        return tempfile.SpooledTemporaryFile(max_size=settings.PDF_STREAM_CHUNK_SIZE)
+
+    def _write_stream_chunk(self, spool: BinaryIO, chunk: dict):
+        if chunk.get('base64Encoded'):
+            spool.write(base64.b64decode(chunk['data']))
+        else:
+            spool.write(chunk['data'].encode('utf-8'))
+
+    def _read_stream(self, driver, handle: str) -> BinaryIO:
+        """Drain a DevTools IO stream chunk by chunk into a spooled file"""
+        spool = self._new_spool()
+        try:
+            while True:
+                chunk = driver.execute_cdp_cmd('IO.read', {'handle': handle, 'size': settings.PDF_STREAM_CHUNK_SIZE})
+                self._write_stream_chunk(spool, chunk)
+                if chunk.get('eof'):
+                    break
+        except Exception:
+            spool.close()
+            raise
+        finally:
+            driver.execute_cdp_cmd('IO.close', {'handle': handle})
+        spool.seek(0)
+        return spool
+
+    def _navigation_url(self, request: PDFRequest) -> str:
+        """
+        The request URL, carrying `authenticate` credentials in its userinfo.
+
+        Chromedriver cannot deliver Fetch.authRequired events, but Chrome keeps
+        URL credentials for the navigated origin and uses them to answer its
+        auth challenges, so other hosts never see them.
+        """
+        if not request.authenticate:
+            return request.url
+        parts = urlsplit(request.url)
+        userinfo = f"{quote(request.authenticate.username, safe='')}:{quote(request.authenticate.password, safe='')}"
+        host = parts.netloc.rpartition('@')[2]
+        return urlunsplit(parts._replace(netloc=f'{userinfo}@{host}'))
+
+    def _load_content(self, driver, request: PDFRequest, timeout: float):
+        """Navigate to the request URL or inject its HTML into the current tab"""
+        if request.url and not request.html:
+            logger.info(f"Navigating to {request.url}")
+            driver.set_page_load_timeout(timeout)
+            driver.get(self._navigation_url(request))
+            return
+
+        # Load content straight into the blank tab, no temporary file involved
+        logger.info("Injecting HTML content into the page")
+        frame_id = driver.execute_cdp_cmd('Page.getFrameTree', {})['frameTree']['frame']['id']
+        driver.execute_cdp_cmd('Page.setDocumentContent', {
+            'frameId': frame_id,
+            'html': self._document_html(request),
+        })
+
+    def _wait_until_ready(self, driver, wait_until: Optional[str], timeout: float):
+        """
+        Await the page's own load events instead of polling readyState.
+
+        Chromedriver cannot deliver DevTools events, so the network idle modes
+        fall back to waiting for a quiet period without finished resources.
+        """
+        driver.set_script_timeout(timeout)
+        if wait_until == WaitUntil.DOMCONTENTLOADED.value:
+            driver.execute_script(DOM_CONTENT_LOADED_SCRIPT)
+            return
+        driver.execute_script(DOCUMENT_LOADED_SCRIPT)
+        if wait_until in NETWORK_IDLE_INFLIGHT:
+            driver.execute_script(NETWORK_IDLE_SCRIPT, int(NETWORK_IDLE_TIME * 1000))
+
+    def generate_pdf(self, request: PDFRequest, stream: bool = False,
+                     report: Optional[RenderReport] = None,
+                     encoded: bool = False) -> Union[bytes, BinaryIO, str]:
+        try:
+            acquire_started = time.perf_counter()
+            with self.pool.browser() as driver, self._browser_context(driver):
+                metrics.observe_render_stage('selenium', 'acquire', time.perf_counter() - acquire_started, report)
+                return self._render(driver, request, stream, report, encoded)
 
-        except TimeoutException:
-            logger.warning("Timeout while waiting for fonts to load")
-            raise TimeoutException("Timeout while waiting for fonts to load")
         except Exception as e:
-            logger.error(f"Error while waiting for fonts: {str(e)}")
+            logger.error(f"PDF generation failed: {str(e)}", exc_info=True)
             raise
 
-    def generate_pdf(self, request: PDFRequest) -> Union[bytes, str]:
-        temp_dir = tempfile.mkdtemp()
-        temp_html = Path(temp_dir) / "temp.html"
-        driver = None
+    def _render(self, driver, request: PDFRequest, stream: bool = False,
+                report: Optional[RenderReport] = None,
+                encoded: bool = False) -> Union[bytes, BinaryIO, str]:
+        options = request.options or PDFOptions()
+        timeout = options.timeout / 1000 if options.timeout else 10
 
+        for method, params in self._request_setting_commands(request):
+            driver.execute_cdp_cmd(method, params)
+
+        unsupported = self.unsupported_options(request)
+        if unsupported:
+            raise ValueError(unsupported)
+
+        # Continue as soon as the requested readiness condition fires
+        waiting_for = 'load'
         try:
-            # Set viewport if specified
-            if request.viewport:
-                self.chrome_options.add_argument(
-                    f'--window-size={request.viewport.width},{request.viewport.height}'
-                )
-
-            # Initialize Chrome driver
-            logger.info("Initializing Chrome driver")
-            service = Service(ChromeDriverManager().install())
-            driver = webdriver.Chrome(service=service, options=self.chrome_options)
-
-            # Load content
-            logger.info("Writing HTML content to temporary file")
-            temp_html.write_text(request.html or "", encoding='utf-8')
-            driver.get(f'file:///{temp_html.absolute()}')
-
-            # Wait for page load
-            try:
-                WebDriverWait(driver, request.options.timeout / 1000 if request.options else 10).until(
-                    lambda d: d.execute_script('return document.readyState') == 'complete'
-                )
-            except TimeoutException:
-                if not request.bestAttempt:
-                    raise
-                logger.warning("Page load timeout, attempting to continue...")
-
-            # Wait for fonts if requested
-            options = request.options or PDFOptions()
-            if options.waitForFonts:
-                logger.info("Waiting for fonts to load...")
-                self._wait_for_fonts(driver, timeout=options.timeout / 1000 if options.timeout else 10)
-
-            # Generate PDF
-            logger.info("Generating PDF")
-            page_size = self._get_page_size(options.format, options.width, options.height)
-            
-            print_options = {
-                'scale': float(options.scale or 1.0),
-                'printBackground': bool(options.printBackground),
-                'paperWidth': float(page_size['width']),
-                'paperHeight': float(page_size['height']),
-                'marginTop': self._convert_margin_to_inches(options.margin.top) if options.margin else 0,
-                'marginBottom': self._convert_margin_to_inches(options.margin.bottom) if options.margin else 0,
-                'marginLeft': self._convert_margin_to_inches(options.margin.left) if options.margin else 0,
-                'marginRight': self._convert_margin_to_inches(options.margin.right) if options.margin else 0,
-                'landscape': bool(options.landscape),
-                'preferCSSPageSize': bool(options.preferCSSPageSize)
-            }
+            with metrics.render_stage('selenium', 'load', report):
+                self._load_content(driver, request, timeout)
+            waiting_for = 'readiness'
+            with metrics.render_stage('selenium', 'readiness', report):
+                self._wait_until_ready(driver, request.waitUntil, timeout)
+        except TimeoutException:
+            metrics.WAIT_TIMEOUTS.labels('selenium', waiting_for).inc()
+            if not request.bestAttempt:
+                raise
+            metrics.BEST_ATTEMPT_FALLBACKS.labels('selenium', waiting_for).inc()
+            logger.warning(f"Timeout waiting for {request.waitUntil}, attempting to continue...")
+
+        # Wait for fonts if requested
+        if options.waitForFonts:
+            logger.info("Waiting for fonts to load...")
+            with metrics.render_stage('selenium', 'fonts', report):
+                self._wait_for_fonts(driver, timeout, request.bestAttempt)
 
-            # Add optional parameters only if they are specified and not None
-            if options.displayHeaderFooter:
-                print_options['displayHeaderFooter'] = True
-                if options.headerTemplate:
-                    print_options['headerTemplate'] = options.headerTemplate
-                if options.footerTemplate:
-                    print_options['footerTemplate'] = options.footerTemplate
-            
-            if options.pageRanges:
-                print_options['pageRanges'] = options.pageRanges
-
-            logger.info(f"Using print options: {print_options}")
+        if report is not None and report.collectResources:
+            report.resources = driver.execute_script(RESOURCE_SUMMARY_SCRIPT)
+
+        # Generate PDF
+        logger.info("Generating PDF")
+        print_options = self._build_print_options(options)
+        logger.info(f"Using print options: {print_options}")
+        if stream:
+            print_options['transferMode'] = 'ReturnAsStream'
+        with metrics.render_stage('selenium', 'print', report):
             pdf_data = driver.execute_cdp_cmd('Page.printToPDF', print_options)
-            
-            if not pdf_data or 'data' not in pdf_data:
-                raise ValueError("Failed to generate PDF data")
 
-            pdf_content = base64.b64decode(pdf_data['data'])
+        if stream:
+            if not pdf_data or 'stream' not in pdf_data:
+                raise ValueError("Failed to generate PDF stream")
+            with metrics.render_stage('selenium', 'decode', report):
+                pdf_file = self._read_stream(driver, pdf_data['stream'])
             logger.info("PDF generation successful")
-            
-            return pdf_content
+            return pdf_file
 
-        except Exception as e:
-            logger.error(f"PDF generation failed: {str(e)}", exc_info=True)
-            raise
+        if not pdf_data or 'data' not in pdf_data:
+            raise ValueError("Failed to generate PDF data")
 
-        finally:
-            # Clean up resources
-            logger.info("Cleaning up resources")
-            if driver:
-                try:
-                    driver.quit()
-                except Exception as e:
-                    logger.warning(f"Error while closing driver: {str(e)}")
+        if encoded:
+            # Chrome already sent base64, which is what the caller wants
+            logger.info("PDF generation successful")
+            return pdf_data['data']
 
-            # Clean up temporary files
-            try:
-                if temp_html.exists():
-                    temp_html.unlink()
-                os.rmdir(temp_dir)
-            except Exception as e:
-                logger.warning(f"Error while cleaning temporary files: {str(e)}") 
+        with metrics.render_stage('selenium', 'decode', report):
+            pdf_content = base64.b64decode(pdf_data['data'])
+        logger.info("PDF generation successful")
+
+        return pdf_content
 
-    def compress_pdf(self, file_path: str, compression_level: int) -> bytes:
+    def compress_pdf(
+        self,
+        source: Union[str, BinaryIO],
+        compression_level: int,
+        target_dpi: Optional[int] = None,
+        report: Optional[CompressionReport] = None
+    ) -> bytes:
         """
-        Compress a PDF file with the specified compression level (0-9).
-        
-        Level 0: No compression
-        Level 1-3: Light compression
-        Level 4-6: Medium compression
-        Level 7-8: High compression
-        Level 9: Maximum compression
+        Compress a PDF path or seekable binary file with the specified compression level (0-9),
+        downsampling images drawn above target_dpi when given
         """
-        try:
-            from pypdf import PdfReader, PdfWriter
-            
-            # No compression for level 0
-            if compression_level == 0:
-                with open(file_path, 'rb') as f:
-                    return f.read()
-            
-            # Calculate image quality based on compression level
-            # Level 0: Original quality (100%)
-            # Level 9: Lowest quality (20%)
-            # Linear interpolation between these points
-            image_quality = max(20, 100 - (compression_level * 10))
-            
-            # Create a temporary file for the output
-            with tempfile.NamedTemporaryFile(delete=False, suffix='.pdf') as tmp_file:
-                # Create writer with the input PDF
-                writer = PdfWriter()
-                reader = PdfReader(file_path)
-                
-                logger.info(f"Processing PDF with compression level {compression_level}")
-                logger.info(f"Image quality: {image_quality}%")
-                logger.info(f"Zlib level: {compression_level}")
-                
-                # Add all pages to writer
-                for page in reader.pages:
-                    writer.add_page(page)
-                
-                # First pass: compress all images if compression level > 0
-                if compression_level > 0:
-                    for page_num, page in enumerate(writer.pages, 1):
-                        for img_num, img in enumerate(page.images, 1):
-                            try:
-                                logger.info(f"Compressing image {img_num} on page {page_num}")
-                                img.replace(
-                                    img.image,
-                                    quality=image_quality
-                                )
-                            except Exception as e:
-                                logger.warning(f"Failed to compress image {img_num} on page {page_num}: {str(e)}")
-                                continue
-                
-                # Second pass: apply content stream compression if level > 0
-                if compression_level > 0:
-                    for page_num, page in enumerate(writer.pages, 1):
-                        try:
-                            logger.info(f"Compressing content stream for page {page_num}")
-                            page.compress_content_streams(level=compression_level)
-                        except Exception as e:
-                            logger.warning(f"Failed to compress content stream for page {page_num}: {str(e)}")
-                            continue
-                
-                # Additional optimization for high compression levels (7-9)
-                if compression_level >= 7:
-                    try:
-                        logger.info("Applying additional optimizations")
-                        writer.remove_unreferenced_objects()
-                        writer.compress_streams = True
-                        writer.compress_content_streams = True
-                    except Exception as e:
-                        logger.warning(f"Failed to apply additional optimizations: {str(e)}")
-                
-                # Write the compressed PDF
-                writer.write(tmp_file.name)
-                
-                # Read the compressed file
-                with open(tmp_file.name, 'rb') as f:
-                    compressed_data = f.read()
-
-                # Clean up
-                os.unlink(tmp_file.name)
-                
-                # Log compression results
-                original_size = os.path.getsize(file_path)
-                compressed_size = len(compressed_data)
-                reduction = ((original_size - compressed_size) / original_size) * 100
-                logger.info(f"Original size: {original_size / 1024:.2f}KB")
-                logger.info(f"Compressed size: {compressed_size / 1024:.2f}KB")
-                logger.info(f"Size reduction: {reduction:.1f}%")
-                
-                return compressed_data
+        return self.compressor.compress(source, compression_level, target_dpi, report)
 
-        except Exception as e:
-            logger.error(f"PDF compression failed: {str(e)}", exc_info=True)
-            raise 
\ No newline at end of file
+    def page_count(self, pdf: bytes) -> int:
+        return len(PdfReader(BytesIO(pdf)).pages)
+
+    def compression_cache_key(self, source: BinaryIO, compression_level: int, target_dpi: Optional[int] = None) -> str:
+        """Content address of a compression: the input bytes plus the compression options"""
+        options = {'level': compression_level, 'target_dpi': target_dpi}
+        digest = hashlib.sha256(json.dumps(options, sort_keys=True, separators=(',', ':')).encode('utf-8') + b'\n')
+        source.seek(0)
+        while True:
+            chunk = source.read(settings.PDF_STREAM_CHUNK_SIZE)
+            if not chunk:
+                break
+            digest.update(chunk)
+        return digest.hexdigest()
@@ -0,0 +1,152 @@
+import time
+import asyncio
+import logging
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Awaitable, Callable, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class QueueFullError(Exception):
+    """Raised when the render queue cannot accept more work."""
+
+    def __init__(self, retry_after: int):
+        super().__init__("Render queue is full, retry later")
+        self.retry_after = retry_after
+
+
+class RenderQueue:
+    """
+    Bounded executor for render jobs.
+
+    At most `workers` jobs run at once and at most `max_queue` more wait for a
+    worker; anything beyond that is rejected immediately with QueueFullError.
+    Blocking callables run on a thread pool, coroutines on the event loop.
+    """
+
+    def __init__(self, workers: int, max_queue: int, retry_after: int = 5):
+        self.workers = max(1, workers)
+        self.max_queue = max(0, max_queue)
+        self.retry_after = retry_after
+        self.executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='render')
+
+        self._slots: Optional[asyncio.Semaphore] = None
+        self._lock = threading.Lock()
+        self._queued = 0
+        self._running = 0
+
+        # Lifetime counters
+        self._accepted = 0
+        self._rejected = 0
+        self._completed = 0
+        self._failed = 0
+        self._total_wait = 0.0
+        self._max_wait = 0.0
+        self._last_wait = 0.0
+
+    def _admit(self, reject_when_full: bool = True):
+        with self._lock:
+            if reject_when_full and self._queued + self._running >= self.workers + self.max_queue:
+                self._rejected += 1
+                raise QueueFullError(self.retry_after)
+            self._queued += 1
+            self._accepted += 1
+
+    def _withdraw(self):
+        """Give back the admission of a job that never started"""
+        with self._lock:
+            self._queued -= 1
+
+    def _withdraw_if_cancelled(self, job: Future):
+        # A job cancelled while waiting for a worker never reaches _start
+        if job.cancelled():
+            self._withdraw()
+
+    def _start(self, enqueued_at: float):
+        wait = time.monotonic() - enqueued_at
+        with self._lock:
+            self._queued -= 1
+            self._running += 1
+            self._total_wait += wait
+            self._max_wait = max(self._max_wait, wait)
+            self._last_wait = wait
+
+    def _finish(self, ok: bool):
+        with self._lock:
+            self._running -= 1
+            if ok:
+                self._completed += 1
+            else:
+                self._failed += 1
+
+    def _call(self, enqueued_at: float, func: Callable, args: tuple) -> Any:
+        self._start(enqueued_at)
+        ok = False
+        try:
+            result = func(*args)
+            ok = True
+            return result
+        finally:
+            self._finish(ok)
+
+    async def run(self, func: Callable, *args, reject_when_full: bool = True) -> Any:
+        """
+        Run a blocking callable on a render worker, raising QueueFullError when saturated.
+
+        Callers that bound their own concurrency (batches, background jobs) pass
+        reject_when_full=False to wait for a worker instead.
+        """
+        self._admit(reject_when_full)
+        try:
+            job = self.executor.submit(self._call, time.monotonic(), func, args)
+        except RuntimeError:
+            # The executor refused the job (shutting down); undo the admission
+            self._withdraw()
+            raise
+        # Cancelling the awaiting task cancels the job too while it is still queued
+        job.add_done_callback(self._withdraw_if_cancelled)
+        return await asyncio.wrap_future(job)
+
+    async def run_async(self, func: Callable[..., Awaitable[Any]], *args, reject_when_full: bool = True) -> Any:
+        """Run a coroutine function in a render slot, raising QueueFullError when saturated."""
+        self._admit(reject_when_full)
+        if self._slots is None:
+            # Created lazily so it binds to the server's event loop
+            self._slots = asyncio.Semaphore(self.workers)
+        enqueued_at = time.monotonic()
+        try:
+            await self._slots.acquire()
+        except BaseException:
+            self._withdraw()
+            raise
+
+        self._start(enqueued_at)
+        ok = False
+        try:
+            result = await func(*args)
+            ok = True
+            return result
+        finally:
+            self._finish(ok)
+            self._slots.release()
+
+    def close(self):
+        self.executor.shutdown(wait=False, cancel_futures=True)
+
+    def stats(self) -> dict:
+        with self._lock:
+            started = self._completed + self._failed + self._running
+            return {
+                "workers": self.workers,
+                "max_queue": self.max_queue,
+                "depth": self._queued,
+                "running": self._running,
+                "accepted": self._accepted,
+                "rejected": self._rejected,
+                "completed": self._completed,
+                "failed": self._failed,
+                "avg_wait_seconds": round(self._total_wait / started, 4) if started else 0.0,
+                "max_wait_seconds": round(self._max_wait, 4),
+                "last_wait_seconds": round(self._last_wait, 4),
+            }
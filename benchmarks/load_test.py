@@ -0,0 +1,391 @@
+"""
+Load test of the rendering, markdown and compression endpoints.
+
+Sends requests at several concurrency levels and reports throughput,
+p50/p95/p99 latency and peak RSS for each scenario, then writes the results
+as JSON so runs on different commits can be compared:
+
+    generate-pdf         POST /api/v1/generate-pdf with test.html
+    generate-pdf-base64  the same with ?return_base64=true
+    markdown-to-html     POST /api/v1/markdown-to-html with request.json
+    compress-pdf         POST /api/v1/compress-pdf with --pdf, or a generated
+                         image-heavy document
+
+By default the app runs in-process and renders with real local Chrome (the
+app lifespan starts the browser pool). --renderer fake swaps the renderer for
+one that returns a canned PDF, which isolates API-layer overhead: auth, JSON
+parsing, response building and base64. --renderer pkg.module:factory plugs in
+any object with the PDFService.render signature. --url targets a running
+server instead; RSS is then sampled from --pid when given.
+
+    API_KEY=bench python benchmarks/load_test.py --renderer fake --concurrency 1,8,32
+    API_KEY=bench python benchmarks/load_test.py --scenarios generate-pdf --requests 50
+    API_KEY=bench python benchmarks/load_test.py --baseline benchmarks/results/previous.json
+
+In-process runs share one event loop between client and server, so latencies
+include client overhead; compare runs made the same way.
+"""
+import os
+import sys
+import json
+import math
+import base64
+import time
+import asyncio
+import argparse
+import platform
+import importlib
+import resource
+import subprocess
+import threading
+from datetime import datetime, timezone
+from io import BytesIO
+from pathlib import Path
+from typing import Dict, List, Optional
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+os.environ.setdefault("API_KEY", "bench")
+
+import httpx  # noqa: E402
+from PIL import Image  # noqa: E402
+from pypdf import PdfWriter  # noqa: E402
+
+from app.core.config import settings  # noqa: E402
+
+SCENARIOS = ("generate-pdf", "generate-pdf-base64", "markdown-to-html", "compress-pdf")
+
+
+class FakeRenderer:
+    """Stand-in for PDFService.render that returns a canned PDF without a browser"""
+
+    def __init__(self, pages: int = 2, delay: float = 0.0):
+        writer = PdfWriter()
+        for _ in range(pages):
+            writer.add_blank_page(595, 842)
+        output = BytesIO()
+        writer.write(output)
+        self.pdf = output.getvalue()
+        # Chrome hands PDFs over as base64, which is returned as is when asked for
+        self.encoded = base64.b64encode(self.pdf).decode("ascii")
+        self.delay = delay
+
+    async def render(self, request, stream: bool = False, reject_when_full: bool = True, report=None,
+                     encoded: bool = False):
+        if self.delay:
+            await asyncio.sleep(self.delay)
+        if stream:
+            return BytesIO(self.pdf)
+        return self.encoded if encoded else self.pdf
+
+
+def load_renderer(spec: str, args):
+    """The renderer named by --renderer, or None for the service's own"""
+    if spec == "chrome":
+        return None
+    if spec == "fake":
+        return FakeRenderer(pages=args.fake_pages, delay=args.fake_delay / 1000)
+    module, _, attr = spec.partition(":")
+    return getattr(importlib.import_module(module), attr)()
+
+
+def sample_pdf() -> bytes:
+    """A reproducible four page PDF of large photographic-ish images"""
+    size = (1600, 1200)
+    pages = []
+    for page in range(4):
+        red = Image.linear_gradient("L").resize(size)
+        green = Image.radial_gradient("L").resize(size)
+        blue = Image.linear_gradient("L").rotate(90 * page).resize(size)
+        pages.append(Image.merge("RGB", (red, green, blue)))
+    output = BytesIO()
+    pages[0].save(output, "PDF", save_all=True, append_images=pages[1:], resolution=300)
+    return output.getvalue()
+
+
+def _process_rss(pid: int) -> int:
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    return 0
+
+
+def _children(pid: int) -> List[int]:
+    children = []
+    try:
+        for task in os.listdir(f"/proc/{pid}/task"):
+            with open(f"/proc/{pid}/task/{task}/children") as f:
+                children.extend(int(child) for child in f.read().split())
+    except OSError:
+        pass
+    return children
+
+
+def tree_rss(pid: int) -> int:
+    """Resident bytes of a process and all its descendants (browsers, drivers, workers)"""
+    total, pending = 0, [pid]
+    while pending:
+        current = pending.pop()
+        total += _process_rss(current)
+        pending.extend(_children(current))
+    return total
+
+
+class RSSSampler:
+    """Track the peak RSS of a process tree from a background thread"""
+
+    def __init__(self, pid: int, interval: float = 0.05):
+        self.pid = pid
+        self.interval = interval
+        self.available = os.path.exists(f"/proc/{pid}/status")
+        self.peak = 0
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def __enter__(self):
+        self.baseline = tree_rss(self.pid) if self.available else 0
+        self.peak = self.baseline
+        if self.available:
+            self._thread = threading.Thread(target=self._run, daemon=True)
+            self._thread.start()
+        return self
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.peak = max(self.peak, tree_rss(self.pid))
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        if self._thread:
+            self._thread.join()
+        if self.available:
+            self.peak = max(self.peak, tree_rss(self.pid))
+
+
+def percentile(ordered: List[float], pct: float) -> float:
+    """Nearest-rank percentile of sorted values"""
+    if not ordered:
+        return 0.0
+    return ordered[max(0, math.ceil(pct / 100 * len(ordered)) - 1)]
+
+
+def build_requests(args) -> Dict[str, dict]:
+    """httpx request arguments for each scenario, keyed by name"""
+    html = (ROOT / "test.html").read_text()
+    markdown_payload = json.loads(Path(args.payload).read_text())
+    pdf = Path(args.pdf).read_bytes() if args.pdf else sample_pdf()
+    level = args.compression_level
+    return {
+        "generate-pdf": {"method": "POST", "url": "/api/v1/generate-pdf", "json": {"html": html}},
+        "generate-pdf-base64": {
+            "method": "POST", "url": "/api/v1/generate-pdf?return_base64=true", "json": {"html": html}
+        },
+        "markdown-to-html": {"method": "POST", "url": "/api/v1/markdown-to-html", "json": markdown_payload},
+        "compress-pdf": {
+            "method": "POST",
+            "url": f"/api/v1/compress-pdf?compression_level={level}",
+            "files": {"file": ("sample.pdf", pdf, "application/pdf")},
+        },
+    }
+
+
+async def run_level(client: httpx.AsyncClient, request: dict, concurrency: int, total: int,
+                    rss_pid: Optional[int]) -> dict:
+    """Send `total` requests with `concurrency` in flight and summarize them"""
+    latencies: List[float] = []
+    errors: Dict[str, int] = {}
+    response_bytes = 0
+    remaining = total
+
+    async def worker():
+        nonlocal remaining, response_bytes
+        while remaining > 0:
+            remaining -= 1
+            started = time.perf_counter()
+            try:
+                response = await client.request(**request)
+                elapsed = time.perf_counter() - started
+                if response.status_code == 200:
+                    latencies.append(elapsed)
+                    response_bytes += len(response.content)
+                else:
+                    key = str(response.status_code)
+                    errors[key] = errors.get(key, 0) + 1
+            except Exception as e:
+                key = type(e).__name__
+                errors[key] = errors.get(key, 0) + 1
+
+    sampler = RSSSampler(rss_pid) if rss_pid else None
+    with sampler or _no_sampler():
+        started = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        wall = time.perf_counter() - started
+
+    ordered = sorted(latencies)
+    result = {
+        "concurrency": concurrency,
+        "requests": total,
+        "succeeded": len(ordered),
+        "errors": errors,
+        "seconds": round(wall, 3),
+        "throughput_rps": round(len(ordered) / wall, 2) if wall else 0.0,
+        "latency_ms": {
+            "mean": round(sum(ordered) / len(ordered) * 1000, 2) if ordered else 0.0,
+            "p50": round(percentile(ordered, 50) * 1000, 2),
+            "p95": round(percentile(ordered, 95) * 1000, 2),
+            "p99": round(percentile(ordered, 99) * 1000, 2),
+            "max": round(ordered[-1] * 1000, 2) if ordered else 0.0,
+        },
+        "mean_response_bytes": response_bytes // len(ordered) if ordered else 0,
+    }
+    if sampler and sampler.available:
+        result["rss_bytes"] = {
+            "baseline": sampler.baseline,
+            "peak": sampler.peak,
+            # Growth over the idle process tree shared by the renders in flight
+            "peak_per_render": (sampler.peak - sampler.baseline) // concurrency,
+        }
+    return result
+
+
+class _no_sampler:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        pass
+
+
+async def run_scenarios(client: httpx.AsyncClient, args, rss_pid: Optional[int]) -> Dict[str, list]:
+    requests = build_requests(args)
+    results = {}
+    for scenario in args.scenarios:
+        request = requests[scenario]
+        for _ in range(args.warmup):
+            await client.request(**request)
+        results[scenario] = []
+        for concurrency in args.concurrency:
+            level = await run_level(client, request, concurrency, args.requests, rss_pid)
+            results[scenario].append(level)
+            latency = level["latency_ms"]
+            print(
+                f"{scenario:>20} c={concurrency:<3} {level['throughput_rps']:8.1f} req/s  "
+                f"p50 {latency['p50']:8.1f}  p95 {latency['p95']:8.1f}  p99 {latency['p99']:8.1f} ms"
+                + (f"  errors {level['errors']}" if level["errors"] else "")
+            )
+    return results
+
+
+async def run_in_process(args) -> Dict[str, list]:
+    from app.main import app
+    from app.api.v1.endpoints import pdf
+
+    # Repeated identical uploads would only measure the compression cache
+    pdf.pdf_service.compression_cache = None
+    renderer = load_renderer(args.renderer, args)
+    transport = httpx.ASGITransport(app=app)
+    headers = {settings.API_KEY_NAME: settings.API_KEY}
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", headers=headers,
+                                 timeout=args.timeout) as client:
+        if renderer is None:
+            # Real renders need the browsers started by the app lifespan
+            async with app.router.lifespan_context(app):
+                return await run_scenarios(client, args, os.getpid())
+        pdf.pdf_service.render = renderer.render
+        return await run_scenarios(client, args, os.getpid())
+
+
+async def run_remote(args) -> Dict[str, list]:
+    headers = {settings.API_KEY_NAME: settings.API_KEY}
+    limits = httpx.Limits(max_connections=max(args.concurrency))
+    async with httpx.AsyncClient(base_url=args.url, headers=headers, limits=limits,
+                                 timeout=args.timeout) as client:
+        return await run_scenarios(client, args, args.pid)
+
+
+def git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "HEAD"], cwd=ROOT, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(results: Dict[str, list], baseline_path: str):
+    """Print throughput and p95 changes against an earlier results file"""
+    baseline = json.loads(Path(baseline_path).read_text())["scenarios"]
+    print(f"\nAgainst {baseline_path}:")
+    for scenario, levels in results.items():
+        before = {level["concurrency"]: level for level in baseline.get(scenario, [])}
+        for level in levels:
+            old = before.get(level["concurrency"])
+            if not old or not old["throughput_rps"] or not old["latency_ms"]["p95"]:
+                continue
+            throughput = (level["throughput_rps"] / old["throughput_rps"] - 1) * 100
+            p95 = (level["latency_ms"]["p95"] / old["latency_ms"]["p95"] - 1) * 100
+            print(f"{scenario:>20} c={level['concurrency']:<3} throughput {throughput:+6.1f}%  p95 {p95:+6.1f}%")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scenarios", type=lambda v: v.split(","), default=list(SCENARIOS),
+                        help=f"Comma-separated scenarios out of {', '.join(SCENARIOS)}")
+    parser.add_argument("--concurrency", type=lambda v: [int(c) for c in v.split(",")], default=[1, 4, 16],
+                        help="Comma-separated requests in flight per level")
+    parser.add_argument("--requests", type=int, default=100, help="Requests per scenario and level")
+    parser.add_argument("--warmup", type=int, default=3, help="Unmeasured requests per scenario")
+    parser.add_argument("--renderer", default="chrome",
+                        help="chrome (local browser), fake, or pkg.module:factory returning a renderer")
+    parser.add_argument("--fake-pages", type=int, default=2, help="Pages of the fake renderer's PDF")
+    parser.add_argument("--fake-delay", type=float, default=0.0, help="Milliseconds the fake renderer waits")
+    parser.add_argument("--payload", default=str(ROOT / "request.json"), help="MarkdownRequest JSON body")
+    parser.add_argument("--pdf", help="PDF uploaded to /compress-pdf, generated when unset")
+    parser.add_argument("--compression-level", type=int, default=5)
+    parser.add_argument("--url", help="Base URL of a running server instead of the in-process app")
+    parser.add_argument("--pid", type=int, help="Server process sampled for RSS with --url")
+    parser.add_argument("--timeout", type=float, default=120.0, help="Seconds per request")
+    parser.add_argument("--output", help="Results file, benchmarks/results/<timestamp>.json by default")
+    parser.add_argument("--baseline", help="Earlier results file to compare against")
+    args = parser.parse_args()
+
+    unknown = set(args.scenarios) - set(SCENARIOS)
+    if unknown:
+        parser.error(f"unknown scenarios: {', '.join(sorted(unknown))}")
+    if args.url and args.renderer != "chrome":
+        parser.error("--renderer only applies to the in-process app")
+
+    started_at = datetime.now(timezone.utc)
+    results = asyncio.run(run_remote(args) if args.url else run_in_process(args))
+
+    report = {
+        "timestamp": started_at.isoformat(),
+        "commit": git_commit(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+        "target": args.url or "in-process",
+        "renderer": args.renderer,
+        "engine": settings.PDF_ENGINE,
+        "requests_per_level": args.requests,
+        # Peak for the whole run, including the client when in-process
+        "max_rss_bytes": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * (1 if sys.platform == "darwin" else 1024),
+        "scenarios": results,
+    }
+    output = Path(args.output) if args.output else (
+        ROOT / "benchmarks" / "results" / f"{started_at.strftime('%Y%m%dT%H%M%SZ')}.json"
+    )
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(json.dumps(report, indent=2))
+    print(f"\nResults written to {output}")
+
+    if args.baseline:
+        compare(results, args.baseline)
+
+
+if __name__ == "__main__":
+    main()
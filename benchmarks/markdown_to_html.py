@@ -0,0 +1,60 @@
+"""
+Micro-benchmark of POST /api/v1/markdown-to-html, in-process.
+
+Sends request.json through the FastAPI test client and reports requests per
+second for repeated identical documents and for documents that differ on
+every request (so output memoization cannot help).
+
+    API_KEY=bench python benchmarks/markdown_to_html.py [--requests 500]
+"""
+import os
+import sys
+import json
+import time
+import argparse
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+os.environ.setdefault("API_KEY", "bench")
+
+from fastapi.testclient import TestClient  # noqa: E402
+
+from app.core.config import settings  # noqa: E402
+from app.main import app  # noqa: E402
+
+
+def run(client: TestClient, payloads, headers: dict) -> float:
+    started = time.perf_counter()
+    for payload in payloads:
+        response = client.post("/api/v1/markdown-to-html", json=payload, headers=headers)
+        response.raise_for_status()
+    return len(payloads) / (time.perf_counter() - started)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=500, help="Requests per scenario")
+    parser.add_argument("--payload", default=str(ROOT / "request.json"), help="MarkdownRequest JSON body")
+    args = parser.parse_args()
+
+    payload = json.loads(Path(args.payload).read_text())
+    headers = {settings.API_KEY_NAME: settings.API_KEY}
+    # The client is not entered as a context manager so no browser is started
+    client = TestClient(app)
+
+    # Warm up imports and lazily built state
+    run(client, [payload] * 10, headers)
+
+    results = {
+        "identical": run(client, [payload] * args.requests, headers),
+        "unique": run(client, [
+            {**payload, "content": f"{payload['content']}\n\n<!-- {i} -->"} for i in range(args.requests)
+        ], headers),
+    }
+    for scenario, rate in results.items():
+        print(f"{scenario:>10}: {rate:8.1f} req/s")
+
+
+if __name__ == "__main__":
+    main()
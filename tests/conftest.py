@@ -0,0 +1,4 @@
+import os
+
+# Settings are read on import and API_KEY has no default
+os.environ.setdefault("API_KEY", "test")
@@ -0,0 +1,88 @@
+import json
+import threading
+from types import SimpleNamespace
+
+import pytest
+from selenium.common.exceptions import WebDriverException
+from websockets.sync.server import serve
+
+from app.services.pdf_service import PDFService
+
+
+class FakeBrowser:
+    """DevTools endpoint answering Target commands on its browser websocket."""
+
+    def __init__(self, fail: str = None):
+        self.fail = fail
+        self.received = []
+        self.server = serve(self._handle, "127.0.0.1", 0, process_request=self._version)
+        self.address = "127.0.0.1:%d" % self.server.socket.getsockname()[1]
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def _version(self, connection, request):
+        if request.path == "/json/version":
+            return connection.respond(200, json.dumps({
+                "webSocketDebuggerUrl": f"ws://{self.address}/devtools/browser/1"
+            }))
+        return None
+
+    def _handle(self, websocket):
+        for raw in websocket:
+            message = json.loads(raw)
+            self.received.append(message["method"])
+            # Events interleaved with responses must be skipped
+            websocket.send(json.dumps({"method": "Target.targetCreated", "params": {}}))
+            if message["method"] == self.fail:
+                websocket.send(json.dumps({"id": message["id"], "error": {"message": "Not allowed"}}))
+            elif message["method"] == "Target.createBrowserContext":
+                websocket.send(json.dumps({"id": message["id"], "result": {"browserContextId": "ctx"}}))
+            elif message["method"] == "Target.createTarget":
+                websocket.send(json.dumps({"id": message["id"], "result": {"targetId": "TAB"}}))
+            else:
+                websocket.send(json.dumps({"id": message["id"], "result": {}}))
+
+
+class FakeDriver:
+    def __init__(self, address):
+        self.capabilities = {"goog:chromeOptions": {"debuggerAddress": address}}
+        self.current_window_handle = "BASE"
+        self.window_handles = ["BASE", "CDwindow-TAB"]
+        self.switched = []
+        self.switch_to = SimpleNamespace(window=self.switched.append)
+
+    def execute_cdp_cmd(self, method, params):
+        # Chromedriver runs these on the page session, which Chrome refuses
+        raise AssertionError(f"{method} sent through chromedriver")
+
+
+@pytest.fixture
+def browser():
+    fake = FakeBrowser()
+    yield fake
+    fake.server.shutdown()
+
+
+def test_context_is_managed_on_the_browser_session(browser):
+    driver = FakeDriver(browser.address)
+    with PDFService._browser_context(None, driver) as tab:
+        assert tab is driver
+        assert driver.switched == ["CDwindow-TAB"]
+
+    assert driver.switched == ["CDwindow-TAB", "BASE"]
+    assert browser.received == [
+        "Target.createBrowserContext",
+        "Target.createTarget",
+        "Target.disposeBrowserContext",
+    ]
+
+
+def test_context_is_disposed_when_the_tab_cannot_be_opened():
+    browser = FakeBrowser(fail="Target.createTarget")
+    try:
+        driver = FakeDriver(browser.address)
+        with pytest.raises(WebDriverException, match="Not allowed"):
+            with PDFService._browser_context(None, driver):
+                pass
+        assert browser.received[-1] == "Target.disposeBrowserContext"
+    finally:
+        browser.server.shutdown()
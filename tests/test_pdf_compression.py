@@ -0,0 +1,207 @@
+import os
+from io import BytesIO
+
+import pytest
+from PIL import Image
+from pypdf import PdfReader
+
+from app.models.pdf_options import CompressionReport
+from app.services.pdf_compression import PDFCompressor
+
+
+def noise_jpeg(width, height, quality=75):
+    """A JPEG that does not compress well, like a photo"""
+    image = Image.frombytes("RGB", (width, height), os.urandom(width * height * 3))
+    buffer = BytesIO()
+    image.save(buffer, "JPEG", quality=quality)
+    return buffer.getvalue()
+
+
+def build_pdf(images, pages):
+    """
+    Write a PDF by hand.
+
+    `images` are (width, height, jpeg) tuples, each stored as its own object.
+    `pages` are (content, {name: image index}) tuples.
+    """
+    objects = []
+
+    def add(body):
+        objects.append(body)
+        return len(objects)
+
+    catalog = add(None)
+    page_tree = add(None)
+    image_ids = [
+        add(
+            b"<< /Type /XObject /Subtype /Image /Width %d /Height %d /ColorSpace /DeviceRGB "
+            b"/BitsPerComponent 8 /Filter /DCTDecode /Length %d >>\nstream\n%s\nendstream"
+            % (width, height, len(data), data)
+        )
+        for width, height, data in images
+    ]
+    page_ids = []
+    for content, names in pages:
+        content = content.encode("ascii")
+        content_id = add(b"<< /Length %d >>\nstream\n%s\nendstream" % (len(content), content))
+        xobjects = b" ".join(b"/%s %d 0 R" % (name.encode(), image_ids[index]) for name, index in names.items())
+        page_ids.append(add(
+            b"<< /Type /Page /Parent %d 0 R /MediaBox [0 0 612 792] "
+            b"/Resources << /XObject << %s >> >> /Contents %d 0 R >>" % (page_tree, xobjects, content_id)
+        ))
+    objects[catalog - 1] = b"<< /Type /Catalog /Pages %d 0 R >>" % page_tree
+    objects[page_tree - 1] = b"<< /Type /Pages /Kids [%s] /Count %d >>" % (
+        b" ".join(b"%d 0 R" % page_id for page_id in page_ids), len(page_ids)
+    )
+
+    out = BytesIO()
+    out.write(b"%PDF-1.7\n")
+    offsets = []
+    for number, body in enumerate(objects, 1):
+        offsets.append(out.tell())
+        out.write(b"%d 0 obj\n%s\nendobj\n" % (number, body))
+    xref = out.tell()
+    out.write(b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1))
+    for offset in offsets:
+        out.write(b"%010d 00000 n \n" % offset)
+    out.write(b"trailer\n<< /Size %d /Root %d 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, catalog, xref))
+    return out.getvalue()
+
+
+def draw(name, width, height):
+    """Content drawing an image at `width` x `height` points"""
+    return f"q {width} 0 0 {height} 0 0 cm /{name} Do Q"
+
+
+def compress(pdf, level, target_dpi=None, workers=1):
+    report = CompressionReport()
+    compressor = PDFCompressor(workers=workers)
+    try:
+        data = compressor.compress(BytesIO(pdf), level, target_dpi, report)
+    finally:
+        compressor.close()
+    return data, report
+
+
+def images_of(data):
+    """(width, height, encoded data) of every image, per page"""
+    return [
+        [
+            (xobject["/Width"], xobject["/Height"], xobject.get_object()._data)
+            for xobject in (xobjects[name].get_object() for name in sorted(xobjects))
+        ]
+        for xobjects in (page["/Resources"]["/XObject"] for page in PdfReader(BytesIO(data)).pages)
+    ]
+
+
+def image_ids(data):
+    """Object number of every image, per page"""
+    return [
+        [xobjects.raw_get(name).idnum for name in sorted(xobjects)]
+        for xobjects in (page["/Resources"]["/XObject"] for page in PdfReader(BytesIO(data)).pages)
+    ]
+
+
+def test_duplicate_images_are_merged():
+    photo = noise_jpeg(200, 200)
+    pdf = build_pdf(
+        # The same photo stored twice, and another one
+        [(200, 200, photo), (200, 200, photo), (200, 200, noise_jpeg(200, 200))],
+        [
+            (draw("Im0", 72, 72) + " " + draw("Im1", 72, 72), {"Im0": 0, "Im1": 2}),
+            (draw("Im0", 72, 72), {"Im0": 1}),
+            # One resource entry drawn twice is a single use
+            (draw("Im0", 72, 72) + " " + draw("Im0", 144, 144), {"Im0": 0}),
+        ],
+    )
+
+    data, report = compress(pdf, 5)
+
+    assert (report.images, report.duplicateImages) == (2, 2)
+    (first, other), (copy,), (again,) = image_ids(data)
+    assert first == copy == again != other
+    assert len(data) < len(pdf)
+
+
+@pytest.mark.parametrize("workers", [1, 2])
+def test_images_are_downsampled_to_their_drawn_size(workers):
+    pdf = build_pdf(
+        [
+            (600, 600, noise_jpeg(600, 600)),
+            (400, 200, noise_jpeg(400, 200)),
+            (600, 600, noise_jpeg(600, 600)),
+        ],
+        [
+            (
+                # 2 inches wide: 300 DPI
+                draw("Im0", 144, 144)
+                # Nested matrices multiply to 1 x 0.5 inch: 400 DPI
+                + " q 2 0 0 2 0 0 cm q 36 0 0 18 0 0 cm /Im1 Do Q Q"
+                # Drawn after Q restored the matrix: 600 DPI here, but 150 DPI on page 2
+                + " q 3 0 0 3 0 0 cm Q " + draw("Im2", 72, 72),
+                {"Im0": 0, "Im1": 1, "Im2": 2},
+            ),
+            (draw("Im2", 288, 288), {"Im2": 2}),
+        ],
+    )
+
+    data, report = compress(pdf, 5, target_dpi=150, workers=workers)
+
+    assert report.downsampledImages == 2
+    sizes = [[(width, height) for width, height, _ in page] for page in images_of(data)]
+    assert sizes == [[(300, 300), (150, 75), (600, 600)], [(600, 600)]]
+
+
+def test_page_contents_are_unchanged():
+    content = draw("Im0", 144, 144) + " BT /F1 12 Tf 72 700 Td (Hello) Tj ET " + draw("Im1", 72, 72)
+    photo = noise_jpeg(600, 600)
+    pdf = build_pdf(
+        [(600, 600, photo), (600, 600, photo)],
+        [(content, {"Im0": 0, "Im1": 1}), (draw("Im0", 36, 36), {"Im0": 1})],
+    )
+
+    data, _ = compress(pdf, 9, target_dpi=72)
+
+    before = PdfReader(BytesIO(pdf)).pages
+    after = PdfReader(BytesIO(data)).pages
+    assert len(after) == len(before)
+    for original, compressed in zip(before, after):
+        assert compressed.get_contents().get_data() == original.get_contents().get_data()
+        assert sorted(compressed["/Resources"]["/XObject"]) == sorted(original["/Resources"]["/XObject"])
+
+
+def test_level_zero_keeps_the_document_when_nothing_is_downsampled():
+    # 200 px over 2 inches is 100 DPI, already below the target
+    pdf = build_pdf([(200, 200, noise_jpeg(200, 200))], [(draw("Im0", 144, 144), {"Im0": 0})])
+
+    data, report = compress(pdf, 0, target_dpi=150)
+
+    assert data == pdf
+    assert (report.originalSize, report.finalSize) == (len(pdf), len(pdf))
+    assert (report.images, report.downsampledImages) == (0, 0)
+
+
+def test_level_zero_only_reencodes_downsampled_images():
+    small = noise_jpeg(100, 100)
+    pdf = build_pdf(
+        [(100, 100, small), (600, 600, noise_jpeg(600, 600))],
+        [(draw("Im0", 72, 72) + " " + draw("Im1", 72, 72), {"Im0": 0, "Im1": 1})],
+    )
+
+    data, report = compress(pdf, 0, target_dpi=150)
+
+    assert len(data) < len(pdf)
+    assert report.downsampledImages == 1
+    (kept, downsampled), = images_of(data)
+    assert kept == (100, 100, small)
+    assert downsampled[:2] == (150, 150)
+
+
+def test_result_that_is_not_smaller_is_replaced_by_the_original():
+    # Noise stored at low quality grows when re-encoded at the quality of level 1
+    pdf = build_pdf([(300, 300, noise_jpeg(300, 300, quality=20))], [(draw("Im0", 72, 72), {"Im0": 0})])
+
+    data, report = compress(pdf, 1)
+
+    assert data == pdf
+    assert report.finalSize == len(pdf)
@@ -0,0 +1,73 @@
+import asyncio
+import threading
+
+import pytest
+
+from app.services.render_queue import QueueFullError, RenderQueue
+
+
+def test_cancelled_waiting_job_gives_back_its_slot():
+    queue = RenderQueue(workers=1, max_queue=1)
+    release = threading.Event()
+    started = threading.Event()
+    ran = []
+
+    def block():
+        started.set()
+        release.wait(5)
+
+    async def scenario():
+        running = asyncio.create_task(queue.run(block))
+        await asyncio.to_thread(started.wait, 5)
+        waiting = asyncio.create_task(queue.run(ran.append, 'waiting'))
+        await asyncio.sleep(0)
+        assert queue.stats()['depth'] == 1
+
+        waiting.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await waiting
+        assert queue.stats()['depth'] == 0
+
+        # The freed slot admits a new job instead of rejecting it
+        admitted = asyncio.create_task(queue.run(ran.append, 'admitted'))
+        await asyncio.sleep(0)
+        with pytest.raises(QueueFullError):
+            await queue.run(ran.append, 'rejected')
+
+        release.set()
+        await running
+        await admitted
+
+    try:
+        asyncio.run(scenario())
+    finally:
+        release.set()
+        queue.close()
+
+    assert ran == ['admitted']
+    stats = queue.stats()
+    assert (stats['depth'], stats['running'], stats['completed']) == (0, 0, 2)
+
+
+def test_cancelled_async_job_gives_back_its_slot():
+    queue = RenderQueue(workers=1, max_queue=1)
+
+    async def scenario():
+        release = asyncio.Event()
+        running = asyncio.create_task(queue.run_async(release.wait))
+        await asyncio.sleep(0)
+        waiting = asyncio.create_task(queue.run_async(asyncio.sleep, 0))
+        await asyncio.sleep(0)
+        assert queue.stats()['depth'] == 1
+
+        waiting.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await waiting
+        assert queue.stats()['depth'] == 0
+
+        release.set()
+        await running
+
+    asyncio.run(scenario())
+    queue.close()
+    assert queue.stats()['depth'] == 0